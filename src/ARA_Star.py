@@ -0,0 +1,309 @@
+from heapq import heappush, heappop, heapify
+from itertools import count
+from timeit import timeit
+
+import A_Star
+from A_Star import get_path
+from budget import NO_BUDGET, SearchBudget, BudgetExhausted, record_timeout, print_timeout
+from GUI import visualize
+from helper import read_input, is_in_goal, get_successors, get_path_movements, pprint_path
+from hooks import NO_HOOKS
+from move_path import MovePath
+from node import Node
+from push import normalize_state, get_push_successors, get_push_path
+from solution_cache import cached_solve
+from state import get_layout
+from stats import SearchStats
+
+INFINITY = float("inf")
+
+
+def is_admissible(heuristic_name):
+    """
+    :return: whether the heuristic of the given name (see A_Star.get_heuristic) is admissible and consistent, so that
+     the bounds of ARA* hold
+    :rtype: bool
+    """
+    return heuristic_name == "push_distance" or heuristic_name.startswith("pdb:")
+
+
+def ara_star(layout, heuristic, root_node, max_depth, stats, successors=get_successors, hooks=NO_HOOKS,
+             initial_weight=3.0, weight_step=0.5, budget=NO_BUDGET, admissible=True):
+    """
+    Anytime Repairing A* (ARA*): a series of weighted A* searches, where the frontier is ordered by g + weight * h,
+    with a lower weight in each search, down to 1.
+
+    A search stops as soon as no node of the frontier has a lower key than the cost of the best goal found, so the
+    first searches, with a high weight, find a goal quickly. The next search does not start over: it reuses the g
+    costs of all the reached states, and only reexpands the states whose g cost was lowered after they were expanded
+    (they are kept aside, in the inconsistent set, until the search ends).
+
+    After each search, the lowest g + h of the frontier and the inconsistent set is a lower bound of the cheapest
+    goal (with an admissible and consistent heuristic, such as push_distance), so cost / lower bound is how far from
+    optimal the found goal can be, which is never more than the weight.
+
+    :param layout: static layout of the field, holding the cost of all cells
+    :param heuristic: function that returns the heuristic value of a state
+    :param root_node: the node which the search algorithm starts with
+    :param max_depth: maximum allowed depth
+    :param stats: statistics of the search
+    :type stats: SearchStats
+    :param successors: successor generation function (single movements or pushes)
+    :param hooks: callbacks of the search events, on_goal is called with every improved goal
+    :type hooks: SearchHooks
+    :param initial_weight: weight of the heuristic in the first search
+    :type initial_weight: float
+    :param weight_step: how much the weight is lowered after each search
+    :type weight_step: float
+    :param budget: limits of the search. If it is used up before the first goal is found, BudgetExhausted is raised
+     with the node of the frontier that has the lowest heuristic value (then the lowest f cost).
+    :type budget: SearchBudget
+    :param admissible: whether the heuristic is admissible and consistent. If it is not, the bounds are not known:
+     they are None, and the search only ends when the search with weight 1 does (or the budget runs out).
+    :type admissible: bool
+    :return: generator of (goal node, suboptimality bound, lower bound) tuples, one for every improvement of the goal
+     or of its bound, where the goal costs at most bound times the cheapest goal. It ends when the goal is proved
+     optimal, or when the budget runs out (with a last tuple, if the budget improved the goal).
+    """
+    if weight_step <= 0:
+        raise ValueError("the weight step must be positive")
+
+    on_expand, on_generate, on_duplicate, on_goal = hooks.on_expand, hooks.on_generate, hooks.on_duplicate, \
+        hooks.on_goal
+    weight = max(initial_weight, 1.0)
+    counter = count()
+    root_key = root_node.cost_g + weight * (root_node.cost_f - root_node.cost_g)
+    # the best node (lowest g cost) of every reached state, and the current nodes of the frontier and the
+    # inconsistent set. The f cost of a node is g + h, the frontier is ordered by g + weight * h.
+    best_nodes = {root_node.state: root_node}
+    open_nodes, incons_nodes, closed = {root_node.state: root_node}, {}, set()
+    frontier = [(root_key, next(counter), root_node)]
+
+    goal_node = root_node if is_in_goal(layout, root_node.state) else None
+    goal_cost = goal_node.cost_g if goal_node is not None else INFINITY
+    reported_node, reported_bound = None, None
+
+    while True:
+        # improve the path with the current weight
+        out_of_budget = None
+        while frontier:
+            key, _, node = frontier[0]
+            if node.state in closed or open_nodes.get(node.state) is not node:
+                heappop(frontier)
+                continue
+            if key >= goal_cost:
+                break
+            if stats.nodes_expanded >= budget.next_check:
+                out_of_budget = budget.exhausted(stats)
+                if out_of_budget is not None:
+                    break
+
+            heappop(frontier)
+            del open_nodes[node.state]
+            closed.add(node.state)
+            stats.nodes_expanded += 1
+            stats.depth_counts[node.depth] += 1
+            if on_expand is not None:
+                on_expand(node)
+            if node.depth >= max_depth:
+                continue
+
+            for movement, new_state, cost in successors(layout, node.state):
+                new_g = node.cost_g + cost
+                known_node = best_nodes.get(new_state)
+                if known_node is not None and new_g >= known_node.cost_g:
+                    stats.duplicates += 1
+                    if on_duplicate is not None:
+                        on_duplicate(known_node)
+                    continue
+
+                h = known_node.cost_f - known_node.cost_g if known_node is not None else heuristic(new_state)
+                child_node = Node(new_state, node.depth + 1, movement, node, new_g, new_g + h)
+                best_nodes[new_state] = child_node
+                stats.nodes_created += 1
+                if on_generate is not None:
+                    on_generate(node, child_node)
+
+                if is_in_goal(layout, new_state):
+                    if new_g < goal_cost:
+                        goal_node, goal_cost = child_node, new_g
+                        if on_goal is not None:
+                            on_goal(child_node)
+                elif new_state in closed:
+                    stats.reopenings += 1
+                    incons_nodes[new_state] = child_node
+                else:
+                    if new_state in open_nodes:
+                        stats.decrease_keys += 1
+                    open_nodes[new_state] = child_node
+                    heappush(frontier, (new_g + weight * h, next(counter), child_node))
+
+            stats.update_peaks(len(open_nodes), len(closed))
+
+        if goal_node is None:
+            # there is no goal, or the budget ran out before the first one
+            if out_of_budget is not None:
+                raise BudgetExhausted(out_of_budget, min(open_nodes.values(), key=lambda x: (
+                    x.cost_f - x.cost_g, x.cost_f)))
+            stats.details["budget_exhausted"] = False
+            return
+
+        if not admissible:
+            if goal_node is not reported_node:
+                reported_node = goal_node
+                yield goal_node, None, None
+            if weight <= 1 or out_of_budget is not None:
+                stats.details["budget_exhausted"] = out_of_budget is not None
+                return
+        else:
+            # the goals are not added to the frontier, but the best one is a part of it
+            lower_bound = min(goal_cost, min((node.cost_f for node in open_nodes.values()), default=INFINITY),
+                              min((node.cost_f for node in incons_nodes.values()), default=INFINITY))
+            bound = min(weight, goal_cost / lower_bound) if lower_bound > 0 else 1.0
+            if goal_node is not reported_node or bound < reported_bound:
+                reported_node, reported_bound = goal_node, bound
+                yield goal_node, bound, lower_bound
+
+            if bound <= 1 or weight <= 1 or out_of_budget is not None:
+                stats.details["budget_exhausted"] = out_of_budget is not None and bound > 1
+                return
+
+        # lower the weight, and go on from the frontier and the inconsistent states
+        weight = max(weight - weight_step, 1.0)
+        open_nodes.update(incons_nodes)
+        incons_nodes, closed = {}, set()
+        frontier = [(node.cost_g + weight * (node.cost_f - node.cost_g), next(counter), node)
+                    for node in open_nodes.values()]
+        heapify(frontier)
+
+
+def get_found_path(layout, root_state, goal_node, mode="step"):
+    """
+    :return: the path from the root to the given goal node (a MovePath, with single movements, also in push mode)
+    :rtype: MovePath
+    """
+    if mode == "push":
+        return get_push_path(layout, root_state, get_path(goal_node)[1:])
+    return MovePath.from_node(layout, root_state, goal_node)
+
+
+def solve(test_case_path, max_depth, mode="step", heuristic_name="push_distance", timing=False, hooks=None,
+          initial_weight=3.0, weight_step=0.5, time_budget=None, node_budget=None, budget=None, max_bound=1.0,
+          on_solution=None):
+    """
+    Reads the given test case, and runs the anytime ARA* algorithm on it, until the found path is within max_bound
+    of the optimal one or the budget runs out.
+
+    :param test_case_path: path of the input file
+    :param max_depth: maximum allowed depth
+    :param mode: "step" for single movements, or "push" for pushes
+    :param heuristic_name: name of the heuristic, see A_Star.get_heuristic (the bounds are only reported for an
+     admissible and consistent one, see is_admissible)
+    :param timing: whether to measure the time of the heuristic and successor generation calls
+    :param hooks: callbacks of the search events (SearchHooks), or None
+    :param initial_weight: weight of the heuristic in the first search
+    :param weight_step: how much the weight is lowered after each search
+    :param time_budget: maximum number of seconds to search (None for no limit)
+    :param node_budget: maximum number of nodes to expand (None for no limit)
+    :param budget: limits of the search (SearchBudget), instead of time_budget and node_budget, such as one that
+     is cancelled by another thread
+    :param max_bound: the search returns the first path whose suboptimality bound is at most max_bound (1 to return
+     the proved optimal path, float("inf") to return the first path that is found). A path with an unknown bound
+     (see is_admissible) is only returned early with float("inf").
+    :param on_solution: function that is called with the path (a MovePath) and the solution details of every
+     improved solution as soon as it is found, so a caller can use a path while the search goes on refining it
+    :return: tuple of (layout, root state, path, stats), where path is the path from the root
+     (a MovePath, with single movements, also in push mode) of the best goal found, or None if no path is found.
+     If the budget runs out before the first goal, path is None and the partial path of the most promising node
+     is stored in stats.details["timeout"] (see budget.record_timeout).
+     stats.details["solutions"] has the cost, suboptimality bound, lower bound, time and number of expanded nodes
+     of every improved solution, in the order they were found. In push mode, the number of pushes is stored in
+     stats.pushes.
+    :rtype: tuple
+    """
+    max_depth = int(max_depth)
+    if budget is None:
+        budget = SearchBudget(time_budget, node_budget)
+    costs, objects, robot_loc, plates_locs = read_input(test_case_path)
+    layout = get_layout(costs, objects)
+    stats = SearchStats(timing)
+
+    root_state = layout.make_state(objects, robot_loc)
+    heuristic = stats.timed_heuristic(A_Star.get_heuristic(layout, objects, plates_locs, mode, heuristic_name))
+    if mode == "push":
+        start_state, successors = normalize_state(layout, root_state), get_push_successors
+    else:
+        start_state, successors = root_state, get_successors
+    successors = stats.timed_successors(successors)
+
+    root_node = Node(start_state, 0, "", "", 0, heuristic(start_state))
+
+    max_bound = float(max_bound)
+    final_node = None
+    stats.details["solutions"] = []
+    try:
+        for final_node, bound, lower_bound in ara_star(layout, heuristic, root_node, max_depth, stats, successors,
+                                                       hooks or NO_HOOKS, float(initial_weight), float(weight_step),
+                                                       budget, is_admissible(heuristic_name)):
+            solution = {
+                "cost": final_node.cost_g,
+                "bound": bound,
+                "lower_bound": lower_bound,
+                "time": stats.elapsed,
+                "nodes_expanded": stats.nodes_expanded
+            }
+            stats.details["solutions"].append(solution)
+            if on_solution is not None:
+                on_solution(get_found_path(layout, root_state, final_node, mode), solution)
+            if (INFINITY if bound is None else bound) <= max_bound:
+                break
+    except BudgetExhausted as exhausted:
+        stats.stop()
+        stats.details["budget_exhausted"] = True
+        record_timeout(stats, exhausted.reason, layout, root_state, exhausted.node, mode)
+        return layout, root_state, None, stats
+    stats.stop()
+
+    if final_node is None:
+        return layout, root_state, None, stats
+
+    if mode == "push":
+        stats.pushes = final_node.depth
+    return layout, root_state, get_found_path(layout, root_state, final_node, mode), stats
+
+
+def main(test_case_path, max_depth, mode="step", heuristic_name="push_distance", time_budget=None,
+         node_budget=None, max_bound=1.0):
+    layout, _, found_path, stats = cached_solve("ara_star", solve, test_case_path, max_depth, mode, heuristic_name,
+                                                time_budget=time_budget, node_budget=node_budget,
+                                                max_bound=float(max_bound))
+
+    if found_path is not None:
+        if mode == "push":
+            print(f"Pushes: {stats.pushes}")
+        pprint_path(found_path, layout)
+        visualize(found_path, layout)
+        print(f"Path Movements: {get_path_movements(found_path)}")
+        print("Depth Reached: ", len(found_path))
+    elif "timeout" in stats.details:
+        print_timeout(stats.details["timeout"])
+    else:
+        print("can't pass the butter")
+
+    for solution in stats.details.get("solutions", []):
+        bound = "unknown" if solution["bound"] is None else f"{solution['bound']:.3f}"
+        print(f"Solution: Cost: {solution['cost']}, Bound: {bound}, "
+              f"Lower Bound: {solution['lower_bound']}, Nodes Expanded: {solution['nodes_expanded']}, "
+              f"Time: {solution['time']:.3f}s")
+    if stats.details.get("budget_exhausted"):
+        print("Budget ran out before the solution was proved optimal")
+    if stats.details.get("cache") == "hit":
+        print("Solution found in the cache")
+    print(f"Nodes Created: {stats.nodes_created}, Nodes Expanded: {stats.nodes_expanded}")
+
+
+if __name__ == "__main__":
+    setup = '''from __main__ import main'''
+    statement = '''main(*sys.argv[1:])'''
+    time = timeit(setup=setup, stmt=statement, number=1)
+    print(f"Execution Time: {time}")
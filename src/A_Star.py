@@ -1,10 +1,27 @@
 from copy import deepcopy
+from heapq import heappush, heappop
+from itertools import count
 from timeit import timeit
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import IDA_Star
+from budget import NO_BUDGET, SearchBudget, BudgetExhausted, record_timeout, print_timeout
 from GUI import visualize
-from helper import read_input, manhattan_distance, is_in_goal, get_valid_movements, get_path_movements, perform_move, \
-    get_duplicate, pprint_path
+from helper import read_input, manhattan_distance, is_in_goal, get_successors, get_path_movements, pprint_path, \
+    parse_memory_budget, MemoryBudgetExceeded
+from heuristics import get_push_distance_heuristic
+from hooks import NO_HOOKS
+from move_path import MovePath
 from node import Node
+from pattern_db import get_pattern_db_heuristic
+from push import normalize_state, get_push_successors, get_push_path
+from solution_cache import cached_solve
+from state import get_layout
+from stats import SearchStats
 
 
 def get_closest_plate(point, plates_locs):
@@ -52,6 +69,20 @@ def heuristic_1(point, plates_locs):
     return h
 
 
+def closest_plate_heuristic(point, plates_locs):
+    """
+    Calculate the distance from 'point' to its closest plate.
+
+    :param point: Starting point coordinates (x, y).
+    :param plates_locs: List of plate locations [(x1, y1), (x2, y2), ...].
+    :return: Manhattan distance to the closest plate (0 if there are no plates).
+    """
+    if not plates_locs:
+        return 0
+
+    return get_closest_plate(point, plates_locs)[1]
+
+
 def get_heuristic_matrix(objects, plates_locs, heuristic_func):
     """
     Computes a matrix of heuristic values by applying a given heuristic function to each object's position and a list of plate locations.
@@ -67,72 +98,227 @@ def get_heuristic_matrix(objects, plates_locs, heuristic_func):
     return heuristic_matrix
 
 
-def update_frontier(frontier, explored, new_node):
+def get_greedy_chain_lengths(plates):
+    """
+    Calculates, for every plate, the length of the greedy nearest-plate chain that heuristic_1 walks
+    from that plate over all the other plates.
+
+    :param plates: Array of plate locations, with shape (number of plates, 2).
+    :return: Array of chain lengths, one for each plate.
+    """
+    num_plates = len(plates)
+    plate_distances = np.abs(plates[:, None, :] - plates[None, :, :]).sum(axis=2)
+    unreachable = plate_distances.max() + 1
+
+    starts = np.arange(num_plates)
+    visited = np.eye(num_plates, dtype=bool)
+    cur_plates = starts
+    lengths = np.zeros(num_plates, dtype=plate_distances.dtype)
+    for _ in range(num_plates - 1):
+        distances = np.where(visited, unreachable, plate_distances[cur_plates])
+        # argmin returns the first one of equal distances, just like get_closest_plate
+        next_plates = distances.argmin(axis=1)
+        lengths += distances[starts, next_plates]
+        visited[starts, next_plates] = True
+        cur_plates = next_plates
+
+    return lengths
+
+
+def get_heuristic_matrix_np(objects, plates_locs, heuristic_func):
+    """
+    NumPy version of get_heuristic_matrix, for heuristic_1 and closest_plate_heuristic, with identical results.
+
+    The distances from every cell to every plate are built with broadcasting. After its first step, heuristic_1
+    only depends on which plate it went to, so its value is the distance to the closest plate, plus the greedy chain
+    length of that plate. Falls back to get_heuristic_matrix for other heuristics, or if NumPy is not installed.
+
+    :param objects: 2D list representing object layout.
+    :param plates_locs: List of plate locations [(x1, y1), ...].
+    :param heuristic_func: Function for object-plate heuristic calculation.
+    :return: Matrix of heuristic values for each object and plate.
+    """
+    if np is None or heuristic_func not in (heuristic_1, closest_plate_heuristic):
+        return get_heuristic_matrix(objects, plates_locs, heuristic_func)
+
+    num_rows, num_cols = len(objects), len(objects[0])
+    if not plates_locs:
+        return [[0 for _ in range(num_cols)] for _ in range(num_rows)]
+
+    plates = np.array(plates_locs)
+    distances = (np.abs(np.arange(num_rows)[:, None, None] - plates[:, 0]) +
+                 np.abs(np.arange(num_cols)[None, :, None] - plates[:, 1]))
+
+    heuristic_matrix = distances.min(axis=2)
+    if heuristic_func is heuristic_1:
+        heuristic_matrix += get_greedy_chain_lengths(plates)[distances.argmin(axis=2)]
+
+    return heuristic_matrix.tolist()
+
+
+def get_robot_heuristic(layout, heuristic_matrix):
+    """
+    Builds a state heuristic, which looks up the heuristic value of the robot cell.
+
+    :param layout: Static layout of the field.
+    :param heuristic_matrix: Matrix of heuristic values, as returned by get_heuristic_matrix.
+    :return: Function that returns the heuristic value of a state.
+    """
+    flat_matrix = tuple(h for row in heuristic_matrix for h in row)
+
+    def heuristic(state):
+        return flat_matrix[state.robot]
+
+    return heuristic
+
+
+def get_butter_heuristic(layout, heuristic_matrix):
+    """
+    Builds a state heuristic, which sums up the heuristic values of the cells of the butters that are not on a plate.
+    With a closest_plate_heuristic matrix, it is a lower bound of the remaining number of pushes.
+
+    :param layout: Static layout of the field.
+    :param heuristic_matrix: Matrix of heuristic values, as returned by get_heuristic_matrix.
+    :return: Function that returns the heuristic value of a state.
+    """
+    flat_matrix = tuple(h for row in heuristic_matrix for h in row)
+    plates = layout.plates
+
+    def heuristic(state):
+        return sum(flat_matrix[butter] for butter in state.butters if butter not in plates)
+
+    return heuristic
+
+
+def get_heuristic(layout, objects, plates_locs, mode="step", heuristic_name="default"):
+    """
+    Builds the state heuristic with the given name.
+
+    :param layout: Static layout of the field.
+    :param objects: 2D list representing object layout.
+    :param plates_locs: List of plate locations [(x1, y1), ...].
+    :param mode: "step" for single movements, or "push" for pushes.
+    :param heuristic_name: "default" (heuristic_1 of the robot in step mode, closest plate of the butters in push
+     mode), "push_distance" (admissible push distances with an optimal butter to plate assignment), or "pdb:PATH"
+     (a pattern database file built for the layout and mode by pattern_db.py).
+    :return: Function that returns the heuristic value of a state.
+    """
+    if heuristic_name.startswith("pdb:"):
+        return get_pattern_db_heuristic(layout, heuristic_name[len("pdb:"):], mode)
+
+    if heuristic_name == "push_distance":
+        return get_push_distance_heuristic(layout, robot_term=mode != "push")
+
+    if mode == "push":
+        return get_butter_heuristic(layout, get_heuristic_matrix_np(objects, plates_locs, closest_plate_heuristic))
+
+    return get_robot_heuristic(layout, get_heuristic_matrix_np(objects, plates_locs, heuristic_1))
+
+
+def update_frontier(frontier, best_g, closed, new_node, counter, stats):
     """
     Update frontier with new node if criteria met.
 
-    :param frontier: A list containing nodes that are candidates for exploration.
+    Instead of searching the frontier for a duplicate of new_node and replacing it (decrease-key),
+    a new heap entry is pushed whenever a cheaper path to a state is found. The outdated entries stay
+    in the heap, and are skipped when they are popped (lazy deletion).
+
+    :param frontier: A binary heap of (f, insertion order, node) entries that are candidates for exploration.
     :type frontier: list
 
-    :param explored: A set or list containing nodes that have already been explored.
-    :type explored: set or list
+    :param best_g: The lowest g cost found so far for each state in the frontier.
+    :type best_g: dict
+
+    :param closed: States that have already been explored.
+    :type closed: set
 
     :param new_node: The new node that needs to be considered for inclusion in the frontier.
     :type new_node: Node class or a similar structure
 
-    :return: None
+    :param counter: Source of insertion orders, so that nodes with equal f are expanded first in first out.
+    :type counter: itertools.count
+
+    :param stats: Statistics of the search, where dropped duplicates and open states pushed again with a lower g cost
+     (decrease-keys) are counted.
+    :type stats: SearchStats
+
+    :return: whether new_node was added to the frontier (False if it is a duplicate)
+    :rtype: bool
     """
-    if new_node not in explored:
-        duplicate_node = get_duplicate(frontier, new_node)
-        if duplicate_node is not None:
-            if new_node.cost_f < duplicate_node.cost_f:
-                frontier.remove(duplicate_node)
-                frontier.append(new_node)
-        else:
-            frontier.append(new_node)
+    state = new_node.state
+    if state in closed:
+        stats.duplicates += 1
+        return False
+
+    known_g = best_g.get(state)
+    if known_g is not None:
+        if new_node.cost_g >= known_g:
+            stats.duplicates += 1
+            return False
+        stats.decrease_keys += 1
 
-    frontier.sort(key=lambda x: x.cost_f)
+    best_g[state] = new_node.cost_g
+    heappush(frontier, (new_node.cost_f, next(counter), new_node))
+    return True
 
 
-def expand(node, costs, heuristic_matrix, frontier, explored, bookkeeping):
+def expand(node, layout, heuristic, frontier, best_g, closed, counter, stats, successors=get_successors,
+           update=update_frontier, hooks=NO_HOOKS):
     """
     Expand a node by generating child nodes through valid movements.
 
     :param node: The node to be expanded.
     :type node: Node class or similar structure
 
-    :param costs: Matrix of movement costs corresponding to each cell in the layout.
-    :type costs: list of lists
+    :param layout: Static layout of the field, holding the movement cost of each cell.
+    :type layout: Layout
 
-    :param heuristic_matrix: Matrix of heuristic values for object-plate distances.
-    :type heuristic_matrix: list of lists
+    :param heuristic: Function that returns the heuristic value of a state.
+    :type heuristic: function
 
-    :param frontier: List of nodes to be considered for future exploration.
+    :param frontier: Binary heap of nodes to be considered for future exploration.
     :type frontier: list
 
-    :param explored: List of nodes that have already been explored.
-    :type explored: list
+    :param best_g: The lowest g cost found so far for each state in the frontier.
+    :type best_g: dict
+
+    :param closed: States that have already been explored.
+    :type closed: set
+
+    :param counter: Source of insertion orders for the frontier entries.
+    :type counter: itertools.count
+
+    :param stats: Statistics of the search.
+    :type stats: SearchStats
 
-    :param bookkeeping: Dictionary for tracking various metrics.
-    :type bookkeeping: dict
+    :param successors: Successor generation function (single movements or pushes).
+    :type successors: function
+
+    :param update: Function that considers each child node for the frontier, with the same arguments and return
+     value as update_frontier (parallel A* sends the children to the workers that own them instead).
+    :type update: function
+
+    :param hooks: Callbacks of the on_generate and on_duplicate events.
+    :type hooks: SearchHooks
 
     :return: None
     """
-    objects, robot_loc, depth, g, f = node.objects, node.robot_loc, node.depth, node.cost_g, node.cost_f
+    state, depth, g, f = node.state, node.depth, node.cost_g, node.cost_f
+    on_generate, on_duplicate = hooks.on_generate, hooks.on_duplicate
 
-    valid_movements = get_valid_movements(objects, robot_loc)
-    for movement in valid_movements:
-        new_objects, new_robot_loc = perform_move(objects, robot_loc, movement)
+    for movement, new_state, cost in successors(layout, state):
+        new_g = g + cost
+        new_f = new_g + heuristic(new_state)
 
-        new_robot_x, new_robot_y = new_robot_loc
-        new_g = g + costs[new_robot_x][new_robot_y]
-        new_f = new_g + heuristic_matrix[new_robot_x][new_robot_y]
+        child_node = Node(new_state, depth + 1, movement, node, new_g, new_f)
+        stats.nodes_created += 1
+        if on_generate is not None:
+            on_generate(node, child_node)
 
-        child_node = Node(new_objects, new_robot_loc, depth + 1, movement, node, new_g, new_f)
-        bookkeeping["nodes_created"] += 1
-        update_frontier(frontier, explored, child_node)
+        if not update(frontier, best_g, closed, child_node, counter, stats) and on_duplicate is not None:
+            on_duplicate(child_node)
 
-    explored.append(node)
+    closed.add(state)
 
 
 def get_path(node):
@@ -152,30 +338,60 @@ def get_path(node):
     return path
 
 
-def a_star(costs, heuristic_matrix, root_node, max_depth, bookkeeping):
+def a_star(layout, heuristic, root_node, max_depth, stats, successors=get_successors, hooks=NO_HOOKS,
+           memory_budget=None, budget=NO_BUDGET):
     """
     Implementation of A* Alogorithm
 
-    :param costs: the cost matrix of all cells
-    :param heuristic_matrix: the calculated heuristic matrix
+    :param layout: static layout of the field, holding the cost of all cells
+    :param heuristic: function that returns the heuristic value of a state
     :param root_node: the node which the search algorithm starts with
     :param max_depth: maximum allowed depth
-    :param bookkeeping: a dictionary to store some info about algorithm while it is running
-     such as number of nodes created and number of nodes expanded
-    :type bookkeeping: dict
+    :param stats: statistics of the search, such as number of nodes created and number of nodes expanded
+    :type stats: SearchStats
+    :param successors: successor generation function (single movements or pushes)
+    :param hooks: callbacks of the search events
+    :type hooks: SearchHooks
+    :param memory_budget: maximum number of nodes in the frontier and the closed set (None for no limit).
+     When it is reached, MemoryBudgetExceeded is raised with the lowest f cost of the frontier, which is a lower bound
+     of the cost of the cheapest goal (with an admissible heuristic).
+    :type memory_budget: int
+    :param budget: limits of the search. When it is used up, BudgetExhausted is raised with the most promising node
+     reached: the one with the lowest heuristic value (closest to the goal), then the lowest f cost.
+    :type budget: SearchBudget
 
     :return:
     """
-    frontier, explored = [root_node], []
+    on_expand, on_goal = hooks.on_expand, hooks.on_goal
+    counter = count()
+    frontier = [(root_node.cost_f, next(counter), root_node)]
+    best_g = {root_node.state: root_node.cost_g}
+    closed = set()
 
     while frontier:
-        expanding_node = frontier.pop(0)
-        bookkeeping["nodes_expanded"] += 1
-
-        if is_in_goal(expanding_node.objects):
+        _, __, expanding_node = heappop(frontier)
+        if expanding_node.state in closed or expanding_node.cost_g > best_g[expanding_node.state]:
+            continue
+
+        if stats.nodes_expanded >= budget.next_check:
+            reason = budget.exhausted(stats)
+            if reason is not None:
+                nodes = [expanding_node] + [node for _, __, node in frontier]
+                raise BudgetExhausted(reason, min(nodes, key=lambda x: (x.cost_f - x.cost_g, x.cost_f)))
+        stats.nodes_expanded += 1
+        stats.depth_counts[expanding_node.depth] += 1
+
+        if is_in_goal(layout, expanding_node.state):
+            if on_goal is not None:
+                on_goal(expanding_node)
             return expanding_node
 
-        expand(expanding_node, costs, heuristic_matrix, frontier, explored, bookkeeping)
+        if on_expand is not None:
+            on_expand(expanding_node)
+        expand(expanding_node, layout, heuristic, frontier, best_g, closed, counter, stats, successors, hooks=hooks)
+        stats.update_peaks(len(frontier), len(closed))
+        if memory_budget is not None and frontier and len(frontier) + len(closed) >= memory_budget:
+            raise MemoryBudgetExceeded(frontier[0][0])
 
         if expanding_node.depth >= max_depth:
             break
@@ -183,33 +399,105 @@ def a_star(costs, heuristic_matrix, root_node, max_depth, bookkeeping):
     return None
 
 
-def main(test_case_path, max_depth):
-    max_depth = int(max_depth)
-    costs, objects, robot_loc, plates_locs = read_input(test_case_path)
-    bookkeeping = {
-        "nodes_created": 0,
-        "nodes_expanded": 0
-    }
-    robot_loc_x, robot_loc_y = robot_loc
+def solve(test_case_path, max_depth, mode="step", heuristic_name="default", timing=False, hooks=None,
+          memory_budget=None, budget=None):
+    """
+    Reads the given test case, and runs the A* algorithm on it.
 
-    heuristic_matrix = get_heuristic_matrix(objects, plates_locs, heuristic_1)
-    root_cost_g = 0
-    root_cost_f = heuristic_matrix[robot_loc_x][robot_loc_y]
+    With a memory budget, the search switches to IDA* (which only keeps its current path) when the frontier and the
+    closed set reach it. IDA* starts from the lowest f cost of the frontier, which is not more than the cost of the
+    cheapest goal, so with an admissible heuristic the found path is still a cheapest one.
 
-    root_node = Node(objects, robot_loc, 0, "", "", root_cost_g, root_cost_f)
+    :param test_case_path: path of the input file
+    :param max_depth: maximum allowed depth
+    :param mode: "step" for single movements, or "push" for pushes
+    :param heuristic_name: name of the heuristic, see get_heuristic
+    :param timing: whether to measure the time of the heuristic and successor generation calls
+    :param hooks: callbacks of the search events (SearchHooks), or None
+    :param memory_budget: maximum number of nodes, or bytes with a unit (see helper.parse_memory_budget),
+     None for no limit
+    :param budget: limits of the search (SearchBudget), or None. It is shared with the IDA* fallback.
+    :return: tuple of (layout, root state, path, stats), where path is the path from the root
+     (a MovePath, with single movements, also in push mode) or None if no path is found.
+     In push mode, the number of pushes is stored in stats.pushes, and if the memory budget is reached,
+     stats.details["fallback"] has the number of nodes and the threshold that IDA* starts with.
+     If the search budget runs out, path is None and the partial path of the most promising node is stored in
+     stats.details["timeout"] (see budget.record_timeout).
+    :rtype: tuple
+    """
+    max_depth = int(max_depth)
+    memory_budget = parse_memory_budget(memory_budget)
+    costs, objects, robot_loc, plates_locs = read_input(test_case_path)
+    layout = get_layout(costs, objects)
+    stats = SearchStats(timing)
 
-    final_node = a_star(costs, heuristic_matrix, root_node, max_depth, bookkeeping)
+    root_state = layout.make_state(objects, robot_loc)
+    heuristic = stats.timed_heuristic(get_heuristic(layout, objects, plates_locs, mode, heuristic_name))
+    if mode == "push":
+        start_state, successors = normalize_state(layout, root_state), get_push_successors
+    else:
+        start_state, successors = root_state, get_successors
+    successors = stats.timed_successors(successors)
 
-    if final_node is not None:
-        found_path = get_path(final_node)
-        pprint_path(found_path)
-        visualize(found_path)
+    root_cost_g = 0
+    root_cost_f = heuristic(start_state)
+
+    root_node = Node(start_state, 0, "", "", root_cost_g, root_cost_f)
+
+    hooks = hooks or NO_HOOKS
+    budget = budget or NO_BUDGET
+    try:
+        try:
+            final_node = a_star(layout, heuristic, root_node, max_depth, stats, successors, hooks, memory_budget,
+                                budget)
+        except MemoryBudgetExceeded as e:
+            stats.details["fallback"] = {
+                "algorithm": "ida_star",
+                "nodes": memory_budget,
+                "threshold": e.lower_bound
+            }
+            final_node = IDA_Star.ida_star(layout, heuristic, root_node, max_depth, stats, successors, hooks,
+                                           e.lower_bound, budget)
+    except BudgetExhausted as exhausted:
+        stats.stop()
+        record_timeout(stats, exhausted.reason, layout, root_state, exhausted.node, mode)
+        return layout, root_state, None, stats
+    stats.stop()
+
+    if final_node is None:
+        return layout, root_state, None, stats
+
+    if mode == "push":
+        stats.pushes = final_node.depth
+        return layout, root_state, get_push_path(layout, root_state, get_path(final_node)[1:]), stats
+
+    return layout, root_state, MovePath.from_node(layout, root_state, final_node), stats
+
+
+def main(test_case_path, max_depth, mode="step", heuristic_name="default", memory_budget=None, time_limit=None):
+    budget = SearchBudget(time_limit=time_limit) if time_limit is not None else None
+    layout, _, found_path, stats = cached_solve("a_star", solve, test_case_path, max_depth, mode, heuristic_name,
+                                                memory_budget=memory_budget, budget=budget)
+
+    if found_path is not None:
+        if mode == "push":
+            print(f"Pushes: {stats.pushes}")
+        pprint_path(found_path, layout)
+        visualize(found_path, layout)
         print(f"Path Movements: {get_path_movements(found_path)}")
         print("Depth Reached: ", len(found_path))
+    elif "timeout" in stats.details:
+        print_timeout(stats.details["timeout"])
     else:
         print("can't pass the butter")
 
-    print(f"Nodes Created: {bookkeeping['nodes_created']}, Nodes Expanded: {bookkeeping['nodes_expanded']}")
+    if "fallback" in stats.details:
+        fallback = stats.details["fallback"]
+        print(f"Memory budget of {fallback['nodes']} nodes reached, "
+              f"switched to IDA* with threshold {fallback['threshold']}")
+    if stats.details.get("cache") == "hit":
+        print("Solution found in the cache")
+    print(f"Nodes Created: {stats.nodes_created}, Nodes Expanded: {stats.nodes_expanded}")
 
 
 if __name__ == "__main__":
@@ -1,159 +1,600 @@
-from copy import deepcopy
+from collections import deque
+from multiprocessing import Process, Queue, Event
 from timeit import timeit
 
+import IDA_Star
+from budget import NO_BUDGET, SearchBudget, BudgetExhausted, record_timeout, print_timeout
 from GUI import visualize
-from helper import read_input, get_valid_movements, get_valid_backward_movements, get_goal_states_nodes, perform_move, \
-    perform_backward_move, get_path_movements, pprint_path, get_reverse_movement
+from helper import read_input, is_in_goal, get_successors, get_backward_successors, get_goal_states, \
+    get_goal_states_nodes, get_path_movements, pprint_path, parse_memory_budget, MemoryBudgetExceeded, WorkerError, \
+    get_worker_message
+from heuristics import get_push_distance_heuristic
+from hooks import NO_HOOKS
+from move_path import MovePath
 from node import Node
+from push import normalize_state, get_push_successors, get_backward_push_successors, get_push_goal_states, \
+    get_push_goal_states_nodes, expand_pushes
+from shared_table import SharedStateTable
+from solution_cache import cached_solve
+from state import get_layout
+from stats import SearchStats
 
 
-def get_intersection(forward_explored, backward_explored):
+def get_intersection(node, other_explored, direction="forward"):
     """
-    Iterates through two given lists, and checks to see if there is two nodes with
-    similar objects and robot location. if it found such two nodes, it returns them, otherwise returns None
-
-    :param forward_explored:
-    :type forward_explored: list
-    :param backward_explored:
-    :type backward_explored: list
-    :return: a tuple consisting two nodes that CHAIN the forward and backward path
+    Checks to see if the state of the given node has already been reached by the search in the other direction.
+    if it has, returns the two nodes that CHAIN the forward and backward path, otherwise returns None
+
+    :param node: newly generated node
+    :type node: Node
+    :param other_explored: state to node dictionary of the search in the other direction
+    :type other_explored: dict
+    :param direction: direction of the search that generated node
+    :type direction: str (from the values "forward", "backward")
+    :return: a tuple consisting of the forward node and the backward node, which both have the same state
     :rtype: tuple
     """
-    for forward_node in forward_explored:
-        for backward_node in backward_explored:
-            if forward_node == backward_node:
-                return forward_node, backward_node.parent
+    other_node = other_explored.get(node.state)
+    if other_node is None:
+        return None
 
-    return None
+    if direction == "forward":
+        return node, other_node
+    return other_node, node
 
 
-def _bfs(cur_node, frontier, bookkeeping, direction="forward"):
+def _bfs(layout, cur_node, frontier, explored, other_explored, stats, direction="forward",
+         successors=get_successors, backward_successors=get_backward_successors, hooks=NO_HOOKS):
     """
     Implementation of BFS (breadth first search) algorithm
 
-    :param cur_node:
-    :param frontier:
-    :param direction:
-    :return:
+    Generates the children of cur_node, and appends the ones with a state that is not reached yet to the frontier.
+
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param cur_node: node to be expanded
+    :type cur_node: Node
+    :param frontier: frontier of this direction
+    :type frontier: collections.deque
+    :param explored: state to node dictionary of every node reached in this direction (frontier included)
+    :type explored: dict
+    :param other_explored: state to node dictionary of every node reached in the other direction
+    :type other_explored: dict
+    :param stats: statistics of the search
+    :type stats: SearchStats
+    :param direction: direction of the search
+    :type direction: str (from the values "forward", "backward")
+    :param successors: forward successor generation function (single movements or pushes)
+    :type successors: function
+    :param backward_successors: backward successor generation function, which labels each node with the forward
+     movement that leads from it to its parent
+    :type backward_successors: function
+    :param hooks: callbacks of the on_generate and on_duplicate events
+    :type hooks: SearchHooks
+    :return: the intersection of two directions, if one of the children meets the other direction, otherwise None
+    :rtype: tuple
     """
-    objects, robot_loc, depth = cur_node.objects, cur_node.robot_loc, cur_node.depth
+    state, depth = cur_node.state, cur_node.depth
 
     children = []
     if direction == "forward":
-        valid_movements = get_valid_movements(objects, robot_loc)
-        for movement in valid_movements:
-            new_objects, new_robot_loc = perform_move(objects, robot_loc, movement)
-
-            child_node = Node(new_objects, new_robot_loc, depth + 1, movement, cur_node)
+        for movement, new_state, _ in successors(layout, state):
+            child_node = Node(new_state, depth + 1, movement, cur_node)
             children.append(child_node)
 
     elif direction == "backward":
-        valid_movements = get_valid_backward_movements(objects, robot_loc)
-        for movement in valid_movements:
-            new_objects_ls, new_robot_loc = perform_backward_move(objects, robot_loc, movement)
+        for movement, new_state in backward_successors(layout, state):
+            child_node = Node(new_state, depth + 1, movement, cur_node)
+            children.append(child_node)
 
-            for new_objects in new_objects_ls:
-                child_node = Node(new_objects, new_robot_loc, depth + 1, movement, cur_node)
-                children.append(child_node)
+    on_generate, on_duplicate = hooks.on_generate, hooks.on_duplicate
+    for child in children:
+        if on_generate is not None:
+            on_generate(cur_node, child)
 
-    children_not_in_frontier = [child for child in children if child not in frontier]
-    bookkeeping["nodes_created"] += len(children_not_in_frontier)
-    frontier += children_not_in_frontier
-    return frontier
+        if child.state in explored:
+            stats.duplicates += 1
+            if on_duplicate is not None:
+                on_duplicate(child)
+            continue
+
+        stats.nodes_created += 1
+        explored[child.state] = child
+        frontier.append(child)
+
+        intersection = get_intersection(child, other_explored, direction)
+        if intersection is not None:
+            return intersection
+
+    return None
 
 
-def normalize_path(intersection):
+def join_movements(intersection):
     """
-    Concatenates lists of forward path and reverse of backward path, in order to output the
-    final result path.
+    Concatenates the movements of the forward path and of the reversed backward path, in order to output the
+    final result path, without building any node for it.
 
-    :param intersection: a tuple consisting two nodes that CHAIN the forward and backward path
+    Backward nodes are labelled with the movement that leads from them to their parent, so the backward half
+    is already in the forward order when it is followed from the intersection up to its root (a goal state).
+
+    :param intersection: a tuple consisting of the forward node and the backward node, which have the same state
     :type intersection: tuple
-    :return: concatenated list of forward path and backward path reversed
-    :rtype: list
+    :return: tuple of the list of movements from the root to the goal, and the goal state
+    :rtype: tuple
     """
     forward_node, backward_node = intersection
 
-    path1, path2 = [], []
-    forward_node_copy = deepcopy(forward_node)
-    backward_node_copy = deepcopy(backward_node)
+    movements = []
+    while forward_node.depth > 0:
+        movements.append(forward_node.movement)
+        forward_node = forward_node.parent
+    movements.reverse()
 
-    while forward_node_copy.depth > 0:
-        path1.insert(0, forward_node_copy)
-        forward_node_copy = deepcopy(forward_node_copy.parent)
+    while backward_node.parent != "":
+        movements.append(backward_node.movement)
+        backward_node = backward_node.parent
 
-    while type(backward_node_copy) != str and backward_node_copy.depth >= 0:
-        backward_node_copy.movement = get_reverse_movement(backward_node_copy.movement)
-        path2.append(backward_node_copy)
-        backward_node_copy = deepcopy(backward_node_copy.parent)
+    return movements, backward_node.state
 
-    concatenated_path = path1 + path2
-    return concatenated_path
+
+def _reach_goal(intersection, hooks):
+    """
+    joins the movements of the given intersection, and calls the on_goal hook with a node of the goal
+    """
+    movements, goal_state = join_movements(intersection)
+    if hooks.on_goal is not None:
+        hooks.on_goal(Node(goal_state, len(movements), movements[-1] if movements else "", ""))
+    return movements
 
 
-def bbfs(forward_frontier, backward_frontier, bookkeeping):
+def bbfs(layout, forward_frontier, backward_frontier, stats, successors=get_successors,
+         backward_successors=get_backward_successors, hooks=NO_HOOKS, memory_budget=None, budget=NO_BUDGET):
     """
     Implementation of BBFS (bidirectional Breadth first search) algorithm.
 
+    Both directions keep a dictionary from state to node of everything they have reached, so
+    a meeting is detected in O(1) as soon as a node is generated.
+
+    :param layout: static layout of the field
+    :type layout: Layout
     :param forward_frontier: the initial list of frontier in forward direction
     :type forward_frontier: list
     :param backward_frontier: the initial list of frontier in backward direction
     :type backward_frontier: list
-    :param bookkeeping: a dictionary to store some info about algorithm while it is running
-     such as number of nodes created and number of nodes expanded
-    :type bookkeeping: dict
-    :return: if the goal is reachable path to the goal (as a list of nodes), otherwise an empty list
+    :param stats: statistics of the search, such as number of nodes created and number of nodes expanded.
+     The frontier and closed sizes are the sums of the two directions.
+    :type stats: SearchStats
+    :param successors: forward successor generation function (single movements or pushes)
+    :type successors: function
+    :param backward_successors: backward successor generation function, matching successors
+    :type backward_successors: function
+    :param hooks: callbacks of the search events
+    :type hooks: SearchHooks
+    :param memory_budget: maximum number of nodes reached by the two directions (None for no limit).
+     When it is reached, MemoryBudgetExceeded is raised with a lower bound of the length of the shortest path:
+     every state up to the depth of the head of each frontier is already reached by that direction,
+     so the two directions would have met on any path that is not longer than the sum of the two depths.
+    :type memory_budget: int
+    :param budget: limits of the search. When it is used up, BudgetExhausted is raised with the forward node that
+     has the most butters on plates (the shallowest one of them).
+    :type budget: SearchBudget
+    :return: if the goal is reachable, list of movements from the root to the goal, otherwise an empty list
     :rtype: list
     """
-    forward_explored = []
-    backward_explored = []
+    on_expand = hooks.on_expand
+    forward_frontier, backward_frontier = deque(forward_frontier), deque(backward_frontier)
+    forward_explored = {node.state: node for node in forward_frontier}
+    backward_explored = {node.state: node for node in backward_frontier}
+
+    for node in forward_frontier:
+        intersection = get_intersection(node, backward_explored, direction="forward")
+        if intersection is not None:
+            return _reach_goal(intersection, hooks)
 
     while forward_frontier or backward_frontier:
+        if stats.nodes_expanded >= budget.next_check:
+            reason = budget.exhausted(stats)
+            if reason is not None:
+                plates = layout.plates
+                raise BudgetExhausted(reason, min(forward_explored.values(), key=lambda x: (
+                    -sum(butter in plates for butter in x.state.butters), x.depth)))
+
         if forward_frontier:
-            expanding_node = forward_frontier.pop(0)
-            forward_explored.append(expanding_node)
-            bookkeeping["nodes_expanded"] += 1
+            expanding_node = forward_frontier.popleft()
+            stats.nodes_expanded += 1
+            stats.depth_counts[expanding_node.depth] += 1
+            if on_expand is not None:
+                on_expand(expanding_node)
 
-            _bfs(expanding_node, forward_frontier, bookkeeping, direction='forward')
+            intersection = _bfs(layout, expanding_node, forward_frontier, forward_explored, backward_explored,
+                                stats, "forward", successors, backward_successors, hooks)
+            if intersection is not None:
+                return _reach_goal(intersection, hooks)
 
         if backward_frontier:
-            expanding_node = backward_frontier.pop(0)
-            backward_explored.append(expanding_node)
-            bookkeeping["nodes_expanded"] += 1
+            expanding_node = backward_frontier.popleft()
+            stats.nodes_expanded += 1
+            stats.depth_counts[expanding_node.depth] += 1
+            if on_expand is not None:
+                on_expand(expanding_node)
+
+            intersection = _bfs(layout, expanding_node, backward_frontier, backward_explored, forward_explored,
+                                stats, "backward", successors, backward_successors, hooks)
+            if intersection is not None:
+                return _reach_goal(intersection, hooks)
+
+        stats.update_peaks(len(forward_frontier) + len(backward_frontier),
+                           len(forward_explored) + len(backward_explored))
+
+        if memory_budget is not None and len(forward_explored) + len(backward_explored) >= memory_budget:
+            # a direction that has run out of states without meeting the other one has reached all the states
+            # on its side, including the start (or a goal) if there was a path
+            if not forward_frontier or not backward_frontier:
+                return []
+            raise MemoryBudgetExceeded(forward_frontier[0].depth + backward_frontier[0].depth + 1)
 
-            _bfs(expanding_node, backward_frontier, bookkeeping, direction='backward')
+    return []
 
-        intersection = get_intersection(forward_explored, backward_explored)
-        if intersection is not None:
-            path = normalize_path(intersection)
-            return path
 
-    return []
+def _parallel_bfs(layout, direction, *args):
+    """
+    Runs _run_parallel_bfs in a process of parallel_bbfs, and sends the exception that it raises (if any) to
+    parallel_bbfs as a WorkerError, through the results queue (the last argument).
+    """
+    try:
+        _run_parallel_bfs(layout, direction, *args)
+    except Exception as e:
+        args[-1].put(WorkerError(f"{direction} search failed: {e!r}"))
+
+
+def _run_parallel_bfs(layout, direction, start_states, own_table_name, other_table_name, num_butters, capacity,
+                      successors, backward_successors, stop, results):
+    """
+    BFS of one direction of parallel_bbfs, which runs in its own process.
+
+    Every reached state is written to the shared table of this direction (with its parent slot and movement) BEFORE
+    the table of the other direction is probed for it. So, whichever direction reaches a common state second,
+    finds it in the other table.
+
+    :param direction: direction of the search
+    :type direction: str (from the values "forward", "backward")
+    :param start_states: states to start from (the root, or the goal states)
+    :type start_states: list
+    :param stop: event that is set when the other direction has found a meeting
+    :type stop: multiprocessing.Event
+    :param results: queue to put (direction, meeting, stats) into at the end, where meeting is a
+     (slot in the table of this direction, slot in the table of the other direction) tuple, or None.
+     The forward search also meets the goal states by itself, with a backward slot of -1.
+    :type results: multiprocessing.Queue
+    """
+    own_table = SharedStateTable(num_butters, capacity, own_table_name)
+    other_table = SharedStateTable(num_butters, capacity, other_table_name)
+    stats = SearchStats()
+
+    def reach(state, parent_slot, movement):
+        slot = own_table.insert(state, parent_slot, movement)
+        explored[state] = slot
+        frontier.append((state, slot))
+
+        # the forward search does not have to wait for the goal states to be written by the backward search
+        if direction == "forward" and is_in_goal(layout, state):
+            return slot, -1
+
+        other_slot = other_table.find(state)
+        return (slot, other_slot) if other_slot >= 0 else None
+
+    explored, frontier = {}, deque()
+    meeting = None
+    try:
+        for state in start_states:
+            meeting = meeting or reach(state, -1, "")
+
+        while frontier and meeting is None:
+            if stats.nodes_expanded % 64 == 0:
+                if stop.is_set():
+                    break
+                stats.update_peaks(len(frontier), len(explored))
+
+            state, slot = frontier.popleft()
+            stats.nodes_expanded += 1
+
+            if direction == "forward":
+                children = [(movement, new_state) for movement, new_state, _ in successors(layout, state)]
+            else:
+                children = backward_successors(layout, state)
+
+            for movement, new_state in children:
+                if new_state in explored:
+                    stats.duplicates += 1
+                    continue
+
+                stats.nodes_created += 1
+                meeting = reach(new_state, slot, movement)
+                if meeting is not None:
+                    break
+    except MemoryError as e:
+        stats.details["error"] = str(e)
+    finally:
+        own_table.close()
+        other_table.close()
+
+    stats.update_peaks(len(frontier), len(explored))
+    stats.stop()
+    results.put((direction, meeting, stats))
+
+
+def parallel_bbfs(layout, forward_states, backward_states, stats, successors=get_successors,
+                  backward_successors=get_backward_successors, capacity=1 << 20):
+    """
+    Bidirectional BFS, where the two directions run in two processes.
+
+    Each direction publishes the states it reaches to its own SharedStateTable, which the other direction probes.
+    The slot of the parent and the movement are stored with each state, so when the directions meet, the path is
+    stitched from the two tables, and no nodes are sent between the processes.
+    When one direction runs out of states, the other one goes on (it may still reach a state of the first one),
+    and if both of them run out, there is no path.
+    A direction whose table is full stops with an error, and the search is marked incomplete, since None then does
+    not mean that there is no path (and a path that the other direction finds may not be the shortest one).
+
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param forward_states: states to start the forward search from
+    :type forward_states: list
+    :param backward_states: goal states to start the backward search from
+    :type backward_states: list
+    :param stats: statistics of the search, such as number of nodes created and number of nodes expanded.
+     The stats of each direction are stored in its "forward" and "backward" details, and the errors of the
+     directions in its "incomplete" details, if any direction stopped with one.
+    :type stats: SearchStats
+    :param successors: forward successor generation function (single movements or pushes)
+    :type successors: function
+    :param backward_successors: backward successor generation function, matching successors
+    :type backward_successors: function
+    :param capacity: number of slots of each shared table
+    :type capacity: int
+    :return: list of movements from the start to a goal, or None if no path is found
+    :rtype: list
+    :raises WorkerError: if a direction fails with another error than a full table, or its process dies
+     (the other direction is terminated)
+    """
+    num_butters = len(forward_states[0].butters)
+    tables = {"forward": SharedStateTable(num_butters, capacity), "backward": SharedStateTable(num_butters, capacity)}
+    stop, results = Event(), Queue()
+
+    processes = []
+    for direction, other_direction, start_states in (("forward", "backward", forward_states),
+                                                     ("backward", "forward", backward_states)):
+        processes.append(Process(target=_parallel_bfs, args=(layout, direction, start_states, tables[direction].name,
+                                                              tables[other_direction].name, num_butters, capacity,
+                                                              successors, backward_successors, stop, results)))
+    try:
+        for process in processes:
+            process.start()
+
+        meetings = []
+        try:
+            for _ in processes:
+                direction, meeting, direction_stats = get_worker_message(results, processes)
+                if meeting is not None:
+                    stop.set()
+                    meetings.append(meeting if direction == "forward" else meeting[::-1])
+
+                stats.details[direction] = direction_stats
+                stats.merge(direction_stats)
+        except BaseException:
+            for process in processes:
+                process.terminate()
+                process.join()
+            raise
+
+        for process in processes:
+            process.join()
+
+        errors = [f"{direction}: {stats.details[direction].details['error']}"
+                  for direction in ("forward", "backward") if "error" in stats.details[direction].details]
+        if errors:
+            stats.details["incomplete"] = "; ".join(errors)
+
+        # both directions may have met (before they were stopped), so the shorter path is taken
+        paths = []
+        for forward_slot, backward_slot in meetings:
+            forward_movements = tables["forward"].get_movements(forward_slot)
+            forward_movements.reverse()
+            paths.append(forward_movements + tables["backward"].get_movements(backward_slot))
+
+        return min(paths, key=len) if paths else None
+    finally:
+        for table in tables.values():
+            table.close()
+            table.unlink()
+
+
+def shortest_path_ida_star(layout, costs, objects, root_state, max_depth, stats, successors, hooks, threshold, budget,
+                           mode="step"):
+    """
+    Finds a shortest path with IDA*, where every movement (or push) costs 1, which is the fallback of BBFS when the
+    memory budget is reached. Unlike IDS, the search skips the states on its current path and the states that
+    can not reach the goal (infinite heuristic), so it also ends on the boards that have no path.
+
+    The heuristic is the push distance heuristic of the same board with unit costs, which counts the pushes (and
+    the walking steps in step mode) that are still needed, so the path is still a shortest one.
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param costs: 2d list of the cost of each cell, as returned by read_input
+    :type costs: list
+    :param objects: 2d list of the objects of each cell, as returned by read_input
+    :type objects: list
+    :param root_state: state that the search starts from (normalized in push mode)
+    :type root_state: State
+    :param max_depth: maximum allowed depth
+    :type max_depth: int
+    :param stats: search statistics, updated in place
+    :type stats: SearchStats
+    :param successors: successor generation function (single movements or pushes)
+    :type successors: function
+    :param hooks: callbacks of the search events (SearchHooks)
+    :param threshold: length that no path is shorter than (the lower bound of bbfs)
+    :type threshold: int
+    :param budget: limits of the search (SearchBudget)
+    :param mode: "step" for single movements, or "push" for pushes
+    :type mode: str
+    :return: list of the movements (or pushes) of the path, or None if there is no path within max_depth
+    :rtype: list
+    """
+    unit_layout = get_layout([[None if cost is None else 1 for cost in row] for row in costs], objects)
+    heuristic = get_push_distance_heuristic(unit_layout, robot_term=mode != "push")
 
+    def unit_successors(layout, state):
+        return [(movement, new_state, 1) for movement, new_state, _ in successors(layout, state)]
 
-def main(test_case_path):
-    _, objects, robot_loc, __ = read_input(test_case_path)
-    bookkeeping = {
-        "nodes_created": 0,
-        "nodes_expanded": 0
-    }
+    root_node = Node(root_state, 0, "", "", 0, heuristic(root_state))
+    node = IDA_Star.ida_star(layout, heuristic, root_node, max_depth, stats, unit_successors, hooks, threshold, budget)
+    if node is None:
+        return None
 
-    starting_node = Node(objects, robot_loc, 0, "", "")
-    forward_frontier = [starting_node]
-    backward_frontier = get_goal_states_nodes(objects)
+    movements = []
+    while node.parent != "":
+        movements.append(node.movement)
+        node = node.parent
+    movements.reverse()
+    return movements
 
-    found_path = bbfs(forward_frontier, backward_frontier, bookkeeping)
 
-    if found_path:
-        pprint_path(found_path)
-        visualize(found_path)
+def solve(test_case_path, mode="step", parallel=False, timing=False, hooks=None, memory_budget=None, max_depth=250,
+          budget=None):
+    """
+    Reads the given test case, and runs the BBFS algorithm on it.
+
+    With a memory budget, the search switches to IDA* (which only keeps its current path) when the two directions
+    reach it. IDA* starts from a threshold that no shorter path can have (see bbfs), and every movement costs 1 in
+    it, so the found path is still a shortest one (see shortest_path_ida_star).
+
+    :param test_case_path: path of the input file
+    :param mode: "step" for single movements, or "push" for pushes
+    :param parallel: if True, the two directions run in two processes (see parallel_bbfs)
+    :param timing: whether to measure the time of the successor generation calls (not in parallel)
+    :param hooks: callbacks of the search events (SearchHooks), or None. They can not be used in parallel.
+    :param memory_budget: maximum number of nodes, or bytes with a unit (see helper.parse_memory_budget),
+     None for no limit. The parallel search has fixed size tables instead.
+    :param max_depth: maximum depth of IDA*, after the memory budget is reached
+    :param budget: limits of the search (SearchBudget), or None. It is shared with the IDA* fallback, and can not
+     be used in parallel.
+    :return: tuple of (layout, root state, path, stats), where path is the path after the root (a MovePath, with
+     single movements, also in push mode) or None if no path is found.
+     In push mode, the number of pushes is stored in stats.pushes, and if the memory budget is reached,
+     stats.details["fallback"] has the number of nodes and the threshold that IDA* starts with.
+     If the search budget runs out, path is None and the partial path of the most promising forward node is stored
+     in stats.details["timeout"] (see budget.record_timeout).
+    :rtype: tuple
+    """
+    if parallel and hooks is not None:
+        raise ValueError("search hooks can not be used with worker processes")
+    if parallel and memory_budget is not None:
+        raise ValueError("the parallel search has fixed size tables, and no memory budget")
+    if parallel and budget is not None:
+        raise ValueError("a search budget can not be used with worker processes")
+    memory_budget = parse_memory_budget(memory_budget)
+
+    costs, objects, robot_loc, _ = read_input(test_case_path)
+    layout = get_layout(costs, objects)
+    stats = SearchStats(timing)
+
+    starting_state = layout.make_state(objects, robot_loc)
+    if mode == "push":
+        successors, backward_successors = get_push_successors, get_backward_push_successors
+    else:
+        successors, backward_successors = get_successors, get_backward_successors
+
+    if parallel:
+        if mode == "push":
+            forward_states = [normalize_state(layout, starting_state)]
+            backward_states = get_push_goal_states(layout, starting_state)
+        else:
+            forward_states, backward_states = [starting_state], get_goal_states(layout, starting_state)
+
+        movements = parallel_bbfs(layout, forward_states, backward_states, stats, successors, backward_successors)
+        stats.stop()
+        if not movements:
+            return layout, starting_state, None, stats
+
+        if mode == "push":
+            stats.pushes = len(movements)
+            movements = expand_pushes(layout, starting_state, movements)
+        return layout, starting_state, MovePath(layout, starting_state, movements), stats
+
+    if mode == "push":
+        forward_frontier = [Node(normalize_state(layout, starting_state), 0, "", "")]
+        backward_frontier = get_push_goal_states_nodes(layout, starting_state)
+    else:
+        forward_frontier = [Node(starting_state, 0, "", "")]
+        backward_frontier = get_goal_states_nodes(layout, starting_state)
+
+    successors = stats.timed_successors(successors)
+    hooks = hooks or NO_HOOKS
+    budget = budget or NO_BUDGET
+    try:
+        try:
+            movements = bbfs(layout, forward_frontier, backward_frontier, stats, successors,
+                             stats.timed_successors(backward_successors), hooks, memory_budget, budget)
+        except MemoryBudgetExceeded as e:
+            stats.details["fallback"] = {
+                "algorithm": "ida_star",
+                "nodes": memory_budget,
+                "threshold": e.lower_bound
+            }
+            movements = shortest_path_ida_star(layout, costs, objects, forward_frontier[0].state, int(max_depth),
+                                               stats, successors, hooks, e.lower_bound, budget, mode)
+    except BudgetExhausted as exhausted:
+        stats.stop()
+        record_timeout(stats, exhausted.reason, layout, starting_state, exhausted.node, mode)
+        return layout, starting_state, None, stats
+    stats.stop()
+
+    if not movements:
+        return layout, starting_state, None, stats
+
+    if mode == "push":
+        stats.pushes = len(movements)
+        movements = expand_pushes(layout, starting_state, movements)
+
+    return layout, starting_state, MovePath(layout, starting_state, movements), stats
+
+
+def main(test_case_path, mode="step", parallel=False, memory_budget=None, time_limit=None):
+    parallel = parallel in (True, "parallel")
+    budget = SearchBudget(time_limit=time_limit) if time_limit is not None else None
+    layout, _, found_path, stats = cached_solve("bbfs", solve, test_case_path, mode, parallel,
+                                                memory_budget=memory_budget, budget=budget)
+
+    if found_path is not None:
+        if mode == "push":
+            print(f"Pushes: {stats.pushes}")
+        pprint_path(found_path, layout)
+        visualize(found_path, layout)
         print(f"Path Movements: {get_path_movements(found_path)}")
         print("Depth Reached: ", len(found_path))
 
+    elif "timeout" in stats.details:
+        print_timeout(stats.details["timeout"])
     else:
         print("can't pass the butter")
 
-    print(f"Nodes Created: {bookkeeping['nodes_created']}, Nodes Expanded: {bookkeeping['nodes_expanded']}")
+    for direction in ("forward", "backward"):
+        if direction in stats.details:
+            direction_stats = stats.details[direction]
+            print(f"{direction.capitalize()}: Nodes Created: {direction_stats.nodes_created}, "
+                  f"Nodes Expanded: {direction_stats.nodes_expanded}")
+            if "error" in direction_stats.details:
+                print(f"{direction.capitalize()} Error: {direction_stats.details['error']}")
+    if "incomplete" in stats.details:
+        print("The search is incomplete, the result may not be the shortest path (or a path may exist)")
+    if "fallback" in stats.details:
+        fallback = stats.details["fallback"]
+        print(f"Memory budget of {fallback['nodes']} nodes reached, "
+              f"switched to IDA* from threshold {fallback['threshold']}")
+    if stats.details.get("cache") == "hit":
+        print("Solution found in the cache")
+    print(f"Nodes Created: {stats.nodes_created}, Nodes Expanded: {stats.nodes_expanded}")
 
 
 if __name__ == "__main__":
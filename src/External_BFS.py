@@ -0,0 +1,318 @@
+import mmap
+import os
+import struct
+import tempfile
+from heapq import merge
+from timeit import timeit
+
+from budget import NO_BUDGET, SearchBudget, BudgetExhausted, record_timeout, print_timeout
+from GUI import visualize
+from helper import read_input, is_in_goal, get_successors, get_backward_successors, get_path_movements, \
+    pprint_path
+from move_path import MovePath
+from push import normalize_state, get_push_successors, get_backward_push_successors, expand_pushes
+from solution_cache import cached_solve
+from state import get_layout
+from stats import SearchStats
+
+
+def get_record_struct(layout, num_butters):
+    """
+    States are packed as the robot cell followed by the (sorted) butter cells, in big endian, so that the order of
+    the packed bytes is the order of the cells, and the records can be sorted and merged as bytes.
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param num_butters: number of butters of the board
+    :type num_butters: int
+    :rtype: struct.Struct
+    """
+    cell_format = "H" if layout.num_cells <= 0xFFFF else "I"
+    return struct.Struct(f">{num_butters + 1}{cell_format}")
+
+
+def write_records(path, records):
+    """
+    writes the given records to a new file
+    :return: number of bytes written
+    :rtype: int
+    """
+    with open(path, "wb") as file:
+        file.write(b"".join(records))
+        return file.tell()
+
+
+def read_records(path, record_size):
+    """
+    Reads the records of a file sequentially, through mmap.
+    :return: generator of the records (as bytes)
+    """
+    if os.path.getsize(path) == 0:
+        return
+
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        mm.madvise(mmap.MADV_SEQUENTIAL)
+        for offset in range(0, len(mm), record_size):
+            yield mm[offset:offset + record_size]
+
+
+def contains_record(path, record, record_size):
+    """
+    Binary search of a record in a sorted file, through mmap.
+    :rtype: bool
+    """
+    if os.path.getsize(path) == 0:
+        return False
+
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        low, high = 0, len(mm) // record_size
+        while low < high:
+            middle = (low + high) // 2
+            middle_record = mm[middle * record_size:(middle + 1) * record_size]
+            if middle_record < record:
+                low = middle + 1
+            elif middle_record > record:
+                high = middle
+            else:
+                return True
+
+    return False
+
+
+def remove_duplicates(records, old_records):
+    """
+    Removes the records that are equal to the previous one, or to a record of one of the old streams.
+    All the streams must be sorted, and they are only read forward, so it is a single sequential pass over each one.
+    :param records: sorted iterable of the new records
+    :param old_records: list of sorted iterables of the records of the previous layers
+    :return: generator of the unique new records, in sorted order
+    """
+    old_records = [iter(records) for records in old_records]
+    old_heads = [next(records, None) for records in old_records]
+
+    last_record = None
+    for record in records:
+        if record == last_record:
+            continue
+        last_record = record
+
+        duplicate = False
+        for i, old_records_i in enumerate(old_records):
+            while old_heads[i] is not None and old_heads[i] < record:
+                old_heads[i] = next(old_records_i, None)
+            if old_heads[i] == record:
+                duplicate = True
+
+        if not duplicate:
+            yield record
+
+
+def external_bfs(layout, start_state, max_depth, stats, successors=get_successors,
+                 backward_successors=get_backward_successors, work_dir=None, chunk_size=1 << 20,
+                 duplicate_layers=None, budget=NO_BUDGET):
+    """
+    Breadth first search that keeps its layers on disk, with delayed duplicate detection.
+
+    Every layer is a file of the sorted, packed states at that depth. To build the next layer, the states of the
+    current one are read sequentially and expanded, and their children are collected in memory up to chunk_size,
+    sorted and written as a run file. The runs are then merged, and the merged stream is scanned together with the
+    previous layers (also sorted), so duplicates are removed without any in-memory set of the reached states.
+    Every file is read and written in order, so the search is bound by sequential I/O.
+
+    By default, duplicates are removed against all the previous layers, so every state is expanded once, and the
+    search ends on a board without a path when a layer is empty. Each merge then reads all the previous layers.
+    With duplicate_layers, only that many of the last layers are read. It is an approximation with a bounded cost
+    per layer: a push can not be undone by one move, so a state may come back after more layers than that, and be
+    expanded again. The first layer that has a goal is still the shallowest one, but a board without a path may be
+    searched all the way to max_depth (or until the budget runs out), since its layers may never become empty.
+
+    When a goal is found, the path is rebuilt backward: in each earlier layer, a predecessor of the current state is
+    looked up with binary search (and checked with the forward successors, which prune dead cells).
+
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param start_state: state to start from (normalized in push mode)
+    :type start_state: State
+    :param max_depth: maximum depth of the search
+    :type max_depth: int
+    :param stats: statistics of the search. The number of bytes written to disk is stored in its "disk_bytes_written"
+     details, and the size of each layer in its depth counts.
+    :type stats: SearchStats
+    :param successors: forward successor generation function (single movements or pushes)
+    :type successors: function
+    :param backward_successors: backward successor generation function, matching successors
+    :type backward_successors: function
+    :param work_dir: directory of the layer files (None for a temporary directory, removed at the end)
+    :type work_dir: str
+    :param chunk_size: number of children that are sorted in memory before they are written as a run
+    :type chunk_size: int
+    :param duplicate_layers: number of previous layers that duplicates are removed against (None for all)
+    :type duplicate_layers: int
+    :param budget: limits of the search, BudgetExhausted is raised (without a node, the layers have no parents)
+     once it is used up
+    :type budget: SearchBudget
+    :return: list of movements from the start to a goal, or None if no path is found within max_depth
+    :rtype: list
+    """
+    if work_dir is None:
+        with tempfile.TemporaryDirectory(prefix="external_bfs_") as temp_dir:
+            return external_bfs(layout, start_state, max_depth, stats, successors, backward_successors, temp_dir,
+                                chunk_size, duplicate_layers, budget)
+
+    record = get_record_struct(layout, len(start_state.butters))
+    record_size = record.size
+
+    def pack(state):
+        return record.pack(state.robot, *state.butters)
+
+    def unpack(packed_state):
+        cells = record.unpack(packed_state)
+        return layout.make_state_from_cells(cells[0], cells[1:])
+
+    def layer_path(depth):
+        return os.path.join(work_dir, f"layer_{depth}.bin")
+
+    stats.details["disk_bytes_written"] = write_records(layer_path(0), [pack(start_state)])
+    stats.depth_counts[0] = 1
+    goal_record = pack(start_state) if is_in_goal(layout, start_state) else None
+
+    depth = 0
+    while goal_record is None and depth < max_depth and stats.depth_counts[depth]:
+        depth += 1
+
+        # expand the previous layer into sorted runs
+        run_paths, children = [], []
+        for packed_state in read_records(layer_path(depth - 1), record_size):
+            if stats.nodes_expanded >= budget.next_check:
+                budget.check(stats)
+            stats.nodes_expanded += 1
+            for _, new_state, __ in successors(layout, unpack(packed_state)):
+                children.append(pack(new_state))
+
+            if len(children) >= chunk_size:
+                run_paths.append(os.path.join(work_dir, f"run_{depth}_{len(run_paths)}.bin"))
+                stats.details["disk_bytes_written"] += write_records(run_paths[-1], sorted(children))
+                stats.nodes_created += len(children)
+                children = []
+
+        runs = [read_records(run_path, record_size) for run_path in run_paths]
+        if children:
+            runs.append(iter(sorted(children)))
+            stats.nodes_created += len(children)
+
+        # merge the runs into the new layer, without the states of the previous layers
+        first_old_layer = 0 if duplicate_layers is None else max(0, depth - duplicate_layers)
+        old_layers = [read_records(layer_path(old_depth), record_size) for old_depth in range(first_old_layer, depth)]
+
+        layer_size = 0
+        with open(layer_path(depth), "wb") as layer_file:
+            for packed_state in remove_duplicates(merge(*runs), old_layers):
+                layer_file.write(packed_state)
+                layer_size += 1
+                if goal_record is None:
+                    cells = record.unpack(packed_state)
+                    if all(butter in layout.plates for butter in cells[1:]):
+                        goal_record = packed_state
+            stats.details["disk_bytes_written"] += layer_file.tell()
+
+        for run_path in run_paths:
+            os.remove(run_path)
+
+        stats.depth_counts[depth] = layer_size
+        stats.duplicates = stats.nodes_created - sum(stats.depth_counts.values()) + 1
+        stats.update_peaks(layer_size, 0)
+
+    if goal_record is None:
+        return None
+
+    # rebuild the path backward, through the layers
+    movements = []
+    state = unpack(goal_record)
+    for layer_depth in range(depth - 1, -1, -1):
+        for movement, prev_state in backward_successors(layout, state):
+            if not contains_record(layer_path(layer_depth), pack(prev_state), record_size):
+                continue
+            if any(new_movement == movement and new_state == state
+                   for new_movement, new_state, _ in successors(layout, prev_state)):
+                movements.append(movement)
+                state = prev_state
+                break
+
+    movements.reverse()
+    return movements
+
+
+def solve(test_case_path, max_depth, mode="step", work_dir=None, chunk_size=1 << 20, budget=None):
+    """
+    Reads the given test case, and runs the external memory BFS algorithm on it.
+
+    :param test_case_path: path of the input file
+    :param max_depth: maximum allowed depth
+    :param mode: "step" for single movements, or "push" for pushes
+    :param work_dir: directory of the layer files (None for a temporary directory)
+    :param chunk_size: number of children that are sorted in memory at once
+    :param budget: limits of the search (SearchBudget), or None
+    :return: tuple of (layout, root state, path, stats), where path is the path after the root
+     (a MovePath, with single movements, also in push mode) or None if no path is found.
+     In push mode, the number of pushes is stored in stats.pushes. If the budget runs out, path is None and the
+     reason is stored in stats.details["timeout"], without a partial path (see budget.record_timeout).
+    :rtype: tuple
+    """
+    max_depth = int(max_depth)
+    costs, objects, robot_loc, _ = read_input(test_case_path)
+    layout = get_layout(costs, objects)
+    stats = SearchStats()
+
+    root_state = layout.make_state(objects, robot_loc)
+    if mode == "push":
+        start_state = normalize_state(layout, root_state)
+        successors, backward_successors = get_push_successors, get_backward_push_successors
+    else:
+        start_state, successors, backward_successors = root_state, get_successors, get_backward_successors
+
+    try:
+        movements = external_bfs(layout, start_state, max_depth, stats, successors, backward_successors, work_dir,
+                                 int(chunk_size), budget=budget or NO_BUDGET)
+    except BudgetExhausted as exhausted:
+        stats.stop()
+        record_timeout(stats, exhausted.reason, layout, root_state)
+        return layout, root_state, None, stats
+    stats.stop()
+    if movements is None:
+        return layout, root_state, None, stats
+
+    if mode == "push":
+        stats.pushes = len(movements)
+        movements = expand_pushes(layout, root_state, movements)
+
+    return layout, root_state, MovePath(layout, root_state, movements), stats
+
+
+def main(test_case_path, max_depth, mode="step", work_dir=None, chunk_size=1 << 20, time_limit=None):
+    budget = SearchBudget(time_limit=time_limit) if time_limit is not None else None
+    layout, _, found_path, stats = cached_solve("external_bfs", solve, test_case_path, max_depth, mode, work_dir,
+                                                chunk_size, budget=budget)
+
+    if found_path is not None:
+        if mode == "push":
+            print(f"Pushes: {stats.pushes}")
+        pprint_path(found_path, layout)
+        visualize(found_path, layout)
+        print(f"Path Movements: {get_path_movements(found_path)}")
+        print("Depth Reached: ", len(found_path))
+    elif "timeout" in stats.details:
+        print_timeout(stats.details["timeout"])
+    else:
+        print("can't pass the butter")
+
+    print(f"Layers: {len(stats.depth_counts)}, Largest Layer: {stats.peak_frontier}, "
+          f"Disk Bytes Written: {stats.details.get('disk_bytes_written', 0)}")
+    if stats.details.get("cache") == "hit":
+        print("Solution found in the cache")
+    print(f"Nodes Created: {stats.nodes_created}, Nodes Expanded: {stats.nodes_expanded}")
+
+
+if __name__ == "__main__":
+    setup = '''from __main__ import main'''
+    statement = '''main(*sys.argv[1:])'''
+    time = timeit(setup=setup, stmt=statement, number=1)
+    print(f"Execution Time: {time}")
@@ -5,29 +5,36 @@ from game2dboard import Board
 BLOCK_SIZE = 120
 
 field = None
-path = None
-cur_node_index = 0
+layout = None
+# the nodes of the path are rebuilt one at a time (see move_path.MovePath), as the timer steps through them
+nodes = None
+cur_node = None
 
 
 def step():
     global field
-    global path
-    global cur_node_index
+    global layout
+    global nodes
+    global cur_node
 
-    path[cur_node_index].to_gui(field)
-    cur_node_index += 1
+    cur_node.to_gui(field, layout)
+    cur_node = next(nodes, None)
 
-    if cur_node_index >= len(path):
+    if cur_node is None:
         messagebox.askokcancel("Alo Butter", "All butters are in their place!\nExit?")
         field.close()
 
 
-def visualize(_path):
+def visualize(_path, _layout):
     global field
-    global path
-
-    path = _path
-    num_rows, num_cols = len(path[0].objects), len(path[0].objects[0])
+    global layout
+    global nodes
+    global cur_node
+
+    nodes = iter(_path)
+    cur_node = next(nodes)
+    layout = _layout
+    num_rows, num_cols = layout.num_rows, layout.num_cols
     field = Board(num_rows, num_cols)
 
     field.cell_size = BLOCK_SIZE
@@ -0,0 +1,435 @@
+import os
+from heapq import heappush, heappop
+from itertools import count
+from multiprocessing import Process, Queue
+from time import perf_counter
+from timeit import timeit
+
+import A_Star
+import IDA_Star
+from A_Star import expand, get_heuristic
+from budget import NO_BUDGET, SearchBudget, BudgetExhausted, record_timeout, print_timeout
+from GUI import visualize
+from helper import read_input, is_in_goal, get_successors, get_path_movements, pprint_path, \
+    parse_memory_budget, MemoryBudgetExceeded, WorkerError, get_worker_message
+from move_path import MovePath
+from node import Node
+from push import normalize_state, get_push_successors, expand_pushes
+from solution_cache import cached_solve
+from state import State, get_layout
+from stats import SearchStats
+
+INFINITY = float("inf")
+
+
+def get_owner(state, num_workers):
+    """
+    :return: index of the worker that owns the given state (Zobrist keys are the same in every process)
+    :rtype: int
+    """
+    return state.key % num_workers
+
+
+def _worker(worker_id, *args):
+    """
+    Runs _run_worker in a worker process of hda_star, and sends the exception that it raises (if any) to hda_star
+    as a WorkerError, through the results queue (the last argument).
+    """
+    try:
+        _run_worker(worker_id, *args)
+    except Exception as e:
+        args[-1].put(WorkerError(f"HDA* worker {worker_id} failed: {e!r}"))
+
+
+def _run_worker(worker_id, num_workers, layout, objects, plates_locs, mode, heuristic_name, start_state, max_depth,
+                batch_size, budget, memory_budget, inboxes, results):
+    """
+    A* worker of hda_star, which only keeps the frontier and closed set of the states it owns.
+
+    The search runs in rounds. In each round, the worker expands up to batch_size of its best nodes, and adds the
+    children it owns to its frontier right away. The other children are sent to their owners at the end of the round,
+    in one batch per worker, and the batches of the other workers are received.
+    Each batch also carries the lowest f cost of the sender (its frontier, and the children it sent), the cost of
+    the best goal it has found, its number of expanded nodes, the size of its frontier and closed set, and whether
+    its budget is used up (by time or cancellation), so that all workers take the same decision to stop, after the
+    same round.
+
+    A child only carries its parent state and its last movement, and the owner keeps them as the back link of the
+    child. After the search, the worker answers the requests of hda_star for the back links of its states, until it
+    gets None, so the path is rebuilt one step at a time from the owners of its states.
+
+    :param start_state: state to start from (normalized in push mode)
+    :param budget: limits of the search, its node limit is for the nodes expanded by all workers
+    :param memory_budget: maximum number of nodes in the frontiers and closed sets of all workers (None for no limit)
+    :param inboxes: list of the queues of all workers
+    :param results: queue to put (worker id, goal cost, goal back link, stats, stop, promising back link) into at the
+     end of the search, and the back links of the requested states after it. stop is None if the search ended,
+     ("budget", reason) if the budget ran out, or ("memory", lower bound of the goal cost) if the memory budget was
+     reached. The promising back link is the one of the open state with the lowest h cost (None if there is none).
+    """
+    heuristic = get_heuristic(layout, objects, plates_locs, mode, heuristic_name)
+    successors = get_push_successors if mode == "push" else get_successors
+    stats = SearchStats()
+    stats.details.update(nodes_received=0, rounds=0)
+
+    counter = count()
+    frontier, best_g, closed, parent_links = [], {}, set(), {}
+    goal_cost, goal_link = INFINITY, None
+
+    def receive(state, g, f, depth, parent, movement):
+        # keeps the goals, and adds the rest to the frontier (a closed state is reopened, if it is reached with
+        # a lower g cost, since nodes are not expanded in the order of their f cost across the workers)
+        nonlocal goal_cost, goal_link
+        if is_in_goal(layout, state):
+            if g < goal_cost:
+                goal_cost, goal_link = g, (parent, movement)
+            return True
+
+        known_g = best_g.get(state)
+        if known_g is not None and g >= known_g:
+            stats.duplicates += 1
+            return False
+
+        if state in closed:
+            stats.reopenings += 1
+        elif known_g is not None:
+            stats.decrease_keys += 1
+        best_g[state] = g
+        parent_links[state] = (parent, movement)
+        closed.discard(state)
+        heappush(frontier, (f, next(counter), Node(state, depth, movement, "", g, f)))
+        return True
+
+    # children of the other workers are sent as (robot, butters, key, g, f, depth, parent robot, parent butters,
+    # parent key, movement) tuples
+    outboxes = [[] for _ in range(num_workers)]
+    sent_min_f = INFINITY
+
+    def send(frontier, best_g, closed, new_node, counter, stats):
+        nonlocal sent_min_f
+        state, parent = new_node.state, new_node.parent.state
+
+        owner = get_owner(state, num_workers)
+        if owner == worker_id:
+            return receive(state, new_node.cost_g, new_node.cost_f, new_node.depth, parent, new_node.movement)
+
+        outboxes[owner].append((state.robot, state.butters, state.key, new_node.cost_g, new_node.cost_f,
+                                new_node.depth, parent.robot, parent.butters, parent.key, new_node.movement))
+        if new_node.cost_f < sent_min_f:
+            sent_min_f = new_node.cost_f
+        return True
+
+    def receive_batches(batches):
+        for batch in batches:
+            stats.details["nodes_received"] += len(batch)
+            for robot, butters, key, g, f, depth, parent_robot, parent_butters, parent_key, movement in batch:
+                receive(State(robot, butters, key), g, f, depth, State(parent_robot, parent_butters, parent_key),
+                        movement)
+
+    def is_stale(entry):
+        node = entry[2]
+        return node.state in closed or node.cost_g > best_g[node.state]
+
+    if get_owner(start_state, num_workers) == worker_id:
+        receive(start_state, 0, 0, 0, None, "")
+
+    batches = []
+    pending = {}
+    global_goal_cost = INFINITY
+    round_number = 0
+    stop = None
+    while True:
+        receive_batches(batches)
+
+        # expand the best nodes, which may still lead to a cheaper goal
+        num_expanded = 0
+        while frontier and num_expanded < batch_size:
+            if is_stale(frontier[0]):
+                heappop(frontier)
+                continue
+            if frontier[0][0] >= min(global_goal_cost, goal_cost):
+                break
+
+            _, __, expanding_node = heappop(frontier)
+            stats.nodes_expanded += 1
+            stats.depth_counts[expanding_node.depth] += 1
+            num_expanded += 1
+
+            if expanding_node.depth >= max_depth:
+                closed.add(expanding_node.state)
+                continue
+
+            expand(expanding_node, layout, heuristic, frontier, best_g, closed, counter, stats, successors, send)
+            stats.update_peaks(len(frontier), len(closed))
+
+        while frontier and is_stale(frontier[0]):
+            heappop(frontier)
+        min_f = min(frontier[0][0] if frontier else INFINITY, sent_min_f)
+
+        # exchange the children with the other workers
+        report = (min_f, goal_cost, stats.nodes_expanded, len(frontier) + len(closed), budget.exhausted(stats))
+        for peer_id in range(num_workers):
+            if peer_id != worker_id:
+                inboxes[peer_id].put((round_number, outboxes[peer_id], report))
+
+        batches, reports = [], [report]
+        received = pending.pop(round_number, [])
+        while len(received) < num_workers - 1:
+            message_round, batch, peer_report = inboxes[worker_id].get()
+            if message_round == round_number:
+                received.append((batch, peer_report))
+            else:
+                pending.setdefault(message_round, []).append((batch, peer_report))
+        for batch, peer_report in received:
+            batches.append(batch)
+            reports.append(peer_report)
+
+        outboxes = [[] for _ in range(num_workers)]
+        sent_min_f = INFINITY
+        stats.details["rounds"] += 1
+        round_number += 1
+
+        # no node anywhere (open, or just sent) can lead to a goal cheaper than the best one found
+        min_fs, goal_costs, nodes_expanded, sizes, reasons = zip(*reports)
+        global_goal_cost = min(goal_costs)
+        if min(min_fs) >= global_goal_cost:
+            break
+
+        # every worker has the same reports, so they all stop after the same round
+        reasons = {reason for reason in reasons if reason is not None}
+        if budget.node_limit is not None and sum(nodes_expanded) >= budget.node_limit:
+            reasons.add("nodes")
+        if reasons:
+            stop = ("budget", min(reasons))
+            break
+        if memory_budget is not None and sum(sizes) >= memory_budget:
+            stop = ("memory", min(min_fs))
+            break
+
+    promising_link = None
+    if stop is not None:
+        # the children received in the last round are open too
+        receive_batches(batches)
+        open_nodes = [entry[2] for entry in frontier if not is_stale(entry)]
+        if open_nodes:
+            promising_node = min(open_nodes, key=lambda x: (x.cost_f - x.cost_g, x.cost_f))
+            promising_link = (promising_node.cost_f - promising_node.cost_g, promising_node.cost_f,
+                              parent_links[promising_node.state])
+
+    stats.stop()
+    results.put((worker_id, goal_cost, goal_link, stats, stop, promising_link))
+
+    # answer the requests for back links, which rebuild the path
+    while (state := inboxes[worker_id].get()) is not None:
+        results.put(parent_links[state])
+
+
+def hda_star(layout, objects, plates_locs, start_state, max_depth, stats, mode="step", heuristic_name="push_distance",
+             num_workers=None, batch_size=32, budget=NO_BUDGET, memory_budget=None):
+    """
+    Hash distributed A*: every state is owned by one worker process (chosen by its Zobrist key), which keeps it in
+    its own frontier and closed set. Workers expand their nodes in parallel with A_Star.expand, and exchange the
+    generated children in batches.
+
+    The search stops when the lowest f cost of all frontiers and all exchanged children is not lower than the cost
+    of the best goal found, so with an admissible heuristic (such as push_distance) the goal is a cheapest one,
+    just like a_star. Nodes may be expanded out of order across workers, so a closed state is reopened when it is
+    reached with a lower g cost.
+
+    The path is rebuilt from the goal by asking the owner of each state for its back link (its parent and the
+    movement from it). The g cost of a state only goes down after its back link is set, so the links never form a
+    cycle, and lead back to the start state with a cost of at most the goal cost.
+
+    :param layout: static layout of the field
+    :param objects: 2D list representing object layout (the heuristic is built again in each worker)
+    :param plates_locs: list of plate locations
+    :param start_state: state to start from (normalized in push mode)
+    :param max_depth: maximum allowed depth
+    :param stats: statistics of the search, the stats of all workers are added to it, and stored in its "workers"
+     details
+    :param mode: "step" for single movements, or "push" for pushes
+    :param heuristic_name: name of the heuristic, see A_Star.get_heuristic
+    :param num_workers: number of worker processes (None for the number of CPUs)
+    :param batch_size: maximum number of nodes that each worker expands in a round
+    :param budget: limits of the search, checked by the workers once a round. BudgetExhausted is raised with the
+     movements to the open state with the lowest h cost once it is used up.
+    :param memory_budget: maximum number of nodes in the frontiers and closed sets of all workers (None for no limit),
+     MemoryBudgetExceeded is raised with the lowest f cost of the frontiers once it is reached
+    :raises WorkerError: if a worker fails (the other workers are terminated)
+    :return: tuple of (list of movements, cost) of the found path (None, None if no path is found)
+    :rtype: tuple
+    """
+    num_workers = num_workers or os.cpu_count() or 1
+    # an invalid heuristic (such as a missing pattern database) fails here, before the workers start, and the tables
+    # it builds are inherited by the workers, where processes are forked
+    get_heuristic(layout, objects, plates_locs, mode, heuristic_name)
+
+    inboxes = [Queue() for _ in range(num_workers)]
+    results = Queue()
+    workers = [Process(target=_worker, args=(worker_id, num_workers, layout, objects, plates_locs, mode,
+                                              heuristic_name, start_state, max_depth, batch_size, budget,
+                                              memory_budget, inboxes, results))
+               for worker_id in range(num_workers)]
+    for worker in workers:
+        worker.start()
+
+    try:
+        worker_results = sorted(get_worker_message(results, workers) for _ in range(num_workers))
+        _, goal_cost, link, __, stop, ___ = min(worker_results, key=lambda result: result[1])
+        if stop is not None:
+            promising_links = [result[5] for result in worker_results if result[5] is not None]
+            link = min(promising_links, key=lambda x: x[:2])[2] if promising_links else None
+
+        # the back link of the start state has no parent
+        movements = []
+        while link is not None and link[0] is not None:
+            parent, movement = link
+            movements.append(movement)
+            inboxes[get_owner(parent, num_workers)].put(parent)
+            link = get_worker_message(results, workers)
+        movements.reverse()
+
+        for inbox in inboxes:
+            inbox.put(None)
+        for worker in workers:
+            worker.join()
+    except BaseException:
+        # such as a signal of a timeout, the workers would wait for the next round forever
+        for worker in workers:
+            worker.terminate()
+            worker.join()
+        raise
+
+    for result in worker_results:
+        stats.merge(result[3])
+    stats.details["workers"] = [result[3] for result in worker_results]
+
+    if stop is not None:
+        if stop[0] == "memory":
+            raise MemoryBudgetExceeded(stop[1])
+        raise BudgetExhausted(stop[1], movements=movements if promising_links else None)
+
+    if goal_cost == INFINITY:
+        return None, None
+
+    return movements, goal_cost
+
+
+def solve(test_case_path, max_depth, mode="step", heuristic_name="push_distance", num_workers=None,
+          memory_budget=None, budget=None):
+    """
+    Reads the given test case, and runs the hash distributed A* algorithm on it.
+
+    With a memory budget, the search switches to IDA* in this process when the frontiers and the closed sets of the
+    workers reach it, starting from the lowest f cost of the frontiers, as A_Star.solve does.
+
+    :param test_case_path: path of the input file
+    :param max_depth: maximum allowed depth
+    :param mode: "step" for single movements, or "push" for pushes
+    :param heuristic_name: name of the heuristic, see A_Star.get_heuristic
+    :param num_workers: number of worker processes (None for the number of CPUs)
+    :param memory_budget: maximum number of nodes, or bytes with a unit (see helper.parse_memory_budget),
+     None for no limit
+    :param budget: limits of the search (SearchBudget), or None. It is shared with the IDA* fallback.
+    :return: tuple of (layout, root state, path, stats), where path is the path after the root
+     (a MovePath, with single movements, also in push mode) or None if no path is found.
+     In push mode, the number of pushes is stored in stats.pushes, and if the memory budget is reached,
+     stats.details["fallback"] has the number of nodes and the threshold that IDA* starts with.
+     If the search budget runs out, path is None and the partial path of the most promising node is stored in
+     stats.details["timeout"] (see budget.record_timeout).
+    :rtype: tuple
+    """
+    max_depth = int(max_depth)
+    num_workers = int(num_workers) if num_workers else None
+    memory_budget = parse_memory_budget(memory_budget)
+    costs, objects, robot_loc, plates_locs = read_input(test_case_path)
+    layout = get_layout(costs, objects)
+    stats = SearchStats()
+
+    root_state = layout.make_state(objects, robot_loc)
+    start_state = normalize_state(layout, root_state) if mode == "push" else root_state
+
+    budget = budget or NO_BUDGET
+    try:
+        try:
+            movements, _ = hda_star(layout, objects, plates_locs, start_state, max_depth, stats, mode,
+                                    heuristic_name, num_workers, budget=budget, memory_budget=memory_budget)
+        except MemoryBudgetExceeded as e:
+            stats.details["fallback"] = {
+                "algorithm": "ida_star",
+                "nodes": memory_budget,
+                "threshold": e.lower_bound
+            }
+            heuristic = get_heuristic(layout, objects, plates_locs, mode, heuristic_name)
+            successors = get_push_successors if mode == "push" else get_successors
+            root_node = Node(start_state, 0, "", "", 0, heuristic(start_state))
+            final_node = IDA_Star.ida_star(layout, heuristic, root_node, max_depth, stats, successors,
+                                           threshold=e.lower_bound, budget=budget)
+            movements = None if final_node is None else [node.movement for node in A_Star.get_path(final_node)[1:]]
+    except BudgetExhausted as exhausted:
+        stats.stop()
+        record_timeout(stats, exhausted.reason, layout, root_state, exhausted.node, mode, exhausted.movements)
+        return layout, root_state, None, stats
+    stats.stop()
+
+    if movements is None:
+        return layout, root_state, None, stats
+
+    if mode == "push":
+        stats.pushes = len(movements)
+        movements = expand_pushes(layout, root_state, movements)
+
+    return layout, root_state, MovePath(layout, root_state, movements), stats
+
+
+def main(test_case_path, max_depth, mode="step", heuristic_name="push_distance", num_workers=None,
+         memory_budget=None, time_limit=None, compare=False):
+    compare = compare in (True, "compare")
+    budget = SearchBudget(time_limit=time_limit) if time_limit is not None else None
+    start_time = perf_counter()
+    layout, _, found_path, stats = cached_solve("hda_star", solve, test_case_path, max_depth, mode, heuristic_name,
+                                                num_workers, memory_budget=memory_budget, budget=budget)
+    parallel_time = perf_counter() - start_time
+
+    if found_path is not None:
+        if mode == "push":
+            print(f"Pushes: {stats.pushes}")
+        pprint_path(found_path, layout)
+        visualize(found_path, layout)
+        print(f"Path Movements: {get_path_movements(found_path)}")
+        print("Depth Reached: ", len(found_path))
+        print("Cost: ", found_path.cost)
+    elif "timeout" in stats.details:
+        print_timeout(stats.details["timeout"])
+    else:
+        print("can't pass the butter")
+
+    if "fallback" in stats.details:
+        fallback = stats.details["fallback"]
+        print(f"Memory budget of {fallback['nodes']} nodes reached, "
+              f"switched to IDA* with threshold {fallback['threshold']}")
+    if stats.details.get("cache") == "hit":
+        print("Solution found in the cache")
+    for worker_id, worker_stats in enumerate(stats.details.get("workers", [])):
+        print(f"Worker {worker_id}: Nodes Created: {worker_stats.nodes_created}, "
+              f"Nodes Expanded: {worker_stats.nodes_expanded}, Rounds: {worker_stats.details['rounds']}")
+    print(f"Nodes Created: {stats.nodes_created}, Nodes Expanded: {stats.nodes_expanded}")
+    if not compare:
+        return
+
+    # the same board is solved again by the single core A*, only to print the speedup
+    start_time = perf_counter()
+    _, __, a_star_path, a_star_stats = A_Star.solve(test_case_path, max_depth, mode, heuristic_name)
+    a_star_time = perf_counter() - start_time
+
+    a_star_cost = a_star_path.cost if a_star_path is not None else None
+    print(f"Single Core A*: Cost: {a_star_cost}, Nodes Expanded: {a_star_stats.nodes_expanded}, "
+          f"Time: {a_star_time:.3f}s")
+    print(f"Parallel A*: Time: {parallel_time:.3f}s, Speedup: {a_star_time / parallel_time:.2f}x")
+
+
+if __name__ == "__main__":
+    setup = '''from __main__ import main'''
+    statement = '''main(*sys.argv[1:])'''
+    time = timeit(setup=setup, stmt=statement, number=1)
+    print(f"Execution Time: {time}")
@@ -0,0 +1,274 @@
+from timeit import timeit
+
+import A_Star
+from budget import NO_BUDGET, SearchBudget, BudgetExhausted, record_timeout, print_timeout
+from GUI import visualize
+from helper import read_input, is_in_goal, get_successors, get_path_movements, pprint_path
+from hooks import NO_HOOKS
+from move_path import MovePath
+from node import Node
+from push import normalize_state, get_push_successors, get_push_path
+from solution_cache import cached_solve
+from state import get_layout
+from stats import SearchStats
+
+INFINITY = float("inf")
+
+
+def generate_children(layout, heuristic, node, successors=get_successors):
+    """
+    Generates children for the given node, based on the valid movements that robot can take
+    from its current location, sorted by their f cost
+
+    :param layout: static layout of the field, holding the cost of all cells
+    :type layout: Layout
+    :param heuristic: function that returns the heuristic value of a state
+    :type heuristic: function
+    :param node:
+    :type node: Node
+    :param successors: successor generation function (single movements or pushes)
+    :type successors: function
+    :return: a list of given nodes children.
+    """
+    children = []
+
+    state, depth, g = node.state, node.depth, node.cost_g
+    for movement, new_state, cost in successors(layout, state):
+        new_g = g + cost
+        new_f = new_g + heuristic(new_state)
+
+        children.append(Node(new_state, depth + 1, movement, node, new_g, new_f))
+
+    children.sort(key=lambda x: x.cost_f)
+    return children
+
+
+def _search(layout, heuristic, cur_node, threshold, max_depth, path_states, stats, successors=get_successors,
+            hooks=NO_HOOKS, budget=NO_BUDGET):
+    """
+    Depth first search bounded by an f cost threshold.
+
+    Only the states of the current path are kept (to avoid cycles), so memory stays linear in the depth.
+    Children with an infinite f cost (dead states, for push_distance) can not lead to a goal, so they are pruned
+    in every iteration, and their f cost is never a threshold.
+
+    :param layout: static layout of the field, holding the cost of all cells
+    :type layout: Layout
+    :param heuristic: function that returns the heuristic value of a state
+    :type heuristic: function
+    :param cur_node: current node to be checked and expanded
+    :type cur_node: Node
+    :param threshold: maximum f cost of the nodes to be expanded in this iteration
+    :type threshold: int
+    :param max_depth: maximum allowed depth
+    :type max_depth: int
+    :param path_states: states of the nodes on the path from the root to cur_node
+    :type path_states: set
+    :param stats: statistics of the search
+    :type stats: SearchStats
+    :param successors: successor generation function (single movements or pushes)
+    :type successors: function
+    :param hooks: callbacks of the search events
+    :type hooks: SearchHooks
+    :param budget: limits of the search, BudgetExhausted is raised with cur_node once it is used up
+    :type budget: SearchBudget
+    :return: tuple of the goal node (None if it is not found) and
+     the smallest f cost that exceeded the threshold (None if there was none)
+    :rtype: tuple
+    """
+    if cur_node.cost_f > threshold:
+        if hooks.on_prune is not None:
+            hooks.on_prune(cur_node)
+        return None, cur_node.cost_f
+
+    if stats.nodes_expanded >= budget.next_check:
+        budget.check(stats, cur_node)
+    stats.nodes_expanded += 1
+    stats.depth_counts[cur_node.depth] += 1
+    if cur_node.depth >= stats.peak_frontier:
+        stats.peak_frontier = cur_node.depth + 1
+    if is_in_goal(layout, cur_node.state):
+        if hooks.on_goal is not None:
+            hooks.on_goal(cur_node)
+        return cur_node, None
+
+    if cur_node.depth >= max_depth:
+        if hooks.on_prune is not None:
+            hooks.on_prune(cur_node)
+        return None, None
+
+    if hooks.on_expand is not None:
+        hooks.on_expand(cur_node)
+    children = generate_children(layout, heuristic, cur_node, successors)
+    stats.nodes_created += len(children)
+    if hooks.on_generate is not None:
+        for child in children:
+            hooks.on_generate(cur_node, child)
+
+    next_threshold = None
+    for child in children:
+        if child.cost_f == INFINITY:
+            if hooks.on_prune is not None:
+                hooks.on_prune(child)
+            continue
+        if child.state in path_states:
+            stats.duplicates += 1
+            if hooks.on_duplicate is not None:
+                hooks.on_duplicate(child)
+            continue
+
+        path_states.add(child.state)
+        found_node, child_threshold = _search(layout, heuristic, child, threshold, max_depth, path_states,
+                                              stats, successors, hooks, budget)
+        path_states.remove(child.state)
+
+        if found_node is not None:
+            return found_node, None
+
+        if child_threshold is not None and (next_threshold is None or child_threshold < next_threshold):
+            next_threshold = child_threshold
+
+    return None, next_threshold
+
+
+def ida_star(layout, heuristic, root_node, max_depth, stats, successors=get_successors, hooks=NO_HOOKS,
+             threshold=None, budget=NO_BUDGET):
+    """
+    Implementation of IDA* (iterative deepening A*) algorithm.
+
+    Repeatedly runs a depth first search bounded by an f cost threshold, starting with the f cost of the root.
+    Each iteration raises the threshold to the smallest f cost that exceeded it in the previous one.
+    With an admissible heuristic, the first goal found is a cheapest one. When no f cost exceeded the threshold
+    (or only infinite ones did), there is no goal within max_depth.
+
+    :param layout: static layout of the field, holding the cost of all cells
+    :type layout: Layout
+    :param heuristic: function that returns the heuristic value of a state
+    :type heuristic: function
+    :param root_node: the node which the search algorithm starts with
+    :type root_node: Node
+    :param max_depth: maximum allowed depth
+    :type max_depth: int
+    :param stats: statistics of the search, such as number of nodes created and number of nodes expanded.
+     The threshold and node counts of each iteration are appended to its "iterations" details.
+    :type stats: SearchStats
+    :param successors: successor generation function (single movements or pushes)
+    :type successors: function
+    :param hooks: callbacks of the search events
+    :type hooks: SearchHooks
+    :param threshold: threshold of the first iteration, if a higher lower bound than the f cost of the root is known
+     (it must not be more than the cost of the cheapest goal)
+    :type threshold: int
+    :param budget: limits of the search, BudgetExhausted is raised with the node that the search was at once it is
+     used up
+    :type budget: SearchBudget
+    :return: the goal node if it is found, otherwise None
+    """
+    iterations = stats.details.setdefault("iterations", [])
+
+    threshold = root_node.cost_f if threshold is None else max(threshold, root_node.cost_f)
+    while threshold is not None and threshold != INFINITY:
+        nodes_created, nodes_expanded = stats.nodes_created, stats.nodes_expanded
+
+        found_node, next_threshold = _search(layout, heuristic, root_node, threshold, max_depth,
+                                             {root_node.state}, stats, successors, hooks, budget)
+
+        iterations.append({
+            "threshold": threshold,
+            "nodes_created": stats.nodes_created - nodes_created,
+            "nodes_expanded": stats.nodes_expanded - nodes_expanded
+        })
+
+        if found_node is not None:
+            return found_node
+
+        threshold = next_threshold
+
+    return None
+
+
+def solve(test_case_path, max_depth, mode="step", heuristic_name="default", timing=False, hooks=None, budget=None):
+    """
+    Reads the given test case, and runs the IDA* algorithm on it.
+
+    :param test_case_path: path of the input file
+    :param max_depth: maximum allowed depth
+    :param mode: "step" for single movements, or "push" for pushes
+    :param heuristic_name: name of the heuristic, see A_Star.get_heuristic
+    :param timing: whether to measure the time of the heuristic and successor generation calls
+    :param hooks: callbacks of the search events (SearchHooks), or None
+    :param budget: limits of the search (SearchBudget), or None
+    :return: tuple of (layout, root state, path, stats), where path is the path from the root
+     (a MovePath, with single movements, also in push mode) or None if no path is found.
+     In push mode, the number of pushes is stored in stats.pushes. If the budget runs out, path is None and the
+     partial path of the node the search was at is stored in stats.details["timeout"] (see budget.record_timeout).
+    :rtype: tuple
+    """
+    max_depth = int(max_depth)
+    costs, objects, robot_loc, plates_locs = read_input(test_case_path)
+    layout = get_layout(costs, objects)
+    stats = SearchStats(timing)
+
+    root_state = layout.make_state(objects, robot_loc)
+    heuristic = stats.timed_heuristic(A_Star.get_heuristic(layout, objects, plates_locs, mode, heuristic_name))
+    if mode == "push":
+        start_state, successors = normalize_state(layout, root_state), get_push_successors
+    else:
+        start_state, successors = root_state, get_successors
+    successors = stats.timed_successors(successors)
+
+    root_cost_g = 0
+    root_cost_f = heuristic(start_state)
+
+    root_node = Node(start_state, 0, "", "", root_cost_g, root_cost_f)
+
+    try:
+        final_node = ida_star(layout, heuristic, root_node, max_depth, stats, successors, hooks or NO_HOOKS,
+                              budget=budget or NO_BUDGET)
+    except BudgetExhausted as exhausted:
+        stats.stop()
+        record_timeout(stats, exhausted.reason, layout, root_state, exhausted.node, mode)
+        return layout, root_state, None, stats
+    stats.stop()
+
+    if final_node is None:
+        return layout, root_state, None, stats
+
+    if mode == "push":
+        stats.pushes = final_node.depth
+        return layout, root_state, get_push_path(layout, root_state, A_Star.get_path(final_node)[1:]), stats
+
+    return layout, root_state, MovePath.from_node(layout, root_state, final_node), stats
+
+
+def main(test_case_path, max_depth, mode="step", heuristic_name="default", time_limit=None):
+    budget = SearchBudget(time_limit=time_limit) if time_limit is not None else None
+    layout, _, found_path, stats = cached_solve("ida_star", solve, test_case_path, max_depth, mode, heuristic_name,
+                                                budget=budget)
+
+    if found_path is not None:
+        if mode == "push":
+            print(f"Pushes: {stats.pushes}")
+        pprint_path(found_path, layout)
+        visualize(found_path, layout)
+        print(f"Path Movements: {get_path_movements(found_path)}")
+        print("Depth Reached: ", len(found_path))
+        print("Cost: ", found_path.cost)
+    elif "timeout" in stats.details:
+        print_timeout(stats.details["timeout"])
+    else:
+        print("can't pass the butter")
+
+    for iteration in stats.details.get("iterations", []):
+        print(f"Threshold: {iteration['threshold']}, Nodes Created: {iteration['nodes_created']}, "
+              f"Nodes Expanded: {iteration['nodes_expanded']}")
+    if stats.details.get("cache") == "hit":
+        print("Solution found in the cache")
+    print(f"Nodes Created: {stats.nodes_created}, Nodes Expanded: {stats.nodes_expanded}")
+
+
+if __name__ == "__main__":
+    setup = '''from __main__ import main'''
+    statement = '''main(*sys.argv[1:])'''
+    time = timeit(setup=setup, stmt=statement, number=1)
+    print(f"Execution Time: {time}")
@@ -1,35 +1,54 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import Event
 from timeit import timeit
 
+from budget import NO_BUDGET, SearchBudget, BudgetExhausted, record_timeout, print_timeout
 from GUI import visualize
-from helper import read_input, is_in_goal, get_valid_movements, perform_move, get_path_movements, pprint_path
+from helper import read_input, is_in_goal, get_successors, get_path_movements, pprint_path
+from hooks import NO_HOOKS
+from move_path import MovePath
 from node import Node
+from push import normalize_state, get_push_successors, get_push_path, expand_pushes
+from solution_cache import cached_solve
+from state import get_layout
+from stats import SearchStats
 
+# set in each worker process of parallel_ids, so a worker can stop as soon as another one finds a goal
+_cancel_event = None
+# layout and successor generation function of the searched board, sent once to each worker process of parallel_ids
+# (instead of with every subtree)
+_layout = None
+_successors = None
 
-def generate_children(node):
+
+def generate_children(layout, node, successors=get_successors):
     """
     Generates children for the given node, based on the valid movements that robot can take
     from its current location
 
+    :param layout: static layout of the field
+    :type layout: Layout
     :param node:
     :type node: Node
+    :param successors: successor generation function (single movements or pushes)
+    :type successors: function
     :return: a list of given nodes children.
     """
     children = []
 
-    objects, robot_loc, depth = node.objects, node.robot_loc, node.depth
-    valid_movements = get_valid_movements(objects, robot_loc)
-    for movement in valid_movements:
-        new_objects, new_robot_loc = perform_move(objects, robot_loc, movement)
+    state, depth = node.state, node.depth
+    for movement, new_state, _ in successors(layout, state):
         new_depth = depth + 1
 
-        child_node = Node(new_objects, new_robot_loc, new_depth, movement, node)
+        child_node = Node(new_state, new_depth, movement, node)
 
         children = [child_node] + children
 
     return children
 
 
-def _dls(cur_node, limit, bookkeeping):
+def _dls(layout, cur_node, limit, stats, successors=get_successors, budget=NO_BUDGET, hooks=NO_HOOKS):
     """
     Implementation of dls (depth limited search)
 
@@ -37,32 +56,60 @@ def _dls(cur_node, limit, bookkeeping):
     otherwise generates its children, and recursively calls _dls on them.
     if the algorithm reaches its specified depth limit, then it returns an empty list.
 
+    :param layout: static layout of the field
+    :type layout: Layout
     :param cur_node: current node to be checked and expanded
     :type cur_node: Node
     :param limit: maximum depth limit
     :type limit: int
+    :param stats: statistics of the search
+    :type stats: SearchStats
+    :param successors: successor generation function (single movements or pushes)
+    :type successors: function
+    :param budget: limits of the search, BudgetExhausted is raised with cur_node once it is used up
+    :type budget: SearchBudget
+    :param hooks: callbacks of the search events
+    :type hooks: SearchHooks
     :return: if the goal is reachable, path to the goal (as a list of nodes), otherwise an empty list
     :rtype: list
     """
-    bookkeeping["nodes_expanded"] += 1
-    if is_in_goal(cur_node.objects):
+    if stats.nodes_expanded >= budget.next_check:
+        budget.check(stats, cur_node)
+    stats.nodes_expanded += 1
+
+    depth = cur_node.depth
+    stats.depth_counts[depth] += 1
+    if depth >= stats.peak_frontier:
+        stats.peak_frontier = depth + 1
+
+    if is_in_goal(layout, cur_node.state):
+        if hooks.on_goal is not None:
+            hooks.on_goal(cur_node)
         return [cur_node]
 
     if limit <= 0:
+        if hooks.on_prune is not None:
+            hooks.on_prune(cur_node)
         return []
 
-    children = generate_children(cur_node)
-    bookkeeping["nodes_created"] += len(children)
+    if hooks.on_expand is not None:
+        hooks.on_expand(cur_node)
+    children = generate_children(layout, cur_node, successors)
+    stats.nodes_created += len(children)
+    if hooks.on_generate is not None:
+        for child in children:
+            hooks.on_generate(cur_node, child)
 
     for child in children:
-        nodes = _dls(child, limit - 1, bookkeeping)
+        nodes = _dls(layout, child, limit - 1, stats, successors, budget, hooks)
         if len(nodes) > 0:
             return nodes + [child]
 
     return []
 
 
-def ids(starting_node, max_depth, bookkeeping):
+def ids(layout, starting_node, max_depth, stats, successors=get_successors, hooks=NO_HOOKS, min_depth=0,
+        budget=NO_BUDGET):
     """
     Implementation of IDS (iterative deepening search) algorithm.
 
@@ -70,45 +117,243 @@ def ids(starting_node, max_depth, bookkeeping):
     if at any step a path was found by _dls, then it returns the path,
      otherwise if the limit is reached, returns an empty list.
 
+    :param layout: static layout of the field
+    :type layout: Layout
     :param starting_node: root node, which algorithm starts it search with
     :type starting_node: Node
     :param max_depth: maximum depth limit
     :type max_depth: int
-    :param bookkeeping: a dictionary to store some info about algorithm while it is running
-     such as number of nodes created and number of nodes expanded
-    :type bookkeeping: dict
+    :param stats: statistics of the search, such as number of nodes created and number of nodes expanded
+    :type stats: SearchStats
+    :param successors: successor generation function (single movements or pushes)
+    :type successors: function
+    :param hooks: callbacks of the search events
+    :type hooks: SearchHooks
+    :param min_depth: first depth limit, if it is known that there is no shallower goal
+    :type min_depth: int
+    :param budget: limits of the search, BudgetExhausted is raised with the node that the search was at once it is
+     used up
+    :type budget: SearchBudget
     :return: if the goal is reachable with the given limit,
      path to the goal (as a list of nodes), otherwise an empty list
     """
-    for depth in range(max_depth):
-        nodes = _dls(starting_node, depth, bookkeeping)
+    for depth in range(min_depth, max_depth):
+        nodes = _dls(layout, starting_node, depth, stats, successors, budget, hooks)
         if len(nodes):
             return nodes[1:]
 
     return []
 
 
-def main(test_case_path, max_depth):
+def _init_worker(cancel_event, layout, successors):
+    global _cancel_event, _layout, _successors
+    _cancel_event, _layout, _successors = cancel_event, layout, successors
+
+
+def _subtree_dls(state, depth, limit):
+    """
+    Runs _dls on the subtree of one node of the split ply, in a worker process of parallel_ids.
+    :return: tuple of (list of movements from the node to the goal, or None if there is no goal in the subtree,
+     or the search was cancelled), the stats of the subtree, and the process id of the worker
+    :rtype: tuple
+    """
+    stats = SearchStats()
+
+    try:
+        budget = SearchBudget(cancel_event=_cancel_event)
+        nodes = _dls(_layout, Node(state, depth, "", ""), limit, stats, _successors, budget)
+    except BudgetExhausted:
+        nodes = []
+
+    # _dls returns the goal twice, followed by the rest of the path in reverse order
+    movements = [node.movement for node in reversed(nodes[1:])] if nodes else None
+    stats.stop()
+    return movements, stats, os.getpid()
+
+
+def split_root(layout, starting_node, split_depth, stats, successors=get_successors):
+    """
+    Expands the first split_depth plies of the search tree (in the same order as _dls).
+    :return: list of (node, list of movements from the root) tuples of the nodes at depth split_depth
+    :rtype: list
+    """
+    ply = [(starting_node, [])]
+    for _ in range(split_depth):
+        next_ply = []
+        for node, movements in ply:
+            children = generate_children(layout, node, successors)
+            stats.nodes_expanded += 1
+            stats.nodes_created += len(children)
+            next_ply += [(child, movements + [child.movement]) for child in children]
+        ply = next_ply
+
+    return ply
+
+
+def parallel_ids(layout, starting_node, max_depth, stats, successors=get_successors, num_workers=None,
+                 split_depth=None):
+    """
+    Parallel IDS, which splits the search tree at its first plies.
+
+    The depth limits below split_depth are searched by _dls in this process. For every larger depth limit, the
+    subtrees of the nodes at depth split_depth are searched by a pool of worker processes. All the smaller limits
+    are already searched when a worker finds a goal, so the goal is at the current limit (the shallowest one),
+    and all the other workers are cancelled.
+
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param starting_node: root node, which algorithm starts it search with
+    :type starting_node: Node
+    :param max_depth: maximum depth limit
+    :type max_depth: int
+    :param stats: statistics of the search, such as number of nodes created and number of nodes expanded.
+     The stats of each worker process are stored in its "workers" details.
+    :type stats: SearchStats
+    :param successors: successor generation function (single movements or pushes)
+    :type successors: function
+    :param num_workers: number of worker processes (None for the number of CPUs)
+    :type num_workers: int
+    :param split_depth: depth of the nodes that are given to the workers (None to split at the first ply that has
+     at least 4 nodes for each worker)
+    :type split_depth: int
+    :return: if the goal is reachable with the given limit, list of movements from the root to the goal,
+     otherwise None
+    :rtype: list
+    """
+    num_workers = num_workers or os.cpu_count() or 1
+    if split_depth is None:
+        split_depth, ply_size = 0, 1
+        while ply_size < 4 * num_workers and split_depth < max_depth - 1:
+            split_depth += 1
+            ply_size = len(split_root(layout, starting_node, split_depth, SearchStats(), successors))
+            if ply_size == 0:
+                break
+
+    for depth in range(min(split_depth, max_depth)):
+        nodes = _dls(layout, starting_node, depth, stats, successors)
+        if len(nodes):
+            return [node.movement for node in reversed(nodes[1:])]
+
+    ply = split_root(layout, starting_node, split_depth, stats, successors)
+
+    workers = {}
+    cancel_event = Event()
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker,
+                             initargs=(cancel_event, layout, successors)) as executor:
+        for depth in range(split_depth, max_depth):
+            futures = [executor.submit(_subtree_dls, node.state, node.depth, depth - split_depth) for node, _ in ply]
+
+            found_movements = None
+            for future in as_completed(futures):
+                subtree_movements, subtree_stats, pid = future.result()
+
+                workers.setdefault(pid, SearchStats()).merge(subtree_stats)
+                stats.merge(subtree_stats)
+
+                if subtree_movements is not None and found_movements is None:
+                    cancel_event.set()
+                    found_movements = ply[futures.index(future)][1] + subtree_movements
+
+            if found_movements is not None:
+                stats.details["workers"] = list(workers.values())
+                return found_movements
+
+    stats.details["workers"] = list(workers.values())
+    return None
+
+
+def solve(test_case_path, max_depth, mode="step", num_workers=None, timing=False, hooks=None, budget=None):
+    """
+    Reads the given test case, and runs the IDS algorithm on it.
+
+    :param test_case_path: path of the input file
+    :param max_depth: maximum allowed depth
+    :param mode: "step" for single movements, or "push" for pushes
+    :param num_workers: if given, the search runs in this many worker processes (see parallel_ids)
+    :param timing: whether to measure the time of the successor generation calls (not in the worker processes)
+    :param hooks: callbacks of the search events (SearchHooks), or None. They are not called from worker processes,
+     so they can not be used with num_workers.
+    :param budget: limits of the search (SearchBudget), or None. It can not be used with num_workers.
+    :return: tuple of (layout, root state, path, stats), where path is the path after the root (a MovePath, with
+     single movements, also in push mode) or None if no path is found.
+     In push mode, the number of pushes is stored in stats.pushes. If the budget runs out, path is None and the
+     reason and the partial path of the node the search was at are stored in stats.details["timeout"]
+     (see budget.record_timeout).
+    :rtype: tuple
+    """
     max_depth = int(max_depth)
-    _, objects, robot_loc, __ = read_input(test_case_path)
-    bookkeeping = {
-        "nodes_created": 0,
-        "nodes_expanded": 0
-    }
-
-    root_node = Node(objects, robot_loc, 0, "", "")
-    found_path = ids(root_node, max_depth, bookkeeping)
+    if num_workers is not None and hooks is not None:
+        raise ValueError("search hooks can not be used with worker processes")
+    if num_workers is not None and budget is not None:
+        raise ValueError("a search budget can not be used with worker processes")
+
+    costs, objects, robot_loc, _ = read_input(test_case_path)
+    layout = get_layout(costs, objects)
+    stats = SearchStats(timing)
+
+    root_state = layout.make_state(objects, robot_loc)
+    if mode == "push":
+        root_node = Node(normalize_state(layout, root_state), 0, "", "")
+        successors = get_push_successors
+    else:
+        root_node = Node(root_state, 0, "", "")
+        successors = get_successors
+
+    if num_workers is not None:
+        movements = parallel_ids(layout, root_node, max_depth, stats, successors, int(num_workers))
+        stats.stop()
+        if not movements:
+            return layout, root_state, None, stats
+
+        if mode == "push":
+            stats.pushes = len(movements)
+            movements = expand_pushes(layout, root_state, movements)
+        return layout, root_state, MovePath(layout, root_state, movements), stats
+
+    try:
+        found_path = ids(layout, root_node, max_depth, stats, stats.timed_successors(successors), hooks or NO_HOOKS,
+                         budget=budget or NO_BUDGET)
+    except BudgetExhausted as exhausted:
+        stats.stop()
+        record_timeout(stats, exhausted.reason, layout, root_state, exhausted.node, mode)
+        return layout, root_state, None, stats
+    stats.stop()
     found_path.reverse()
 
-    if len(found_path) > 0:
-        pprint_path(found_path)
-        # visualize(found_path)
+    if not found_path:
+        return layout, root_state, None, stats
+
+    if mode == "push":
+        stats.pushes = len(found_path)
+        return layout, root_state, get_push_path(layout, root_state, found_path), stats
+
+    return layout, root_state, MovePath(layout, root_state, [node.movement for node in found_path]), stats
+
+
+def main(test_case_path, max_depth, mode="step", num_workers=None, time_limit=None):
+    num_workers = num_workers or None
+    budget = SearchBudget(time_limit=time_limit) if time_limit is not None else None
+    layout, _, found_path, stats = cached_solve("ids", solve, test_case_path, max_depth, mode, num_workers,
+                                                budget=budget)
+
+    if found_path is not None:
+        if mode == "push":
+            print(f"Pushes: {stats.pushes}")
+        pprint_path(found_path, layout)
+        # visualize(found_path, layout)
         print(f"Path Movements: {get_path_movements(found_path)}")
         print("Depth Reached: ", len(found_path))
+    elif "timeout" in stats.details:
+        print_timeout(stats.details["timeout"])
     else:
         print("can't pass the butter")
 
-    print(f"Nodes Created: {bookkeeping['nodes_created']}, Nodes Expanded: {bookkeeping['nodes_expanded']}")
+    for worker_id, worker_stats in enumerate(stats.details.get("workers", [])):
+        print(f"Worker {worker_id}: Nodes Created: {worker_stats.nodes_created}, "
+              f"Nodes Expanded: {worker_stats.nodes_expanded}")
+    if stats.details.get("cache") == "hit":
+        print("Solution found in the cache")
+    print(f"Nodes Created: {stats.nodes_created}, Nodes Expanded: {stats.nodes_expanded}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,275 @@
+import argparse
+import glob
+import json
+import os
+import signal
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+
+import A_Star
+import ARA_Star
+import BBFS
+import External_BFS
+import HDA_Star
+import IDA_Star
+import IDS
+from budget import SearchBudget
+from helper import parse_size
+from solution_cache import get_cache, DEFAULT_MAX_BYTES
+
+ALGORITHMS = ["ids", "bbfs", "a_star", "ida_star", "external_bfs", "ara_star", "hda_star"]
+# seconds after the timeout of a board, when SIGALRM interrupts a search that has not stopped at its own deadline
+# (such as one that spends the time building its heuristic)
+TIMEOUT_GRACE = 1.0
+
+
+class BoardTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise BoardTimeout()
+
+
+def get_board_paths(patterns):
+    """
+    Expands the given directories (all of their .txt files) and glob patterns to a sorted list of input files.
+    :param patterns: list of directories, files or glob patterns
+    :type patterns: list
+    :rtype: list
+    """
+    board_paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "*.txt")
+        board_paths.update(path for path in glob.glob(pattern) if os.path.isfile(path))
+
+    return sorted(board_paths)
+
+
+def run_solver(board_path, algorithm, max_depth, mode, heuristic_name, timing=False, hooks=None, memory_budget=None,
+               cache=None, budget=None):
+    """
+    Runs the solve function of the given algorithm on the given board.
+    The memory budget is only used by BBFS, A* and HDA*, since IDS and IDA* only keep their current path (and the
+    external memory BFS keeps its layers on disk).
+    :param cache: solution cache to look the board up in before searching, and to write the result to
+    :type cache: SolutionCache
+    :param budget: limits of the search, passed to every solve function (None for no limit)
+    :type budget: SearchBudget
+    :return: tuple of (layout, root state, path, stats), as returned by the solve functions
+    :rtype: tuple
+    """
+    if algorithm == "ids":
+        solve, args, kwargs = IDS.solve, (max_depth, mode), {"timing": timing, "hooks": hooks}
+    elif algorithm == "bbfs":
+        solve, args = BBFS.solve, (mode,)
+        kwargs = {"timing": timing, "hooks": hooks, "memory_budget": memory_budget, "max_depth": max_depth}
+    elif algorithm == "a_star":
+        solve, args = A_Star.solve, (max_depth, mode, heuristic_name)
+        kwargs = {"timing": timing, "hooks": hooks, "memory_budget": memory_budget}
+    elif algorithm == "ida_star":
+        solve, args, kwargs = IDA_Star.solve, (max_depth, mode, heuristic_name), {"timing": timing, "hooks": hooks}
+    elif algorithm == "external_bfs":
+        if hooks is not None:
+            raise ValueError("the external memory BFS does not support hooks")
+        solve, args, kwargs = External_BFS.solve, (max_depth, mode), {}
+    elif algorithm == "ara_star":
+        # the default heuristic of A* is not admissible, which ARA* needs for its bounds, so it uses its own default
+        heuristic_name = "push_distance" if heuristic_name == "default" else heuristic_name
+        solve, args, kwargs = ARA_Star.solve, (max_depth, mode, heuristic_name), {"timing": timing, "hooks": hooks}
+    elif algorithm == "hda_star":
+        if hooks is not None:
+            raise ValueError("hash distributed A* does not support hooks")
+        solve, args = HDA_Star.solve, (max_depth, mode, heuristic_name)
+        kwargs = {"memory_budget": memory_budget}
+    else:
+        raise ValueError(f"unknown algorithm: {algorithm}")
+    kwargs["budget"] = budget
+
+    if cache is None:
+        return solve(board_path, *args, **kwargs)
+    return cache.solve(algorithm, solve, board_path, *args, **kwargs)
+
+
+def solve_board(board_path, algorithm, max_depth=250, mode="step", heuristic_name="default", timeout=None,
+                timing=False, memory_budget=None, cache_dir=None, cache_bytes=DEFAULT_MAX_BYTES, max_nodes=None):
+    """
+    Solves a single board, and summarizes the result in a JSON serializable dictionary. It runs in a worker process.
+
+    The timeout and max_nodes are a budget of the search (see budget.SearchBudget), which stops it with the
+    partial path of its most promising node. SIGALRM interrupts the worker TIMEOUT_GRACE seconds after the timeout,
+    if the search has not stopped by then, so the worker can go on with the next board.
+    :param board_path: path of the input file
+    :type board_path: str
+    :param algorithm: one of ALGORITHMS
+    :type algorithm: str
+    :param max_depth: maximum allowed depth (not used by BBFS)
+    :type max_depth: int
+    :param mode: "step" for single movements, or "push" for pushes
+    :type mode: str
+    :param heuristic_name: name of the heuristic of A* and IDA*, see A_Star.get_heuristic
+    :type heuristic_name: str
+    :param timeout: maximum number of seconds to spend on the board (None for no limit)
+    :type timeout: float
+    :param timing: whether to measure the time of the heuristic and successor generation calls
+    :type timing: bool
+    :param memory_budget: memory budget of BBFS, A* and HDA*, in nodes or bytes with a unit (None for no limit)
+    :type memory_budget: str
+    :param cache_dir: directory of the solution cache, which is consulted before searching (None for no cache)
+    :type cache_dir: str
+    :param cache_bytes: maximum size of the solution cache
+    :type cache_bytes: int
+    :param max_nodes: maximum number of nodes to expand (None for no limit)
+    :type max_nodes: int
+    :return: dictionary of board, status ("solved", "unsolvable", "timeout" or "error"), moves, cost, depth,
+     nodes created and expanded, wall time, "hit" or "miss" of the cache, and all the search statistics in "stats"
+     (see SearchStats.to_dict). A timed out search also has the reason ("time", "nodes" or "cancelled"), and the
+     moves, cost and butters on plates of its partial path (partial_moves is None if it has none).
+    :rtype: dict
+    """
+    result = {"board": board_path, "algorithm": algorithm, "mode": mode}
+    cache = get_cache(cache_dir, cache_bytes) if cache_dir else None
+
+    if timeout:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout + TIMEOUT_GRACE)
+
+    start_time = perf_counter()
+    budget = SearchBudget(timeout, max_nodes) if timeout or max_nodes is not None else None
+    try:
+        _, __, found_path, stats = run_solver(board_path, algorithm, max_depth, mode, heuristic_name, timing,
+                                              memory_budget=memory_budget, cache=cache, budget=budget)
+    except BoardTimeout:
+        result["status"] = "timeout"
+        result["time"] = perf_counter() - start_time
+        return result
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = repr(e)
+        result["time"] = perf_counter() - start_time
+        return result
+    finally:
+        if timeout:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    result["time"] = perf_counter() - start_time
+
+    if found_path is None and "timeout" in stats.details:
+        timeout = stats.details["timeout"]
+        result["status"] = "timeout"
+        result["reason"] = timeout["reason"]
+        if timeout["partial_movements"] is None:
+            result["partial_moves"] = None
+        else:
+            result["partial_moves"] = "".join(timeout["partial_movements"])
+            result["partial_cost"] = timeout["partial_cost"]
+            result["butters_on_plates"] = timeout["butters_on_plates"]
+    elif found_path is None and "incomplete" in stats.details:
+        result["status"] = "error"
+        result["error"] = stats.details["incomplete"]
+    elif found_path is None:
+        result["status"] = "unsolvable"
+    else:
+        result["status"] = "solved"
+        result["moves"] = found_path.moves.decode("ascii")
+        result["cost"] = found_path.cost
+        result["depth"] = len(found_path.moves)
+        if stats.pushes is not None:
+            result["pushes"] = stats.pushes
+
+    if cache is not None:
+        result["cache"] = stats.details["cache"]
+    result["nodes_created"] = stats.nodes_created
+    result["nodes_expanded"] = stats.nodes_expanded
+    result["stats"] = stats.to_dict()
+    return result
+
+
+def run_batch(board_paths, algorithm, workers=None, timeout=None, max_depth=250, mode="step",
+              heuristic_name="default", output=sys.stdout, timing=False, memory_budget=None, cache_dir=None,
+              cache_bytes=DEFAULT_MAX_BYTES, max_nodes=None):
+    """
+    Solves all the given boards in a pool of worker processes, and writes one JSON line per board to output
+    as soon as it is solved (so the lines are not in the order of board_paths).
+    :param board_paths: list of input files
+    :type board_paths: list
+    :param algorithm: one of ALGORITHMS
+    :type algorithm: str
+    :param workers: number of worker processes (None for the number of CPUs)
+    :type workers: int
+    :param timeout: maximum number of seconds to spend on each board (None for no limit)
+    :type timeout: float
+    :param output: file to write the JSON lines to
+    :param timing: whether to measure the time of the heuristic and successor generation calls
+    :type timing: bool
+    :param memory_budget: memory budget of BBFS, A* and HDA*, in nodes or bytes with a unit (None for no limit)
+    :type memory_budget: str
+    :param cache_dir: directory of the solution cache, shared by the workers (None for no cache)
+    :type cache_dir: str
+    :param cache_bytes: maximum size of the solution cache
+    :type cache_bytes: int
+    :param max_nodes: maximum number of nodes to expand on each board (None for no limit)
+    :type max_nodes: int
+    :return: tuple of the number of boards of each status, and the number of cache hits and misses
+    :rtype: tuple
+    """
+    status_counts = {}
+    cache_counts = {"hit": 0, "miss": 0}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(solve_board, board_path, algorithm, max_depth, mode, heuristic_name, timeout,
+                                   timing, memory_budget, cache_dir, cache_bytes, max_nodes)
+                   for board_path in board_paths]
+
+        for future in as_completed(futures):
+            result = future.result()
+            status_counts[result["status"]] = status_counts.get(result["status"], 0) + 1
+            if "cache" in result:
+                cache_counts[result["cache"]] += 1
+
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+
+    return status_counts, cache_counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solves many boards in parallel, and writes one JSON line per board.")
+    parser.add_argument("boards", nargs="+", help="directories (all of their .txt files), files or glob patterns")
+    parser.add_argument("-a", "--algorithm", choices=ALGORITHMS, default="a_star")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("-t", "--timeout", type=float, default=None, help="seconds per board")
+    parser.add_argument("-n", "--max-nodes", type=int, default=None, help="nodes to expand per board")
+    parser.add_argument("-d", "--max-depth", type=int, default=250)
+    parser.add_argument("-m", "--mode", choices=["step", "push"], default="step")
+    parser.add_argument("--heuristic", default="default", help="heuristic of A* and IDA* (default, push_distance)")
+    parser.add_argument("-o", "--output", default=None, help="JSONL output file (stdout by default)")
+    parser.add_argument("--timing", action="store_true", help="measure the heuristic and successor generation time")
+    parser.add_argument("--memory-budget", default=None,
+                        help="nodes (or bytes, such as 512MB) that BBFS, A* and HDA* keep before switching to IDS "
+                             "and IDA*")
+    parser.add_argument("--cache-dir", default=None, help="directory of the solution cache (no cache by default)")
+    parser.add_argument("--cache-size", default=str(DEFAULT_MAX_BYTES),
+                        help="maximum size of the solution cache, in bytes or with a unit (such as 64MB)")
+    args = parser.parse_args(argv)
+
+    board_paths = get_board_paths(args.boards)
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        status_counts, cache_counts = run_batch(board_paths, args.algorithm, args.workers, args.timeout,
+                                                args.max_depth, args.mode, args.heuristic, output, args.timing,
+                                                args.memory_budget, args.cache_dir, parse_size(args.cache_size),
+                                                args.max_nodes)
+    finally:
+        if args.output:
+            output.close()
+
+    print(f"Boards: {len(board_paths)}, " + ", ".join(f"{status.capitalize()}: {count}"
+                                                       for status, count in sorted(status_counts.items())),
+          file=sys.stderr)
+    if args.cache_dir:
+        print(f"Cache Hits: {cache_counts['hit']}, Cache Misses: {cache_counts['miss']}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+from multiprocessing import Pool
+from timeit import timeit
+
+from A_Star import get_heuristic_matrix, get_heuristic_matrix_np, heuristic_1, closest_plate_heuristic
+from batch import ALGORITHMS, solve_board, run_solver
+from helper import get_valid_backward_movements, perform_backward_move
+from hooks import SearchHooks, ProfileHook
+from state import Layout
+
+HEURISTIC_MATRIX_SIZES = [(10, 10, 3), (25, 25, 6), (50, 50, 12), (100, 100, 25)]
+
+# costs that the cells of a board are drawn from
+COST_MIXES = {
+    "uniform": (1,),
+    "mixed": (1, 1, 1, 2, 3),
+    "heavy": (1, 2, 3, 4, 5, 6, 7, 8, 9)
+}
+
+# (number of rows, number of columns, number of butters, obstacle density, cost mix) of each tier
+TIERS = {
+    "tiny": (5, 5, 1, 0.1, "uniform"),
+    "small": (8, 8, 2, 0.1, "mixed"),
+    "medium": (12, 12, 3, 0.15, "mixed"),
+    "large": (20, 20, 4, 0.2, "heavy"),
+    "huge": (30, 30, 6, 0.25, "heavy")
+}
+
+# (algorithm, mode, heuristic name) of each solver, as passed to batch.solve_board
+SOLVERS = {
+    "ids": ("ids", "step", "default"),
+    "bbfs": ("bbfs", "step", "default"),
+    "a_star": ("a_star", "step", "default"),
+    "a_star_push_distance": ("a_star", "step", "push_distance"),
+    "ida_star_push_distance": ("ida_star", "step", "push_distance"),
+    "a_star_push": ("a_star", "push", "push_distance")
+}
+
+
+def benchmark_heuristic_matrix(sizes=None, repeat=3, seed=0):
+    """
+    Compares get_heuristic_matrix and get_heuristic_matrix_np on empty boards with randomly placed plates,
+    and checks that they produce identical matrices.
+    :param sizes: list of (number of rows, number of columns, number of plates) tuples
+    :type sizes: list
+    :param repeat: number of runs of each function (the best time is reported)
+    :type repeat: int
+    :param seed: seed of the random plate locations
+    :type seed: int
+    :return: list of (size, heuristic name, python time, numpy time) tuples
+    :rtype: list
+    """
+    rnd = random.Random(seed)
+    results = []
+    for num_rows, num_cols, num_plates in sizes or HEURISTIC_MATRIX_SIZES:
+        objects = [["" for _ in range(num_cols)] for _ in range(num_rows)]
+        cells = [(i, j) for i in range(num_rows) for j in range(num_cols)]
+        plates_locs = rnd.sample(cells, num_plates)
+
+        for heuristic_func in (heuristic_1, closest_plate_heuristic):
+            matrix = get_heuristic_matrix(objects, plates_locs, heuristic_func)
+            matrix_np = get_heuristic_matrix_np(objects, plates_locs, heuristic_func)
+            if matrix != matrix_np:
+                raise AssertionError(f"different heuristic matrices for {num_rows}x{num_cols}, {num_plates} plates")
+
+            time = min(timeit(lambda: get_heuristic_matrix(objects, plates_locs, heuristic_func), number=1)
+                       for _ in range(repeat))
+            time_np = min(timeit(lambda: get_heuristic_matrix_np(objects, plates_locs, heuristic_func), number=1)
+                          for _ in range(repeat))
+            results.append(((num_rows, num_cols, num_plates), heuristic_func.__name__, time, time_np))
+
+    return results
+
+
+def generate_board(num_rows, num_cols, num_butters, obstacle_density=0.1, cost_mix="uniform", num_moves=None,
+                   seed=None):
+    """
+    Generates a random board that is guaranteed to be solvable, by playing backward from a solved state.
+
+    Obstacles, costs and plates are placed at random, with a butter on every plate and the robot on a free cell.
+    Then the robot walks backward at random, pulling the butter behind it most of the time, so every pull can be
+    undone by a push, and the goal stays reachable from the final state. The walk goes on after num_moves moves,
+    until no butter is left on a plate (or 10 * num_moves moves are made).
+    :param num_rows: number of rows
+    :type num_rows: int
+    :param num_cols: number of columns
+    :type num_cols: int
+    :param num_butters: number of butters (and plates)
+    :type num_butters: int
+    :param obstacle_density: fraction of the cells that are obstacles
+    :type obstacle_density: float
+    :param cost_mix: name of the costs of the cells, one of COST_MIXES
+    :type cost_mix: str
+    :param num_moves: number of backward moves (None for 4 times the number of cells)
+    :type num_moves: int
+    :param seed: seed of the random board
+    :type seed: int
+    :return: tuple of (costs, objects, robot location), in the format of read_input
+    :rtype: tuple
+    """
+    rnd = random.Random(seed)
+    num_moves = num_moves or 4 * num_rows * num_cols
+
+    cells = [(i, j) for i in range(num_rows) for j in range(num_cols)]
+    obstacles = set(rnd.sample(cells, int(obstacle_density * len(cells))))
+    free_cells = [cell for cell in cells if cell not in obstacles]
+    plates_locs = rnd.sample(free_cells, num_butters)
+    robot_loc = rnd.choice([cell for cell in free_cells if cell not in plates_locs])
+
+    costs = [[None if (i, j) in obstacles else rnd.choice(COST_MIXES[cost_mix]) for j in range(num_cols)]
+             for i in range(num_rows)]
+    objects = [["x" if (i, j) in obstacles else "" for j in range(num_cols)] for i in range(num_rows)]
+    for i, j in plates_locs:
+        objects[i][j] = "p"
+
+    layout = Layout(costs, objects)
+    state = layout.make_state_from_cells(layout.index(robot_loc),
+                                         tuple(sorted(layout.index(plate_loc) for plate_loc in plates_locs)))
+    for move_number in range(10 * num_moves):
+        if move_number >= num_moves and not any(butter in layout.plates for butter in state.butters):
+            break
+
+        valid_movements = get_valid_backward_movements(layout, state)
+        if not valid_movements:
+            break
+        new_states = perform_backward_move(layout, state, rnd.choice(valid_movements))
+        state = new_states[-1] if rnd.random() < 0.7 else new_states[0]
+
+    for cell in state.butters:
+        x, y = layout.loc(cell)
+        objects[x][y] = "b" + objects[x][y]
+
+    return costs, objects, layout.loc(state.robot)
+
+
+def write_board(file_path, costs, objects, robot_loc):
+    """
+    Writes a board in the input format of read_input.
+    :param file_path: path of the input file to write
+    :type file_path: str
+    :param costs: 2d list of the cost of each cell (None for obstacles)
+    :type costs: list
+    :param objects: 2d list of the objects of each cell
+    :type objects: list
+    :param robot_loc: robot location
+    :type robot_loc: tuple
+    """
+    num_rows, num_cols = len(objects), len(objects[0])
+    with open(file_path, "w") as file:
+        file.write(f"{num_rows}\t{num_cols}\n")
+        for i in range(num_rows):
+            cells = []
+            for j in range(num_cols):
+                if objects[i][j] == "x":
+                    cells.append("x")
+                else:
+                    cells.append(f"{costs[i][j]}{'r' if (i, j) == robot_loc else ''}{objects[i][j]}")
+            file.write("\t".join(cells) + "\n")
+
+
+def generate_tiers(output_dir, tiers=None, boards_per_tier=5, seed=0):
+    """
+    Generates boards_per_tier boards of each tier into output_dir/<tier>/<tier>_<n>.txt.
+    :param output_dir: directory of the boards
+    :type output_dir: str
+    :param tiers: list of tier names, see TIERS (None for all of them)
+    :type tiers: list
+    :param boards_per_tier: number of boards of each tier
+    :type boards_per_tier: int
+    :param seed: seed of the first board, the others use the following seeds
+    :type seed: int
+    :return: list of (tier, board path) tuples
+    :rtype: list
+    """
+    boards = []
+    for tier in tiers or TIERS:
+        num_rows, num_cols, num_butters, obstacle_density, cost_mix = TIERS[tier]
+        tier_dir = os.path.join(output_dir, tier)
+        os.makedirs(tier_dir, exist_ok=True)
+
+        for board_number in range(boards_per_tier):
+            board_path = os.path.join(tier_dir, f"{tier}_{board_number}.txt")
+            write_board(board_path, *generate_board(num_rows, num_cols, num_butters, obstacle_density, cost_mix,
+                                                    seed=seed + board_number))
+            boards.append((tier, board_path))
+
+    return boards
+
+
+def _run_benchmark(args):
+    """
+    Runs one solver on one board, in a worker process that is used for this run only, so ru_maxrss of the process
+    is the peak memory of this run. The memory used before the search (the interpreter and the modules) is
+    subtracted from it.
+    :param args: tuple of (tier, board path, solver name, max depth, timeout)
+    :return: the result of batch.solve_board, with the tier, solver, nodes per second and peak memory in KiB
+    :rtype: dict
+    """
+    tier, board_path, solver, max_depth, timeout = args
+    algorithm, mode, heuristic_name = SOLVERS[solver]
+
+    base_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result = solve_board(board_path, algorithm, max_depth, mode, heuristic_name, timeout)
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    result["tier"] = tier
+    result["solver"] = solver
+    result["peak_memory_kb"] = peak_memory - base_memory
+    if "nodes_expanded" in result and result["time"] > 0:
+        result["nodes_per_second"] = result["nodes_expanded"] / result["time"]
+    return result
+
+
+def run_suite(boards, solvers=None, timeout=60, max_depth=250, workers=1, output=None):
+    """
+    Runs every solver on every board, each run in a new worker process.
+    Runs share the CPUs when workers > 1, which makes the times less reliable.
+    :param boards: list of (tier, board path) tuples, as returned by generate_tiers
+    :type boards: list
+    :param solvers: list of solver names, see SOLVERS (None for all of them)
+    :type solvers: list
+    :param timeout: maximum number of seconds of each run (None for no limit)
+    :type timeout: float
+    :param max_depth: maximum allowed depth
+    :type max_depth: int
+    :param workers: number of runs at the same time
+    :type workers: int
+    :param output: file to write one JSON line per run to, as soon as it is done (None for no output)
+    :return: list of the results of all runs, see _run_benchmark
+    :rtype: list
+    """
+    runs = [(tier, board_path, solver, max_depth, timeout) for tier, board_path in boards
+            for solver in solvers or SOLVERS]
+
+    results = []
+    with Pool(workers, maxtasksperchild=1) as pool:
+        for result in pool.imap_unordered(_run_benchmark, runs):
+            results.append(result)
+            if output is not None:
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+
+    return results
+
+
+def summarize_suite(results):
+    """
+    Groups the results of run_suite by tier and solver (in the order of TIERS and SOLVERS).
+    :param results: list of the results of run_suite
+    :type results: list
+    :return: list of dictionaries of tier, solver, number of runs and of solved runs, median time and nodes per second,
+     maximum peak memory (of all runs), and mean cost (of the solved runs, None if none is solved)
+    :rtype: list
+    """
+    groups = {}
+    for result in results:
+        groups.setdefault((result["tier"], result["solver"]), []).append(result)
+
+    tier_order, solver_order = list(TIERS), list(SOLVERS)
+    summary = []
+    for (tier, solver), group in sorted(groups.items(), key=lambda item: (tier_order.index(item[0][0]),
+                                                                           solver_order.index(item[0][1]))):
+        solved = [result for result in group if result["status"] == "solved"]
+        nodes_per_second = [result["nodes_per_second"] for result in group if "nodes_per_second" in result]
+        summary.append({
+            "tier": tier,
+            "solver": solver,
+            "runs": len(group),
+            "solved": len(solved),
+            "median_time": statistics.median(result["time"] for result in group),
+            "median_nodes_per_second": statistics.median(nodes_per_second) if nodes_per_second else None,
+            "max_peak_memory_kb": max(result["peak_memory_kb"] for result in group),
+            "mean_cost": statistics.mean(result["cost"] for result in solved) if solved else None
+        })
+
+    return summary
+
+
+def pprint_summary(summary):
+    print(f"{'Tier':<8} {'Solver':<24} {'Solved':>7} {'Time (s)':>9} {'Nodes/s':>9} {'Memory (MiB)':>13} {'Cost':>7}")
+    for row in summary:
+        nodes_per_second = row["median_nodes_per_second"]
+        mean_cost = row["mean_cost"]
+        print(f"{row['tier']:<8} {row['solver']:<24} {row['solved']:>3}/{row['runs']:<3} {row['median_time']:>9.3f} "
+              f"{'-' if nodes_per_second is None else f'{nodes_per_second:.0f}':>9} "
+              f"{row['max_peak_memory_kb'] / 1024:>13.1f} {'-' if mean_cost is None else f'{mean_cost:.1f}':>7}")
+
+
+def profile_solve(board_path, algorithm, max_depth=250, mode="step", heuristic_name="default", sample_every=100,
+                  output_path=None):
+    """
+    Solves a single board with a ProfileHook, which profiles one in every sample_every expansions.
+    :param board_path: path of the input file
+    :type board_path: str
+    :param algorithm: one of batch.ALGORITHMS
+    :type algorithm: str
+    :param sample_every: number of expansions between the profiled ones
+    :type sample_every: int
+    :param output_path: path to write the pstats file to (None to not write it)
+    :type output_path: str
+    :return: tuple of the hook, and the stats of the search
+    :rtype: tuple
+    """
+    with ProfileHook(output_path, sample_every) as hook:
+        _, __, ___, stats = run_solver(board_path, algorithm, max_depth, mode, heuristic_name,
+                                       hooks=SearchHooks(hook))
+
+    return hook, stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the solvers and of the heuristic matrix.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser("generate", help="generate solvable boards of each tier")
+    suite_parser = subparsers.add_parser("suite", help="generate boards of each tier, and run every solver on them")
+    for subparser in (generate_parser, suite_parser):
+        subparser.add_argument("-o", "--output-dir", default="benchmark_boards")
+        subparser.add_argument("--tiers", nargs="+", choices=list(TIERS), default=None)
+        subparser.add_argument("-n", "--boards-per-tier", type=int, default=5)
+        subparser.add_argument("--seed", type=int, default=0)
+    suite_parser.add_argument("-s", "--solvers", nargs="+", choices=list(SOLVERS), default=None)
+    suite_parser.add_argument("-t", "--timeout", type=float, default=60, help="seconds per run")
+    suite_parser.add_argument("-d", "--max-depth", type=int, default=250)
+    suite_parser.add_argument("-w", "--workers", type=int, default=1, help="number of runs at the same time")
+
+    profile_parser = subparsers.add_parser("profile", help="profile a sample of the expansions of a single solve")
+    profile_parser.add_argument("board", help="input file")
+    profile_parser.add_argument("-a", "--algorithm", choices=ALGORITHMS, default="a_star")
+    profile_parser.add_argument("-d", "--max-depth", type=int, default=250)
+    profile_parser.add_argument("-m", "--mode", choices=["step", "push"], default="step")
+    profile_parser.add_argument("--heuristic", default="default", help="heuristic of A* and IDA*")
+    profile_parser.add_argument("--sample-every", type=int, default=100, help="expansions between the profiled ones")
+    profile_parser.add_argument("--sort", default="cumulative", help="pstats sort key")
+    profile_parser.add_argument("-o", "--output", default=None, help="pstats output file")
+
+    matrix_parser = subparsers.add_parser("heuristic-matrix", help="compare the Python and NumPy heuristic matrices")
+    matrix_parser.add_argument("-r", "--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.command == "heuristic-matrix":
+        for (num_rows, num_cols, num_plates), name, time, time_np in benchmark_heuristic_matrix(repeat=args.repeat):
+            print(f"{num_rows}x{num_cols}, {num_plates} plates, {name}: "
+                  f"Python {time:.4f}s, NumPy {time_np:.4f}s, Speedup {time / time_np:.1f}x")
+        return
+
+    if args.command == "profile":
+        hook, stats = profile_solve(args.board, args.algorithm, args.max_depth, args.mode, args.heuristic,
+                                    args.sample_every, args.output)
+        print(f"Nodes Expanded: {stats.nodes_expanded}, Sampled Expansions: {hook.num_samples}")
+        print(hook.report(args.sort))
+        return
+
+    boards = generate_tiers(args.output_dir, args.tiers, args.boards_per_tier, args.seed)
+    if args.command == "generate":
+        print(f"Boards: {len(boards)}, written to {args.output_dir}")
+        return
+
+    with open(os.path.join(args.output_dir, "results.jsonl"), "w") as output:
+        results = run_suite(boards, args.solvers, args.timeout, args.max_depth, args.workers, output)
+    pprint_summary(summarize_suite(results))
+
+
+if __name__ == "__main__":
+    main()
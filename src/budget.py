@@ -0,0 +1,157 @@
+from time import perf_counter
+
+from move_path import MovePath
+from push import expand_pushes
+
+INFINITY = float("inf")
+
+
+class BudgetExhausted(Exception):
+    def __init__(self, reason, node=None, movements=None):
+        """
+        Raised by SearchBudget.check, and caught by the solve functions, which return a timed out result instead.
+        :param reason: "time", "nodes" or "cancelled"
+        :type reason: str
+        :param node: node that the search was at when it stopped (None if it is not known)
+        :type node: Node
+        :param movements: movements from the root to the state that the search was at, for a search whose nodes do
+         not link to their parents (None if it is not known)
+        :type movements: list
+        """
+        super().__init__(reason)
+        self.reason = reason
+        self.node = node
+        self.movements = movements
+
+
+class SearchBudget:
+    def __init__(self, time_limit=None, node_limit=None, cancel_event=None, check_every=1024):
+        """
+        Limits of a search, and a token to cancel it with.
+
+        The search loops compare the number of expanded nodes with next_check on every expansion, and only call
+        check when it is reached, so a budget costs one comparison per expansion:
+
+            if stats.nodes_expanded >= budget.next_check:
+                budget.check(stats, node)
+
+        check looks at the clock and the cancel event, and raises BudgetExhausted if the budget is used up, otherwise
+        it sets next_check again (every check_every expansions, or at the node limit). A budget without a time limit
+        and a cancel event only has to be checked at its node limit, and NO_BUDGET never is.
+        cancel can be called from another thread (or a hook), and stops the search at its next expansion.
+
+        The clock starts when the budget is created, so a budget is used for a single search.
+
+        :param time_limit: maximum number of seconds (None for no limit)
+        :type time_limit: float
+        :param node_limit: maximum number of expanded nodes (None for no limit)
+        :type node_limit: int
+        :param cancel_event: event that cancels the search when it is set, such as a multiprocessing.Event shared
+         with another process (None for none)
+        :param check_every: number of expansions between two looks at the clock and the cancel event
+        :type check_every: int
+        """
+        self.time_limit = None if time_limit is None else float(time_limit)
+        self.node_limit = None if node_limit is None else int(node_limit)
+        self.cancel_event = cancel_event
+        self.check_every = check_every
+
+        self.deadline = INFINITY if self.time_limit is None else perf_counter() + self.time_limit
+        self.cancelled = False
+        self.periodic = self.time_limit is not None or cancel_event is not None
+        self.next_check = 0 if self.periodic else self._node_limit()
+
+    def _node_limit(self):
+        return INFINITY if self.node_limit is None else self.node_limit
+
+    def cancel(self):
+        """
+        cancels the search, which raises BudgetExhausted("cancelled") at its next expansion
+        """
+        self.cancelled = True
+        self.next_check = 0
+
+    def exhausted(self, stats):
+        """
+        :param stats: statistics of the search
+        :type stats: SearchStats
+        :return: the reason the budget is used up ("cancelled", "nodes" or "time"), or None if it is not
+        :rtype: str
+        """
+        if self.cancelled or (self.cancel_event is not None and self.cancel_event.is_set()):
+            return "cancelled"
+        if self.node_limit is not None and stats.nodes_expanded >= self.node_limit:
+            return "nodes"
+        if perf_counter() >= self.deadline:
+            return "time"
+
+        next_check = stats.nodes_expanded + self.check_every if self.periodic else INFINITY
+        self.next_check = min(next_check, self._node_limit())
+        return None
+
+    def check(self, stats, node=None):
+        """
+        :param stats: statistics of the search
+        :type stats: SearchStats
+        :param node: node that the search is at, for the partial path of the result
+        :type node: Node
+        :raises BudgetExhausted: if the budget is used up
+        """
+        reason = self.exhausted(stats)
+        if reason is not None:
+            raise BudgetExhausted(reason, node)
+
+
+# budget of a search without limits, it must not be cancelled
+NO_BUDGET = SearchBudget()
+
+
+def record_timeout(stats, reason, layout, root_state, node=None, mode="step", movements=None):
+    """
+    Stores the timed out result of a search in the "timeout" details of its stats: the reason, and the movements of
+    the most promising partial path (None if the search has none), with their cost and the number of butters that
+    they leave on plates.
+    :param stats: statistics of the search
+    :type stats: SearchStats
+    :param reason: "time", "nodes" or "cancelled"
+    :type reason: str
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param root_state: state the search started from (not normalized in push mode)
+    :type root_state: State
+    :param node: last node of the partial path, which is followed up to the root through its parents
+     (None for no partial path)
+    :type node: Node
+    :param mode: "step" for single movements, or "push" for pushes (the movements of the nodes)
+    :type mode: str
+    :param movements: movements of the partial path, if it is given by them instead of node
+    :type movements: list
+    """
+    timeout = {"reason": reason, "partial_movements": None}
+    if node is not None:
+        movements = []
+        while node.parent != "":
+            movements.append(node.movement)
+            node = node.parent
+        movements.reverse()
+    if movements is not None:
+        if mode == "push":
+            movements = expand_pushes(layout, root_state, movements)
+
+        partial_path = MovePath(layout, root_state, movements, include_root=True)
+        state = partial_path[-1].state
+        timeout["partial_movements"] = movements
+        timeout["partial_cost"] = partial_path.cost
+        timeout["butters_on_plates"] = sum(butter in layout.plates for butter in state.butters)
+
+    stats.details["timeout"] = timeout
+
+
+def print_timeout(timeout):
+    """
+    prints the timed out result of a search, stored by record_timeout
+    """
+    print(f"Search stopped ({timeout['reason']})")
+    if timeout["partial_movements"] is not None:
+        print(f"Partial Path Movements: {timeout['partial_movements']}")
+        print(f"Partial Cost: {timeout['partial_cost']}, Butters on Plates: {timeout['butters_on_plates']}")
@@ -1,6 +1,24 @@
-from copy import deepcopy
+from queue import Empty
 
 from node import Node
+from state import State
+
+# rough memory of a reached node (the node, its state, and its entries in the frontier and the closed set) in bytes,
+# measured with tracemalloc on A* and BBFS and rounded up, so a budget in bytes is converted to a number of nodes
+NODE_BYTES = 400
+MEMORY_UNITS = {"B": 1, "KB": 1 << 10, "MB": 1 << 20, "GB": 1 << 30}
+# seconds between two checks that the worker processes of a search are still alive, while waiting for them
+WORKER_CHECK_INTERVAL = 1.0
+
+
+class MemoryBudgetExceeded(Exception):
+    def __init__(self, lower_bound):
+        """
+        Raised by a search when its frontier and closed set reach the memory budget.
+        :param lower_bound: lower bound of the cost (or the length) of the cheapest path, from what is already searched
+        """
+        super().__init__(f"memory budget exceeded (lower bound {lower_bound})")
+        self.lower_bound = lower_bound
 
 
 def read_input(file_path):
@@ -49,20 +67,19 @@ def parse_cell(cell_str):
     return cell_cost, cell_objects, is_robot_in_it, is_plate_in_it
 
 
-def is_in_goal(objects):
+def is_in_goal(layout, state):
     """
-    checks to see if the given objects satisfy the goal condition or not
+    checks to see if the given state satisfies the goal condition or not
     the goal condition is that there will not be any cell with butter ALONE.
-    :param objects: objects of the field
-    :type objects: list
-    :return: True if the given objects satisfy goal condition, False otherwise
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: state to be checked
+    :type state: State
+    :return: True if the given state satisfies goal condition, False otherwise
     :rtype: bool
     """
-    for row in objects:
-        if any(cell == "b" for cell in row):
-            return False
-
-    return True
+    plates = layout.plates
+    return all(butter in plates for butter in state.butters)
 
 
 def get_reverse_movement(movement):
@@ -102,264 +119,308 @@ def calc_backward_new_loc(loc, movement):
         return (x, y + 1)
 
 
-def is_loc_in_boundaries(objects, loc):
-    """
-    checks to see if the given location is in the boundaries of the field
-    :param objects: objects of the field
-    :type objects: list
-    :param loc: location to be checked
-    :return: True if loc is in boundaries, False otherwise.
-    :rtype: bool
-    """
-    num_rows, num_cols = len(objects), len(objects[0])
-    x, y = loc
-
-    return (0 <= x < num_rows) and (0 <= y < num_cols)
-
-
-def is_loc_obstacle(objects, loc):
+def is_cell_obstacle(layout, state, cell):
     """
-    checks to see if object in the the given location is an obstacle or not
+    checks to see if object in the the given cell is an obstacle or not
     An obstacle is a cell which has bp or x in it.
-    :param objects: objects of the field
-    :type objects: list
-    :param loc: location to be checked
-    :type loc: tuple
-    :return: True if object in loc is an obstacle, False otherwise
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: current state of the field
+    :type state: State
+    :param cell: cell index to be checked
+    :type cell: int
+    :return: True if object in cell is an obstacle, False otherwise
     :rtype: bool
     """
-    x, y = loc
-    return objects[x][y] == "bp" or objects[x][y] == "x"
+    return cell in layout.obstacles or (cell in layout.plates and cell in state.butters)
 
 
-def one_layer_check(objects, loc, movement):
+def one_layer_check(layout, state, cell, movement):
     """
-    checks to see if the new location (result of movement) is not out of boundaries and
-     object in the the given location is not an obstacle.
-    :param objects: objects of the field
-    :type objects: list
-    :param loc: location to be checked
-    :type loc: tuple
+    checks to see if the new cell (result of movement) is not out of boundaries and
+     object in the the given cell is not an obstacle.
+    Out of boundaries and x cells are already -1 in the neighbor table, so only bp has to be checked.
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: current state of the field
+    :type state: State
+    :param cell: cell index to be checked
+    :type cell: int
     :param movement: the move that is to be made
     :type movement: str (from the values "u", "r", "d", "l")
-    :return: True if the new location in boundaries and doesn't have any obstacle, False otherwise
-    :rtype: bool
+    :return: the new cell if it is in boundaries and doesn't have any obstacle, -1 otherwise
+    :rtype: int
     """
-    new_loc = calc_new_loc(loc, movement)
+    new_cell = layout.neighbors[movement][cell]
 
-    if not is_loc_in_boundaries(objects, new_loc):
-        return False
+    if new_cell < 0:
+        return -1
 
-    if is_loc_obstacle(objects, new_loc):
-        return False
+    if new_cell in layout.plates and new_cell in state.butters:
+        return -1
 
-    return True
+    return new_cell
 
 
-def is_move_valid(objects, robot_loc, movement):
+def is_move_valid(layout, state, movement):
     """
     checks to see if the given movement from the robot location is valid or not.
-    :param objects: objects of the field
-    :type objects: list
-    :param robot_loc: robot location
-    :type robot_loc: tuple
+    Pushing a butter into a dead cell (Layout.dead_cells) is not valid, unless the layout does not prune them.
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: current state of the field
+    :type state: State
     :param movement: the move that is to be made
     :type movement: str (from the values "u", "r", "d", "l")
     :return: True if the move is allowed, False otherwise
     :rtype: bool
     """
-    if not one_layer_check(objects, robot_loc, movement):
+    robot_new_cell = layout.neighbors[movement][state.robot]
+    if robot_new_cell < 0:
         return False
 
-    robot_new_loc = calc_new_loc(robot_loc, movement)
-    robot_new_x, robot_new_y = robot_new_loc
-
-    if objects[robot_new_x][robot_new_y] == "b":
-        butter_loc = robot_new_x, robot_new_y
-
-        if not one_layer_check(objects, butter_loc, movement):
+    if robot_new_cell in state.butters:
+        if robot_new_cell in layout.plates:
             return False
 
-        butter_new_loc = calc_new_loc(butter_loc, movement)
-        butter_new_x, butter_new_y = butter_new_loc
-        if objects[butter_new_x][butter_new_y] == "b":
+        butter_new_cell = layout.beyond[movement][state.robot]
+        if butter_new_cell < 0 or butter_new_cell in state.butters or butter_new_cell in layout.pruned_cells:
             return False
 
     return True
 
 
-def is_backward_move_valid(objects, robot_loc, movement):
+def is_backward_move_valid(layout, state, movement):
     """
     checks to see it the given backward movement from robot location is valid or not.
-    :param objects: objects of the field
-    :type objects: list
-    :param robot_loc: robot location
-    :type robot_loc: tuple
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: current state of the field
+    :type state: State
     :param movement: the move that is to be made
     :type movement: str (from the values "u", "r", "d", "l")
     :return: True if the backward move is allowed, False otherwise
     :rtype: bool
     """
-    if not one_layer_check(objects, robot_loc, movement):
-        return False
-
-    robot_new_loc = calc_new_loc(robot_loc, movement)
-    robot_new_x, robot_new_y = robot_new_loc
-    if objects[robot_new_x][robot_new_y] == "b":
+    robot_new_cell = layout.neighbors[movement][state.robot]
+    if robot_new_cell < 0 or robot_new_cell in state.butters:
         return False
 
     return True
 
 
-def get_valid_movements(objects, robot_loc):
+def get_valid_movements(layout, state):
     """
-    :param objects: objects of the field
-    :type objects: list
-    :param robot_loc: robot location
-    :type robot_loc: tuple
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: current state of the field
+    :type state: State
     :return: the set of all valid movements from robot location
     :rtype: list
     """
     movements = ["u", "r", "d", "l"]
     valid_movements = []
     for movement in movements:
-        if is_move_valid(objects, robot_loc, movement):
+        if is_move_valid(layout, state, movement):
             valid_movements.append(movement)
 
     return valid_movements
 
 
-def get_valid_backward_movements(objects, robot_loc):
+def get_valid_backward_movements(layout, state):
     """
-    :param objects: objects of the field
-    :type objects: list
-    :param robot_loc: robot location
-    :type robot_loc: tuple
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: current state of the field
+    :type state: State
     :return: the set of all valid backward movements from robot location
     :rtype: list
     """
     movements = ["u", "r", "d", "l"]
     valid_movements = []
     for movement in movements:
-        if is_backward_move_valid(objects, robot_loc, movement):
+        if is_backward_move_valid(layout, state, movement):
             valid_movements.append(movement)
 
     return valid_movements
 
 
-def perform_move(objects, robot_loc, movement):
+def move_butter(butters, old_cell, new_cell):
     """
-    Updates objects list (environment) according to the given movement, and
-     returns the new_objects (new environment) and new robot location.
-    :param objects: objects of the field
-    :type objects: list
-    :param robot_loc: robot location
-    :type robot_loc: tuple
-    :param movement: the move that is to be made
-    :type movement: str (from the values "u", "r", "d", "l")
-    :return: tuple of new_objects and new robot location
+    :return: sorted tuple of butters, where the butter in old_cell is moved to new_cell
     :rtype: tuple
     """
-    robot_new_loc = calc_new_loc(robot_loc, movement)
-    robot_new_x, robot_new_y = robot_new_loc
+    return tuple(sorted(new_cell if butter == old_cell else butter for butter in butters))
 
-    new_objects = deepcopy(objects)
-    if objects[robot_new_x][robot_new_y] == "b":
-        butter_new_loc = calc_new_loc(robot_new_loc, movement)
-        butter_new_x, butter_new_y = butter_new_loc
 
-        new_objects[butter_new_x][butter_new_y] = "b" + new_objects[butter_new_x][butter_new_y]
-        new_objects[robot_new_x][robot_new_y] = ""
+def perform_move(layout, state, movement):
+    """
+    Applies the given (valid) movement to the state, and returns the new state.
+    The given state is not changed.
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: current state of the field
+    :type state: State
+    :param movement: the move that is to be made
+    :type movement: str (from the values "u", "r", "d", "l")
+    :return: new state
+    :rtype: State
+    """
+    robot_new_cell = layout.neighbors[movement][state.robot]
+    key = state.key ^ layout.robot_keys[state.robot] ^ layout.robot_keys[robot_new_cell]
+
+    butters = state.butters
+    if robot_new_cell in butters:
+        butter_new_cell = layout.beyond[movement][state.robot]
+        butters = move_butter(butters, robot_new_cell, butter_new_cell)
+        key ^= layout.butter_keys[robot_new_cell] ^ layout.butter_keys[butter_new_cell]
 
-    return new_objects, robot_new_loc
+    return State(robot_new_cell, butters, key)
 
 
-def perform_backward_move(objects, robot_loc, movement):
+def perform_backward_move(layout, state, movement):
     """
-    Updates objects list (environment) according to the given BACKWARD movement, and
-     returns the new_objects (new environment) and new robot location.
-    :param objects: objects of the field
-    :type objects: list
-    :param robot_loc: robot location
-    :type robot_loc: tuple
+    Applies the given (valid) BACKWARD movement to the state, and returns all the states it can lead to:
+     the robot either just walks, or also pulls the butter which is behind it.
+    A butter is never pulled onto a plate, since a butter on a plate can not be pushed anymore, so no forward
+     move could undo such a pull.
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: current state of the field
+    :type state: State
     :param movement: the move that is to be made
     :type movement: str (from the values "u", "r", "d", "l")
-    :return: tuple of new_objects and new robot location
-    :rtype: tuple
+    :return: list of new states
+    :rtype: list
     """
-    robot_x, robot_y = robot_loc
-    robot_new_loc = calc_new_loc(robot_loc, movement)
+    robot_cell = state.robot
+    robot_new_cell = layout.neighbors[movement][robot_cell]
+    key = state.key ^ layout.robot_keys[robot_cell] ^ layout.robot_keys[robot_new_cell]
+
+    new_states_ls = [State(robot_new_cell, state.butters, key)]
 
-    opposite_neighbor_loc = calc_backward_new_loc(robot_loc, movement)
-    opposite_neighbor_x, opposite_neighbor_y = opposite_neighbor_loc
+    opposite_neighbor_cell = layout.neighbors[get_reverse_movement(movement)][robot_cell]
+    if opposite_neighbor_cell >= 0 and opposite_neighbor_cell in state.butters and robot_cell not in layout.plates:
+        new_butters = move_butter(state.butters, opposite_neighbor_cell, robot_cell)
+        key ^= layout.butter_keys[opposite_neighbor_cell] ^ layout.butter_keys[robot_cell]
+        new_states_ls.append(State(robot_new_cell, new_butters, key))
 
-    new_objects_ls = []
-    new_objects_1 = deepcopy(objects)
-    new_objects_ls.append(new_objects_1)
+    return new_states_ls
 
-    if is_loc_in_boundaries(objects, opposite_neighbor_loc):
-        if "b" in objects[opposite_neighbor_x][opposite_neighbor_y]:
-            new_objects_2 = deepcopy(objects)
 
-            opposite_neighbor_object = objects[opposite_neighbor_x][opposite_neighbor_y]
-            opposite_neighbor_object = list(opposite_neighbor_object)
-            opposite_neighbor_object.remove("b")
-            opposite_neighbor_object = "".join(opposite_neighbor_object)
+def get_successors(layout, state):
+    """
+    Generates all the states that are reachable from the given state with one valid movement
+    (so pushes into dead cells are skipped, unless the layout does not prune them).
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: current state of the field
+    :type state: State
+    :return: list of (movement, new state, cost of the movement) tuples, where the cost of a movement is
+     the cost of the cell that the robot moves into
+    :rtype: list
+    """
+    robot, butters = state.robot, state.butters
+    plates, costs, pruned_cells = layout.plates, layout.costs, layout.pruned_cells
+    robot_keys, butter_keys = layout.robot_keys, layout.butter_keys
+    key = state.key ^ robot_keys[robot]
+
+    successors = []
+    for movement, _, neighbors, beyond, __ in layout.move_tables:
+        robot_new_cell = neighbors[robot]
+        if robot_new_cell < 0:
+            continue
+
+        if robot_new_cell in butters:
+            butter_new_cell = beyond[robot]
+            if robot_new_cell in plates or butter_new_cell < 0 or butter_new_cell in butters \
+                    or butter_new_cell in pruned_cells:
+                continue
+
+            new_state = State(robot_new_cell, move_butter(butters, robot_new_cell, butter_new_cell),
+                              key ^ robot_keys[robot_new_cell] ^ butter_keys[robot_new_cell]
+                              ^ butter_keys[butter_new_cell])
+        else:
+            new_state = State(robot_new_cell, butters, key ^ robot_keys[robot_new_cell])
 
-            new_objects_2[robot_x][robot_y] = "b" + new_objects_1[robot_x][robot_y]
-            new_objects_2[opposite_neighbor_x][opposite_neighbor_y] = opposite_neighbor_object
-            new_objects_ls.append(new_objects_2)
-    else:
-        pass
+        successors.append((movement, new_state, costs[robot_new_cell]))
 
-    return new_objects_ls, robot_new_loc
+    return successors
 
 
-def get_goal_states(objects):
+def get_backward_successors(layout, state):
     """
-    calculates ALL possible goal states (objects and
-    :param objects:
-    :return:
+    Generates all the states that the given state is reachable from, with one valid movement.
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: current state of the field
+    :type state: State
+    :return: list of (movement, previous state) tuples, where movement is the (forward) movement that
+     leads from the previous state to the given state
+    :rtype: list
     """
-    num_rows, num_cols = len(objects), len(objects[0])
+    robot, butters = state.robot, state.butters
+    can_pull = robot not in layout.plates
+    robot_keys, butter_keys = layout.robot_keys, layout.butter_keys
+    key = state.key ^ robot_keys[robot]
+
+    predecessors = []
+    for _, reverse_movement, neighbors, __, opposite_neighbors in layout.move_tables:
+        robot_new_cell = neighbors[robot]
+        if robot_new_cell < 0 or robot_new_cell in butters:
+            continue
 
-    goal_objects = deepcopy(objects)
-    bp_loc = []
+        new_key = key ^ robot_keys[robot_new_cell]
+        predecessors.append((reverse_movement, State(robot_new_cell, butters, new_key)))
 
-    for i in range(num_rows):
-        for j in range(num_cols):
-            if goal_objects[i][j] == "p":
-                goal_objects[i][j] = "bp"
-                bp_loc.append((i, j))
+        opposite_neighbor_cell = opposite_neighbors[robot]
+        if can_pull and opposite_neighbor_cell >= 0 and opposite_neighbor_cell in butters:
+            new_butters = move_butter(butters, opposite_neighbor_cell, robot)
+            new_key ^= butter_keys[opposite_neighbor_cell] ^ butter_keys[robot]
+            predecessors.append((reverse_movement, State(robot_new_cell, new_butters, new_key)))
 
-            elif goal_objects[i][j] == "b":
-                goal_objects[i][j] = ""
+    return predecessors
 
-    goal_robot_locs = []
 
-    for loc in bp_loc:
+def get_goal_states(layout, state):
+    """
+    calculates ALL possible goal states: every plate has a butter on it, and the robot is next to one of the plates
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: initial state of the field
+    :type state: State
+    :return: list of goal states
+    :rtype: list
+    """
+    goal_butters = tuple(sorted(layout.plates))
+
+    goal_robot_cells = []
+    for cell in goal_butters:
         movements = ["u", "r", "d", "l"]
         for movement in movements:
-            if not one_layer_check(objects, loc, movement):
+            neighbor_cell = one_layer_check(layout, state, cell, movement)
+            if neighbor_cell < 0:
                 continue
 
-            neighbor_loc = calc_new_loc(loc, movement)
-            if not one_layer_check(objects, neighbor_loc, movement):
+            if one_layer_check(layout, state, neighbor_cell, movement) < 0:
                 continue
 
-            goal_robot_locs.append(neighbor_loc)
+            goal_robot_cells.append(neighbor_cell)
 
-    return goal_objects, goal_robot_locs
+    return [layout.make_state_from_cells(robot_cell, goal_butters) for robot_cell in goal_robot_cells]
 
 
-def get_goal_states_nodes(objects):
+def get_goal_states_nodes(layout, state):
     """
     converts goal states to node objects, and returns them
-    :param objects:
-    :return:
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: initial state of the field
+    :type state: State
+    :return: list of goal nodes
+    :rtype: list
     """
-    goal_objects, goal_robot_locs = get_goal_states(objects)
-    return [Node(goal_objects, goal_robot_locs[i], 0, "", "") for i in range(len(goal_robot_locs))]
+    return [Node(goal_state, 0, "", "") for goal_state in get_goal_states(layout, state)]
 
 
 def get_path_movements(path):
@@ -372,17 +433,41 @@ def get_path_movements(path):
     return [node.movement for node in path]
 
 
-def pprint_path(path):
+def replay_path(layout, state, movements):
+    """
+    Applies the given movements one after another, starting from the given state
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: starting state
+    :type state: State
+    :param movements: list of valid movements
+    :type movements: list
+    :return: the path, as a list of nodes (the starting node is not included)
+    :rtype: list
+    """
+    path = []
+    node = Node(state, 0, "", "", 0)
+    for movement in movements:
+        new_state = perform_move(layout, node.state, movement)
+        node = Node(new_state, node.depth + 1, movement, node, node.cost_g + layout.costs[new_state.robot])
+        path.append(node)
+
+    return path
+
+
+def pprint_path(path, layout):
     """
     Neatly prints the given path, by calling the .to_cli function on each node of the path
     :param path: given path, which is a list of nodes
     :type path: list
+    :param layout: static layout of the field
+    :type layout: Layout
     :return: None
     """
     for node in path:
         print("#" * 120)
         print(f"Movement: {node.movement}")
-        node.to_cli()
+        node.to_cli(layout)
 
 
 def manhattan_distance(point_1, point_2):
@@ -414,22 +499,78 @@ def get_closest_plate(point, plates_locs):
     return closets_plate_loc, closest_plate_distance
 
 
-def get_duplicate(nodes_list, target_node):
+def parse_memory_budget(memory_budget):
     """
-    checks to see if equivalent of target_node is found in given nodes_list
-    Equality between two node is defined by __eq__ function, where it compares
-     objects list and robot location of two nodes.
-    :param nodes_list:
-    :type nodes_list: list
-    :param target_node:
-    :type target_node: Node
-    :return: True if equivalent of target_node is found in nodes_list, False otherwise
+    :param memory_budget: number of nodes (an int, or a string of digits), a string of bytes with a unit
+     (such as "512MB" or "2GB"), or None for no budget
+    :return: the budget in number of nodes (None for no budget)
+    :rtype: int
     """
-    for node in nodes_list:
-        if node == target_node:
-            return node
+    if memory_budget is None or isinstance(memory_budget, int):
+        return memory_budget
+
+    if memory_budget.strip().isdigit():
+        return int(memory_budget)
+
+    return parse_size(memory_budget) // NODE_BYTES
+
 
-    return None
+def parse_size(size):
+    """
+    :param size: number of bytes (an int, or a string of digits), or a string of bytes with a unit (such as "64MB")
+    :return: the size in bytes
+    :rtype: int
+    """
+    if isinstance(size, int):
+        return size
+
+    size = size.strip().upper()
+    if size.isdigit():
+        return int(size)
+
+    for unit in ("KB", "MB", "GB", "B"):
+        if size.endswith(unit) and size[:-len(unit)].strip().isdigit():
+            return int(size[:-len(unit)]) * MEMORY_UNITS[unit]
+
+    raise ValueError(f"invalid size: {size}")
+
+
+class WorkerError(Exception):
+    def __init__(self, message):
+        """
+        Raised when a worker process of a search fails, or exits before sending its result.
+        :param message: what happened to the worker (with the repr of its exception, if it raised one)
+        """
+        super().__init__(message)
+        self.message = message
+
+
+def get_worker_message(messages, processes):
+    """
+    Waits for the next message of the worker processes of a search, and checks every WORKER_CHECK_INTERVAL seconds
+    that they are still alive, so a dead worker fails the search instead of making it wait forever.
+    A worker sends a WorkerError instead of its result when it raises an exception, so a worker that exits with
+    code 0 has sent all of its messages (and may have finished before the others), and only one that is killed (or
+    exits with an error) is dead.
+    :param messages: queue that the workers put their messages into
+    :type messages: multiprocessing.Queue
+    :param processes: the worker processes
+    :type processes: list
+    :return: the message
+    :raises WorkerError: if a worker sent one, or died
+    """
+    while True:
+        try:
+            message = messages.get(timeout=WORKER_CHECK_INTERVAL)
+        except Empty:
+            for process in processes:
+                if process.exitcode not in (None, 0):
+                    raise WorkerError(f"worker process {process.pid} exited with code {process.exitcode}")
+            continue
+
+        if isinstance(message, WorkerError):
+            raise message
+        return message
 
 
 def write_output(file_path, path_movement, depth):
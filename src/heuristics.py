@@ -0,0 +1,240 @@
+import sys
+from collections import deque
+from heapq import heappush, heappop
+
+from helper import read_input, get_successors, is_in_goal
+from state import Layout, MOVEMENTS
+
+INFINITY = float("inf")
+
+
+def get_push_distances(layout, plate):
+    """
+    Calculates the cheapest cost of pushing a butter from every cell to the given plate (Dijkstra, backward from
+    the plate), where pushing a butter out of a cell costs as much as the cell, since the robot moves into it.
+
+    Other butters and the walking of the robot are ignored, so the distances are lower bounds. A butter stops on
+    the first plate that it is pushed onto, so the paths do not go through other plates.
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param plate: cell index of the plate
+    :type plate: int
+    :return: list of push distances of all cells (INFINITY if the plate is not reachable from the cell)
+    :rtype: list
+    """
+    distances = [INFINITY] * layout.num_cells
+    distances[plate] = 0
+
+    frontier = [(0, plate)]
+    while frontier:
+        distance, cell = heappop(frontier)
+        if distance > distances[cell]:
+            continue
+        if cell != plate and cell in layout.plates:
+            continue
+
+        for movement in MOVEMENTS:
+            # the butter comes to cell from its neighbor, pushed by the robot standing beyond it
+            butter_cell = layout.neighbors[movement][cell]
+            robot_cell = layout.beyond[movement][cell]
+            if butter_cell < 0 or robot_cell < 0 or butter_cell in layout.plates:
+                continue
+
+            new_distance = distance + layout.costs[butter_cell]
+            if new_distance < distances[butter_cell]:
+                distances[butter_cell] = new_distance
+                heappush(frontier, (new_distance, butter_cell))
+
+    return distances
+
+
+def min_cost_assignment(cost_matrix):
+    """
+    Hungarian algorithm: assigns each row to a different column, so that the sum of the costs is minimum.
+    :param cost_matrix: n x m matrix of costs, where n <= m
+    :type cost_matrix: list
+    :return: the minimum sum of costs
+    :rtype: int
+    """
+    num_rows = len(cost_matrix)
+    if num_rows == 0:
+        return 0
+    num_cols = len(cost_matrix[0])
+
+    # potentials of rows (u) and columns (v), with 1-based indexes, and the row matched to each column (p)
+    u = [0] * (num_rows + 1)
+    v = [0] * (num_cols + 1)
+    p = [0] * (num_cols + 1)
+    way = [0] * (num_cols + 1)
+
+    for i in range(1, num_rows + 1):
+        p[0] = i
+        j0 = 0
+        min_v = [INFINITY] * (num_cols + 1)
+        used = [False] * (num_cols + 1)
+        while True:
+            used[j0] = True
+            i0, delta, j1 = p[j0], INFINITY, 0
+            for j in range(1, num_cols + 1):
+                if not used[j]:
+                    cur = cost_matrix[i0 - 1][j - 1] - u[i0] - v[j]
+                    if cur < min_v[j]:
+                        min_v[j], way[j] = cur, j0
+                    if min_v[j] < delta:
+                        delta, j1 = min_v[j], j
+            for j in range(num_cols + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_v[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    return sum(cost_matrix[p[j] - 1][j - 1] for j in range(1, num_cols + 1) if p[j])
+
+
+def get_push_distance_heuristic(layout, robot_term=True):
+    """
+    Builds an admissible (and consistent) state heuristic: the minimum cost matching of the butters that are
+    not on a plate to the free plates, where the cost of a butter-plate pair is their push distance.
+
+    With robot_term, the number of steps that the robot needs to get next to a butter is added, which are
+    walking steps and not pushes, so they are not counted in the push distances. It must be False in push mode,
+    where the robot cell is normalized.
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param robot_term: whether to add the distance of the robot to the closest butter
+    :type robot_term: bool
+    :return: Function that returns the heuristic value of a state (INFINITY if the goal is not reachable).
+    """
+    plates = sorted(layout.plates)
+    push_distances = layout.tables.get("push_distances")
+    if push_distances is None:
+        push_distances = {plate: get_push_distances(layout, plate) for plate in plates}
+        layout.tables["push_distances"] = push_distances
+    num_cols = layout.num_cols
+
+    # a big finite cost for the matching, so that a pair that can not be matched is still comparable
+    unreachable = 1 + sum(cost for cost in layout.costs if cost is not None) * max(len(plates), 1)
+
+    def heuristic(state):
+        butters = [butter for butter in state.butters if butter not in layout.plates]
+        if not butters:
+            return 0
+
+        free_plates = [plate for plate in plates if plate not in state.butters]
+        if len(butters) > len(free_plates):
+            return INFINITY
+
+        cost_matrix = []
+        for butter in butters:
+            row = [push_distances[plate][butter] for plate in free_plates]
+            if min(row) == INFINITY:
+                return INFINITY
+            cost_matrix.append([unreachable if cost == INFINITY else cost for cost in row])
+
+        h = min_cost_assignment(cost_matrix)
+        if h >= unreachable:
+            return INFINITY
+
+        if robot_term:
+            robot_x, robot_y = divmod(state.robot, num_cols)
+            h += min(abs(robot_x - butter_x) + abs(robot_y - butter_y)
+                     for butter_x, butter_y in (divmod(butter, num_cols) for butter in butters)) - 1
+
+        return h
+
+    return heuristic
+
+
+def get_true_costs(layout, state, max_states=200000):
+    """
+    Calculates the exact cost to the goal of every state that is reachable from the given state, by enumerating
+    all of them, and running Dijkstra backward from the goal states.
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: starting state
+    :type state: State
+    :param max_states: maximum number of states to enumerate
+    :type max_states: int
+    :return: dictionary of state to its cost to the goal (states that can not reach the goal are missing),
+     or None if there are more than max_states reachable states
+    :rtype: dict
+    """
+    predecessors = {state: []}
+    queue = deque([state])
+    while queue:
+        cur_state = queue.popleft()
+        for _, new_state, cost in get_successors(layout, cur_state):
+            if new_state not in predecessors:
+                if len(predecessors) >= max_states:
+                    return None
+                predecessors[new_state] = []
+                queue.append(new_state)
+            predecessors[new_state].append((cur_state, cost))
+
+    true_costs = {}
+    frontier = [(0, i, goal_state) for i, goal_state in enumerate(predecessors) if is_in_goal(layout, goal_state)]
+    order = len(frontier)
+    while frontier:
+        cost, _, cur_state = heappop(frontier)
+        if cur_state in true_costs:
+            continue
+        true_costs[cur_state] = cost
+
+        for prev_state, step_cost in predecessors[cur_state]:
+            if prev_state not in true_costs:
+                order += 1
+                heappush(frontier, (cost + step_cost, order, prev_state))
+
+    return true_costs
+
+
+def check_admissibility(layout, state, heuristic, max_states=200000):
+    """
+    Checks the heuristic against the exact cost to the goal of every state that is reachable from the given state.
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: starting state
+    :type state: State
+    :param heuristic: function that returns the heuristic value of a state
+    :type heuristic: function
+    :param max_states: maximum number of states to enumerate
+    :type max_states: int
+    :return: tuple of the number of checked states and the list of (state, heuristic value, true cost) of the
+     states where the heuristic overestimates, or None if there are more than max_states reachable states
+    :rtype: tuple
+    """
+    true_costs = get_true_costs(layout, state, max_states)
+    if true_costs is None:
+        return None
+
+    violations = [(cur_state, heuristic(cur_state), cost) for cur_state, cost in true_costs.items()
+                  if heuristic(cur_state) > cost]
+    return len(true_costs), violations
+
+
+def main(test_case_path, max_states=200000):
+    costs, objects, robot_loc, _ = read_input(test_case_path)
+    layout = Layout(costs, objects)
+    state = layout.make_state(objects, robot_loc)
+
+    result = check_admissibility(layout, state, get_push_distance_heuristic(layout), int(max_states))
+    if result is None:
+        print(f"More than {max_states} reachable states, can't check")
+        return
+
+    num_states, violations = result
+    print(f"Checked States: {num_states}, Overestimated States: {len(violations)}")
+    for violating_state, h, cost in violations[:10]:
+        print(f"{violating_state}: heuristic {h}, true cost {cost}")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,136 @@
+import cProfile
+import io
+import pstats
+
+EVENTS = ("on_expand", "on_generate", "on_prune", "on_duplicate", "on_goal")
+
+
+class SearchHooks:
+    __slots__ = EVENTS
+
+    def __init__(self, *hooks, **callbacks):
+        """
+        Callbacks that the searches call on their events, to profile or trace them without changing their code:
+         - on_expand(node): node is about to be expanded
+         - on_generate(parent, child): child is generated from parent
+         - on_prune(node): node is cut off by a bound (the depth limit of IDS, the f threshold or max depth of IDA*),
+           A* and BBFS only drop duplicates
+         - on_duplicate(node): node is dropped, since its state was already reached (as cheap) before
+         - on_goal(node): node is the last node of the found path
+
+        An event is None until a callback is registered for it, and the search loops only check that before calling
+        it, so an event without callbacks (or a search without hooks) costs no function call.
+
+        :param hooks: objects whose on_* methods are registered for their events (such as ProfileHook)
+        :param callbacks: callbacks by event name
+        """
+        for event in EVENTS:
+            setattr(self, event, None)
+
+        for hook in hooks:
+            self.register_hook(hook)
+        for event, callback in callbacks.items():
+            self.register(event, callback)
+
+    def register(self, event, callback):
+        """
+        Registers a callback for an event, after the callbacks that are already registered for it.
+        :param event: one of EVENTS
+        :type event: str
+        :param callback: function that is called with the arguments of the event
+        :type callback: function
+        """
+        if event not in EVENTS:
+            raise ValueError(f"unknown search event: {event}")
+
+        registered = getattr(self, event)
+        if registered is None:
+            setattr(self, event, callback)
+            return
+
+        def callbacks(*args):
+            registered(*args)
+            callback(*args)
+
+        setattr(self, event, callbacks)
+
+    def register_hook(self, hook):
+        """
+        Registers the methods of the given object that are named after events.
+        """
+        for event in EVENTS:
+            callback = getattr(hook, event, None)
+            if callback is not None:
+                self.register(event, callback)
+
+
+# hooks of a search without hooks, it must not be registered to
+NO_HOOKS = SearchHooks()
+
+
+class ProfileHook:
+    def __init__(self, output_path=None, sample_every=100):
+        """
+        Sampled profiling of a single search: cProfile is only enabled for one in every sample_every expansions, from
+        that expansion to the next one, so the profile shows where the time of an expansion goes (successor
+        generation, the heuristic, the frontier) without slowing down the whole search.
+
+        Use it as a context manager around the search, so that profiling stops and the report is written even if no
+        goal is found:
+
+            with ProfileHook("a_star.prof") as hook:
+                A_Star.solve(test_case_path, 250, hooks=SearchHooks(hook))
+
+        :param output_path: path to write the pstats file to when the search ends (None to not write it)
+        :type output_path: str
+        :param sample_every: number of expansions between the sampled ones
+        :type sample_every: int
+        """
+        self.output_path = output_path
+        self.sample_every = sample_every
+        self.profile = cProfile.Profile()
+        self.num_expanded = 0
+        self.num_samples = 0
+        self.profiling = False
+
+    def on_expand(self, node):
+        self.num_expanded += 1
+        if self.profiling:
+            self.profile.disable()
+            self.profiling = False
+        elif self.num_expanded % self.sample_every == 0:
+            self.num_samples += 1
+            self.profiling = True
+            self.profile.enable()
+
+    def on_goal(self, node):
+        self.stop()
+
+    def stop(self):
+        if self.profiling:
+            self.profile.disable()
+            self.profiling = False
+
+    def report(self, sort="cumulative", limit=25):
+        """
+        :param sort: pstats sort key of the functions
+        :type sort: str
+        :param limit: maximum number of functions to list
+        :type limit: int
+        :return: text report of the profiled functions (empty if no expansion was sampled)
+        :rtype: str
+        """
+        if not self.num_samples:
+            return ""
+
+        stream = io.StringIO()
+        pstats.Stats(self.profile, stream=stream).sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        if self.output_path is not None and self.num_samples:
+            self.profile.dump_stats(self.output_path)
@@ -0,0 +1,106 @@
+from helper import perform_move
+from node import Node
+
+
+class MovePath:
+    __slots__ = ("layout", "root_state", "moves", "include_root", "cost")
+
+    def __init__(self, layout, root_state, movements, include_root=False):
+        """
+        Path of a solution, stored as the root state and one byte for each movement.
+
+        The nodes of the path are not kept: iterating over it rebuilds them one at a time from the root state (each
+        one without a parent), so a printed or visualized node can be freed before the next one is made, and a
+        solution of any depth only keeps its movements, instead of a node (and its parent chain) for every step.
+        It can still be used as the list of nodes that the solve functions returned before: len, iteration and
+        indexing (which replays the movements up to the index) work the same way.
+
+        :param layout: static layout of the field
+        :type layout: Layout
+        :param root_state: state the path starts from (not normalized in push mode)
+        :type root_state: State
+        :param movements: single movements of the path ("u", "r", "d" or "l"), as a list or a string
+        :type movements: list
+        :param include_root: whether the path starts with the root node, whose movement is "" (as in the paths of
+         A*, IDA* and ARA*)
+        :type include_root: bool
+        """
+        self.layout = layout
+        self.root_state = root_state
+        self.moves = "".join(movements).encode("ascii")
+        self.include_root = include_root
+
+        cost, state = 0, root_state
+        for movement in self.movements:
+            state = perform_move(layout, state, movement)
+            cost += layout.costs[state.robot]
+        self.cost = cost
+
+    @classmethod
+    def from_node(cls, layout, root_state, node, include_root=True):
+        """
+        :param node: last node of a path of single movements, which is followed up to the root through its parents
+        :type node: Node
+        :return: the path from the root to node
+        :rtype: MovePath
+        """
+        movements = []
+        while node.parent != "":
+            movements.append(node.movement)
+            node = node.parent
+        movements.reverse()
+        return cls(layout, root_state, movements, include_root)
+
+    @property
+    def movements(self):
+        """
+        :return: list of the movements of the path (without the "" of the root node)
+        :rtype: list
+        """
+        return list(self.moves.decode("ascii"))
+
+    def states(self):
+        """
+        :return: generator of the states of the path, starting with the root state
+        """
+        layout, state = self.layout, self.root_state
+        yield state
+        for movement in self.moves.decode("ascii"):
+            state = perform_move(layout, state, movement)
+            yield state
+
+    def __iter__(self):
+        """
+        :return: generator of the nodes of the path, with their depth, movement and g cost
+        """
+        costs = self.layout.costs
+        states = self.states()
+        cost_g = 0
+        if self.include_root:
+            yield Node(next(states), 0, "", "", 0)
+        else:
+            next(states)
+
+        for depth, (movement, state) in enumerate(zip(self.moves.decode("ascii"), states), 1):
+            cost_g += costs[state.robot]
+            yield Node(state, depth, movement, "", cost_g)
+
+    def __len__(self):
+        return len(self.moves) + self.include_root
+
+    def __getitem__(self, index):
+        """
+        :param index: index of a node, negative indexes count from the end
+        :type index: int
+        :return: the node at index, rebuilt by replaying the movements up to it
+        :rtype: Node
+        """
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("path index out of range")
+
+        for i, node in enumerate(self):
+            if i == index:
+                return node
@@ -1,18 +1,21 @@
-from copy import deepcopy
-
 import TableIt
 
 
 class Node:
-    def __init__(self, objects, robot_loc, depth, movement, parent, cost_g=None, cost_f=None):
+    img = {
+        "b": "butter",
+        "bp": "butter",
+        "p": "plate2",
+        "": None,
+        "x": "obstacle1"
+    }
+
+    def __init__(self, state, depth, movement, parent, cost_g=None, cost_f=None):
         """
         Basic Node class, representing each item of our search.
 
-        :param objects: A 2d list of lists, containing a string for each cell of the field,
-         where the string has all the objects in it
-        :type objects: list
-        :param robot_loc: robot location
-        :type robot_loc: tuple
+        :param state: robot and butters of the field, the rest of the field is kept in a shared Layout
+        :type state: State
         :param depth: depth of this node in the search tree
         :type depth: int
         :param movement: the move that is to be made
@@ -22,53 +25,51 @@ class Node:
         :param cost_f: f cost
         :type cost_f: int
         """
-        self.objects = objects
-        self.robot_loc = robot_loc
+        self.state = state
         self.depth = depth
         self.movement = movement
         self.parent = parent
         self.cost_g = cost_g
         self.cost_f = cost_f
 
-        self.img = {
-            "b": "butter",
-            "bp": "butter",
-            "p": "plate2",
-            "": None,
-            "x": "obstacle1"
-        }
-
     def __eq__(self, other):
         """
         To implement 'in' operator
-        We name two nodes equal, if the both have the same objects list and robot location
+        We name two nodes equal, if the both have the same state (objects and robot location)
         """
         if isinstance(other, Node):
-            return self.objects == other.objects and self.robot_loc == other.robot_loc
+            return self.state == other.state
+
+    def __hash__(self):
+        return hash(self.state)
 
-    def to_cli(self):
+    def to_cli(self, layout):
         """
         Neatly prints objects list and robot location of node to console
+        :param layout: static layout of the field
+        :type layout: Layout
         :return: None
         """
-        objects_cpy = deepcopy(self.objects)
+        objects = layout.to_objects(self.state)
 
-        robot_x, robot_y = self.robot_loc
-        objects_cpy[robot_x][robot_y] = "r" + objects_cpy[robot_x][robot_y]
+        robot_x, robot_y = layout.loc(self.state.robot)
+        objects[robot_x][robot_y] = "r" + objects[robot_x][robot_y]
 
-        TableIt.printTable(objects_cpy)
+        TableIt.printTable(objects)
 
-    def to_gui(self, field):
+    def to_gui(self, field, layout):
         """
         places objects list and robot location of node in the given field GUI object
         :param field: GUI object to place the cells on
         :type field: game2dboard.Board
+        :param layout: static layout of the field
+        :type layout: Layout
         :return: None
         """
-        objects, robot_loc = self.objects, self.robot_loc
+        objects = layout.to_objects(self.state)
 
-        num_rows, num_cols = len(objects), len(objects[0])
-        robot_x, robot_y = robot_loc
+        num_rows, num_cols = layout.num_rows, layout.num_cols
+        robot_x, robot_y = layout.loc(self.state.robot)
 
         for i in range(num_rows):
             for j in range(num_cols):
@@ -0,0 +1,257 @@
+import argparse
+import hashlib
+import mmap
+import struct
+import sys
+from array import array
+from heapq import heappush, heappop
+from itertools import combinations
+from math import comb
+from time import perf_counter
+
+from helper import read_input, get_valid_backward_movements, perform_backward_move
+from heuristics import check_admissibility
+from state import Layout
+
+INFINITY = float("inf")
+
+MAGIC = b"BUTRPDB1"
+MODES = ("step", "push")
+# magic, layout digest, byte order, mode, pattern size, number of rows and columns, number of entries,
+# padded to 64 bytes, so the table that follows it is aligned
+HEADER = struct.Struct("<8s32scBBHHI13x")
+UNREACHABLE = 0xFFFFFFFF
+
+
+def get_layout_digest(layout):
+    """
+    :return: digest of the parts of the layout that the costs of a pattern database depend on
+     (the size of the board, the costs of the cells, the obstacles and the plates)
+    :rtype: bytes
+    """
+    description = repr((layout.num_rows, layout.num_cols, layout.costs, sorted(layout.obstacles),
+                        sorted(layout.plates)))
+    return hashlib.sha256(description.encode()).digest()
+
+
+def get_binomials(num_cells, pattern_size):
+    """
+    Binomial coefficients of the combinatorial number system: the rank of a sorted tuple of pattern_size cells is
+    the sum of binomials[i][cell_i], and the ranks of all the tuples are exactly 0 .. C(num_cells, pattern_size) - 1.
+    :rtype: tuple
+    """
+    return tuple(tuple(comb(cell, i + 1) for cell in range(num_cells)) for i in range(pattern_size))
+
+
+def build_pattern_db(layout, pattern_size, mode="step"):
+    """
+    Calculates the exact cost to the goal of every abstract state, where only pattern_size butters are on the board
+    (the other butters are removed), by running Dijkstra backward from the abstract goals with perform_backward_move.
+
+    Removing butters can only remove obstacles, so a path of the full board is also a path of the abstract board,
+    with the same cost, and the cost of any pattern_size butters of a state is a lower bound of its real cost.
+    The abstract goals are all the states with every butter on a plate, and the robot on any free cell.
+
+    In step mode, a movement costs the cell that the robot moves into. In push mode, only pushes cost (the cell that
+    the butter is pushed out of, which is also the cell that the robot moves into), and walking is free.
+
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param pattern_size: number of butters of the abstract states
+    :type pattern_size: int
+    :param mode: "step" for single movements, or "push" for pushes
+    :type mode: str
+    :return: table of the costs, indexed by rank of the butters * num_cells + robot cell (UNREACHABLE for the states
+     that can not reach the goal, or are not valid)
+    :rtype: array
+    """
+    num_cells = layout.num_cells
+    binomials = get_binomials(num_cells, pattern_size)
+    table = array("I", [UNREACHABLE]) * (comb(num_cells, pattern_size) * num_cells)
+
+    def get_index(state):
+        return sum(binomials[i][butter] for i, butter in enumerate(state.butters)) * num_cells + state.robot
+
+    frontier = []
+    free_cells = [cell for cell in range(num_cells) if cell not in layout.obstacles]
+    for plates in combinations(sorted(layout.plates), pattern_size):
+        for robot in free_cells:
+            if robot not in plates:
+                state = layout.make_state_from_cells(robot, plates)
+                table[get_index(state)] = 0
+                frontier.append((0, get_index(state), state))
+
+    while frontier:
+        cost, index, state = heappop(frontier)
+        if cost > table[index]:
+            continue
+
+        # the robot moved into its current cell, pushing or not
+        step_cost = layout.costs[state.robot]
+        for movement in get_valid_backward_movements(layout, state):
+            for prev_state in perform_backward_move(layout, state, movement):
+                if mode == "push" and prev_state.butters == state.butters:
+                    new_cost = cost
+                else:
+                    new_cost = cost + step_cost
+
+                prev_index = get_index(prev_state)
+                if new_cost < table[prev_index]:
+                    table[prev_index] = new_cost
+                    heappush(frontier, (new_cost, prev_index, prev_state))
+
+    return table
+
+
+def write_pattern_db(path, layout, pattern_size, mode, table):
+    """
+    Writes a pattern database file: a fixed size header, and the table as it is in memory, so it can be
+    memory mapped and used without a parse step.
+    :return: number of bytes written
+    :rtype: int
+    """
+    header = HEADER.pack(MAGIC, get_layout_digest(layout), b"<" if sys.byteorder == "little" else b">",
+                         MODES.index(mode), pattern_size, layout.num_rows, layout.num_cols, len(table))
+    with open(path, "wb") as file:
+        file.write(header)
+        table.tofile(file)
+        return file.tell()
+
+
+class PatternDatabase:
+    def __init__(self, path, layout, mode="step"):
+        """
+        A pattern database file, memory mapped, with the costs read straight from the mapped table.
+        Only the pages of the table that are looked up are read from disk, and all the processes that open the
+        same file share them.
+
+        :param path: path of a file written by write_pattern_db
+        :type path: str
+        :param layout: static layout of the field, which must be the one the database was built for
+        :type layout: Layout
+        :param mode: "step" for single movements, or "push" for pushes, which must be the mode of the database
+        :type mode: str
+        """
+        with open(path, "rb") as file:
+            self.mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.mm) < HEADER.size:
+            raise ValueError(f"{path} is not a pattern database")
+        magic, digest, byte_order, mode_index, self.pattern_size, num_rows, num_cols, num_entries = \
+            HEADER.unpack_from(self.mm)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a pattern database")
+        if digest != get_layout_digest(layout):
+            raise ValueError(f"{path} was built for another layout")
+        if MODES[mode_index] != mode:
+            raise ValueError(f"{path} was built for {MODES[mode_index]} mode, not {mode} mode")
+        if byte_order != (b"<" if sys.byteorder == "little" else b">"):
+            raise ValueError(f"{path} was built on a machine with another byte order")
+        if len(self.mm) != HEADER.size + num_entries * 4:
+            raise ValueError(f"{path} is truncated")
+
+        self.num_cells = layout.num_cells
+        self.binomials = get_binomials(self.num_cells, self.pattern_size)
+        self.table = memoryview(self.mm)[HEADER.size:].cast("I")
+
+    def lookup(self, robot, butters):
+        """
+        :param robot: cell index of the robot
+        :type robot: int
+        :param butters: sorted tuple of pattern_size butter cells
+        :type butters: tuple
+        :return: exact cost to the goal of the abstract state (INFINITY if it can not reach the goal)
+        """
+        binomials = self.binomials
+        cost = self.table[sum(binomials[i][butter] for i, butter in enumerate(butters)) * self.num_cells + robot]
+        return INFINITY if cost == UNREACHABLE else cost
+
+    def close(self):
+        self.table.release()
+        self.mm.close()
+
+
+def get_pattern_db_heuristic(layout, path, mode="step"):
+    """
+    Builds an admissible (and consistent) state heuristic from a pattern database file: the highest cost of any
+    pattern_size butters of the state (with the same robot cell), each looked up in constant time.
+    In push mode, walking is free, so the cost of the normalized robot cell is the cost of its whole region.
+
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param path: path of the pattern database file
+    :type path: str
+    :param mode: "step" for single movements, or "push" for pushes
+    :type mode: str
+    :return: Function that returns the heuristic value of a state (INFINITY if the goal is not reachable).
+    """
+    pattern_db = PatternDatabase(path, layout, mode)
+    table, binomials, num_cells, pattern_size = (pattern_db.table, pattern_db.binomials, pattern_db.num_cells,
+                                                 pattern_db.pattern_size)
+
+    def heuristic(state):
+        h = 0
+        for butters in combinations(state.butters, pattern_size):
+            cost = table[sum(binomials[i][butter] for i, butter in enumerate(butters)) * num_cells + state.robot]
+            if cost == UNREACHABLE:
+                return INFINITY
+            if cost > h:
+                h = cost
+
+        return h
+
+    # keeps the database mapped as long as the heuristic is used
+    heuristic.pattern_db = pattern_db
+    return heuristic
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pattern databases of a board layout, for the A* and IDA* "
+                                                 "heuristic pdb:PATH.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="build the pattern database of the layout of a board")
+    build_parser.add_argument("board", help="input file, only its layout (costs, obstacles and plates) is used")
+    build_parser.add_argument("output", help="pattern database file")
+    build_parser.add_argument("-k", "--pattern-size", type=int, default=2,
+                              help="butters of each pattern (at most the number of butters of the board)")
+    build_parser.add_argument("-m", "--mode", choices=MODES, default="step")
+
+    check_parser = subparsers.add_parser("check", help="check a pattern database against the true costs of a board")
+    check_parser.add_argument("board", help="input file")
+    check_parser.add_argument("pattern_db", help="pattern database file")
+    check_parser.add_argument("-m", "--mode", choices=MODES, default="step")
+    check_parser.add_argument("--max-states", type=int, default=200000)
+    args = parser.parse_args(argv)
+
+    costs, objects, robot_loc, _ = read_input(args.board)
+    layout = Layout(costs, objects)
+    state = layout.make_state(objects, robot_loc)
+
+    if args.command == "build":
+        pattern_size = min(args.pattern_size, len(state.butters), len(layout.plates))
+        start_time = perf_counter()
+        table = build_pattern_db(layout, pattern_size, args.mode)
+        num_bytes = write_pattern_db(args.output, layout, pattern_size, args.mode, table)
+        print(f"Pattern Size: {pattern_size}, Entries: {len(table)}, "
+              f"Reachable: {sum(cost != UNREACHABLE for cost in table)}, Bytes: {num_bytes}, "
+              f"Time: {perf_counter() - start_time:.2f}s")
+        return
+
+    heuristic = get_pattern_db_heuristic(layout, args.pattern_db, args.mode)
+    print(f"Heuristic of the Board: {heuristic(state)}")
+    if args.mode == "push":
+        # the true costs are of single movements
+        return
+
+    result = check_admissibility(layout, state, heuristic, args.max_states)
+    if result is None:
+        print(f"More than {args.max_states} reachable states, can't check")
+        return
+
+    num_states, violations = result
+    print(f"Checked States: {num_states}, Overestimated States: {len(violations)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+from heapq import heappush, heappop
+
+from helper import is_move_valid, perform_move, is_backward_move_valid, perform_backward_move, \
+    get_reverse_movement
+from move_path import MovePath
+from node import Node
+from state import State, MOVEMENTS
+
+
+def is_cell_blocked(layout, state, cell):
+    """
+    checks to see if the robot can not walk into the given cell, because of an obstacle or a butter
+    :type layout: Layout
+    :type state: State
+    :type cell: int
+    :rtype: bool
+    """
+    return cell < 0 or cell in layout.obstacles or cell in state.butters
+
+
+def get_reachable_cells(layout, state):
+    """
+    Flood fills the cells that the robot can walk to, without pushing any butter.
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: current state of the field
+    :type state: State
+    :return: set of reachable cell indexes (including the robot cell)
+    :rtype: set
+    """
+    butters = state.butters
+    neighbor_tables = layout.neighbors.values()
+
+    reachable = {state.robot}
+    stack = [state.robot]
+    while stack:
+        cell = stack.pop()
+        for neighbors in neighbor_tables:
+            neighbor_cell = neighbors[cell]
+            if neighbor_cell >= 0 and neighbor_cell not in reachable and neighbor_cell not in butters:
+                reachable.add(neighbor_cell)
+                stack.append(neighbor_cell)
+
+    return reachable
+
+
+def move_robot(layout, state, cell):
+    """
+    :return: the given state, where the robot is in the given cell instead
+    :rtype: State
+    """
+    return State(cell, state.butters, state.key ^ layout.robot_keys[state.robot] ^ layout.robot_keys[cell])
+
+
+def normalize_state(layout, state, reachable=None):
+    """
+    Replaces the robot cell of the given state with the canonical (smallest) cell of its reachable region,
+    so that all states which only differ in where the robot is standing in the same region become equal.
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: state to be normalized
+    :type state: State
+    :param reachable: reachable cells of the robot, if they are already calculated
+    :type reachable: set
+    :rtype: State
+    """
+    if reachable is None:
+        reachable = get_reachable_cells(layout, state)
+
+    return move_robot(layout, state, min(reachable))
+
+
+def get_push_successors(layout, state):
+    """
+    Generates all the (normalized) states that are reachable from the given state by walking to a butter,
+    and pushing it once.
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: current (normalized) state of the field
+    :type state: State
+    :return: list of (push, new state, cost of the push) tuples, where push is a (robot cell, movement) tuple,
+     and the cost of the push is the cost of the cell that the butter is pushed out of (walking is not counted)
+    :rtype: list
+    """
+    reachable = get_reachable_cells(layout, state)
+
+    successors = []
+    for butter in state.butters:
+        if butter in layout.plates:
+            continue
+
+        for movement in MOVEMENTS:
+            robot_cell = layout.neighbor(butter, get_reverse_movement(movement))
+            if robot_cell not in reachable:
+                continue
+
+            pushing_state = move_robot(layout, state, robot_cell)
+            if not is_move_valid(layout, pushing_state, movement):
+                continue
+
+            new_state = normalize_state(layout, perform_move(layout, pushing_state, movement))
+            successors.append(((robot_cell, movement), new_state, layout.costs[butter]))
+
+    return successors
+
+
+def get_backward_push_successors(layout, state):
+    """
+    Generates all the (normalized) states that the given state is reachable from with one push,
+    by walking to a butter and pulling it once.
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: current (normalized) state of the field
+    :type state: State
+    :return: list of (push, previous state) tuples, where push is the (robot cell, movement) push that
+     leads from the previous state to the given state
+    :rtype: list
+    """
+    reachable = get_reachable_cells(layout, state)
+
+    predecessors = []
+    for butter in state.butters:
+        for movement in MOVEMENTS:
+            robot_cell = layout.neighbor(butter, movement)
+            if robot_cell not in reachable:
+                continue
+
+            pulling_state = move_robot(layout, state, robot_cell)
+            if not is_backward_move_valid(layout, pulling_state, movement):
+                continue
+
+            new_states_ls = perform_backward_move(layout, pulling_state, movement)
+            if len(new_states_ls) < 2:
+                continue
+
+            pulled_state = new_states_ls[1]
+            push = (pulled_state.robot, get_reverse_movement(movement))
+            predecessors.append((push, normalize_state(layout, pulled_state)))
+
+    return predecessors
+
+
+def get_push_goal_states(layout, state):
+    """
+    calculates ALL possible (normalized) goal states: every plate has a butter on it, and
+    the robot is in any of the regions of the field
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: initial state of the field
+    :type state: State
+    :return: list of goal states
+    :rtype: list
+    """
+    goal_butters = tuple(sorted(layout.plates))
+
+    goal_states = []
+    visited = set()
+    for cell in range(layout.num_cells):
+        goal_state = layout.make_state_from_cells(cell, goal_butters)
+        if cell in visited or is_cell_blocked(layout, goal_state, cell):
+            continue
+
+        reachable = get_reachable_cells(layout, goal_state)
+        visited |= reachable
+        goal_states.append(normalize_state(layout, goal_state, reachable))
+
+    return goal_states
+
+
+def get_push_goal_states_nodes(layout, state):
+    """
+    converts push goal states to node objects, and returns them
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: initial state of the field
+    :type state: State
+    :return: list of goal nodes
+    :rtype: list
+    """
+    return [Node(goal_state, 0, "", "") for goal_state in get_push_goal_states(layout, state)]
+
+
+def get_walking_movements(layout, state, target_cell):
+    """
+    Finds the cheapest way for the robot to walk to target_cell without pushing any butter (Dijkstra).
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: current state of the field
+    :type state: State
+    :param target_cell: cell index that the robot should reach
+    :type target_cell: int
+    :return: list of movements, or None if target_cell is not reachable
+    :rtype: list
+    """
+    parents = {state.robot: None}
+    best_cost = {state.robot: 0}
+    frontier = [(0, state.robot)]
+    while frontier:
+        cost, cell = heappop(frontier)
+        if cell == target_cell:
+            break
+        if cost > best_cost[cell]:
+            continue
+
+        for movement in MOVEMENTS:
+            neighbor_cell = layout.neighbor(cell, movement)
+            if is_cell_blocked(layout, state, neighbor_cell):
+                continue
+
+            new_cost = cost + layout.costs[neighbor_cell]
+            if neighbor_cell not in best_cost or new_cost < best_cost[neighbor_cell]:
+                best_cost[neighbor_cell] = new_cost
+                parents[neighbor_cell] = (cell, movement)
+                heappush(frontier, (new_cost, neighbor_cell))
+
+    if target_cell not in parents:
+        return None
+
+    movements = []
+    cell = target_cell
+    while parents[cell] is not None:
+        cell, movement = parents[cell]
+        movements.append(movement)
+
+    movements.reverse()
+    return movements
+
+
+def expand_pushes(layout, state, pushes):
+    """
+    Rebuilds the full list of robot movements of the given pushes, by adding the cheapest
+    walk to the robot cell of each push before it.
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: starting state (NOT normalized, the robot is where it really is)
+    :type state: State
+    :param pushes: list of (robot cell, movement) pushes
+    :type pushes: list
+    :return: list of movements
+    :rtype: list
+    """
+    movements = []
+    for robot_cell, push_movement in pushes:
+        walking_movements = get_walking_movements(layout, state, robot_cell)
+        movements += walking_movements + [push_movement]
+
+        state = move_robot(layout, state, robot_cell)
+        state = perform_move(layout, state, push_movement)
+
+    return movements
+
+
+def get_push_path(layout, state, push_path):
+    """
+    Converts a path of push nodes to a path of single movements.
+    :param layout: static layout of the field
+    :type layout: Layout
+    :param state: starting state (NOT normalized, the robot is where it really is)
+    :type state: State
+    :param push_path: list of nodes, where the movement of each node is a push
+    :type push_path: list
+    :return: the path after the starting state
+    :rtype: MovePath
+    """
+    pushes = [node.movement for node in push_path]
+    return MovePath(layout, state, expand_pushes(layout, state, pushes))
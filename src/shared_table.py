@@ -0,0 +1,125 @@
+import struct
+from multiprocessing import shared_memory
+
+from state import State
+
+EMPTY, WRITTEN = 0, 1
+
+
+class SharedStateTable:
+    def __init__(self, num_butters, capacity, name=None):
+        """
+        Hash table of states in shared memory, written by one process and probed by others.
+
+        Each slot holds a flag, the movement and the push cell that lead to the parent of the state, the Zobrist key,
+        the slot of the parent, the robot cell and the butter cells. Slots are found by linear probing from
+        key % capacity, and states with equal keys are told apart by comparing their cells.
+        The flag of a slot is written last, so a reader never sees a half written state as written.
+
+        :param num_butters: number of butters of the board (every state has the same number of butters)
+        :type num_butters: int
+        :param capacity: number of slots
+        :type capacity: int
+        :param name: name of an existing table to attach to, or None to create a new one
+        :type name: str
+        """
+        self.record = struct.Struct(f"<BBQiii{num_butters}i")
+        self.capacity = capacity
+        self.size = 0
+
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=self.record.size * capacity)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.buf = self.shm.buf
+
+    def find(self, state):
+        """
+        :param state: state to look for
+        :type state: State
+        :return: slot of the state, or -1 if it is not in the table
+        :rtype: int
+        """
+        record_size, buf = self.record.size, self.buf
+        slot = state.key % self.capacity
+        while True:
+            offset = slot * record_size
+            if buf[offset] == EMPTY:
+                return -1
+
+            values = self.record.unpack_from(buf, offset)
+            if values[2] == state.key and values[5] == state.robot and values[6:] == state.butters:
+                return slot
+
+            slot = (slot + 1) % self.capacity
+
+    def insert(self, state, parent_slot, movement):
+        """
+        Writes the given (new) state to the first free slot of its probe sequence.
+        :param state: state to be written, which is not already in the table
+        :type state: State
+        :param parent_slot: slot of the parent state (-1 for a starting state)
+        :type parent_slot: int
+        :param movement: movement between the state and its parent: a movement ("" for a starting state),
+         or a (robot cell, movement) push
+        :return: slot of the state
+        :rtype: int
+        """
+        if self.size >= self.capacity * 0.9:
+            raise MemoryError(f"shared state table is full ({self.size} states)")
+
+        record_size, buf = self.record.size, self.buf
+        slot = state.key % self.capacity
+        while buf[slot * record_size] != EMPTY:
+            slot = (slot + 1) % self.capacity
+
+        if isinstance(movement, tuple):
+            push_cell, movement = movement
+        else:
+            push_cell = -1
+
+        offset = slot * record_size
+        self.record.pack_into(buf, offset, EMPTY, ord(movement) if movement else 0, state.key, parent_slot,
+                              push_cell, state.robot, *state.butters)
+        buf[offset] = WRITTEN
+        self.size += 1
+        return slot
+
+    def get(self, slot):
+        """
+        :param slot: slot of a written state
+        :type slot: int
+        :return: tuple of (state, slot of the parent, movement), where movement is as given to insert
+        :rtype: tuple
+        """
+        _, movement, key, parent_slot, push_cell, robot, *butters = self.record.unpack_from(self.buf,
+                                                                                             slot * self.record.size)
+        movement = chr(movement) if movement else ""
+        if push_cell >= 0:
+            movement = (push_cell, movement)
+
+        return State(robot, tuple(butters), key), parent_slot, movement
+
+    def get_movements(self, slot):
+        """
+        Follows the parents of the given slot up to a starting state.
+        :param slot: slot of a written state
+        :type slot: int
+        :return: list of the movements between the state and the starting state, starting from the given state
+        :rtype: list
+        """
+        movements = []
+        while slot >= 0:
+            _, slot, movement = self.get(slot)
+            if slot >= 0:
+                movements.append(movement)
+
+        return movements
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
@@ -0,0 +1,335 @@
+import hashlib
+import inspect
+import json
+import os
+import struct
+import tempfile
+
+from helper import read_input, is_move_valid, perform_move, is_in_goal
+from move_path import MovePath
+from state import get_layout, MOVEMENTS
+from stats import SearchStats
+
+MAGIC = b"SOL1"
+# magic, whether a path is found, whether the path starts with the root node, cost, pushes (-1 for none),
+# number of movements, followed by the movements, 4 to a byte
+HEADER = struct.Struct("<4sBBiiI")
+UNSOLVABLE, SOLVED = 0, 1
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# the options of the solve functions that do not change the found path (a search that runs out of its budget is
+# not cached)
+IGNORED_OPTIONS = ("timing", "hooks", "work_dir", "chunk_size", "budget", "on_solution")
+# number of writes after which a cache scans its directory again, to count the entries written by other processes
+RESCAN_EVERY = 256
+# a full cache is evicted down to this fraction of its size, so that it is not scanned again on the next write
+EVICT_TO = 0.9
+
+# caches of this process, by directory and maximum size
+_caches = {}
+
+
+def get_cache_key(test_case_path, algorithm, options):
+    """
+    Content address of a solve: the hash of the parsed board (costs, objects and robot location), the algorithm
+    and its options, so the same board in another file (or with other whitespace) has the same key.
+    :param test_case_path: path of the input file
+    :type test_case_path: str
+    :param algorithm: name of the algorithm
+    :type algorithm: str
+    :param options: options of the algorithm that the result depends on
+    :type options: dict
+    :rtype: str
+    """
+    costs, objects, robot_loc, _ = read_input(test_case_path)
+    description = json.dumps([costs, objects, list(robot_loc), algorithm, options], sort_keys=True, default=str)
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+def get_solve_options(solve, test_case_path, *args, **kwargs):
+    """
+    :return: all the options of a call of solve by name, with their defaults, so that the same options have the
+     same key whether they are given by position or by name. Numbers given as strings (by the command line mains)
+     are converted to numbers.
+    :rtype: dict
+    """
+    arguments = inspect.signature(solve).bind(test_case_path, *args, **kwargs)
+    arguments.apply_defaults()
+
+    options = {}
+    for name, value in arguments.arguments.items():
+        if name == "test_case_path" or name in IGNORED_OPTIONS:
+            continue
+        if isinstance(value, str) and value.isdigit():
+            value = int(value)
+        options[name] = value
+    return options
+
+
+def pack_movements(movements):
+    """
+    :param movements: list of movements
+    :type movements: list
+    :return: the movements with 2 bits each
+    :rtype: bytes
+    """
+    packed = bytearray((len(movements) + 3) // 4)
+    for i, movement in enumerate(movements):
+        packed[i // 4] |= MOVEMENTS.index(movement) << (2 * (i % 4))
+    return bytes(packed)
+
+
+def unpack_movements(packed, num_movements):
+    return [MOVEMENTS[(packed[i // 4] >> (2 * (i % 4))) & 3] for i in range(num_movements)]
+
+
+class SolutionCache:
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        On disk cache of solutions, shared by all the processes that use the same directory.
+
+        Every entry is a small file named after its key (see get_cache_key), with the movements of the path packed
+        in 2 bits each, so a path of a thousand movements takes 270 bytes. Only the movements are stored, and the
+        path is rebuilt from them as a MovePath, after checking that they still solve the board.
+        Reading an entry updates its modification time, and when the entries take more than max_bytes, the least
+        recently used ones are removed.
+        The total size of the entries is counted when the directory is scanned, and kept up to date by the writes of
+        this object, so the directory is only scanned again when the total goes over max_bytes, or after
+        RESCAN_EVERY writes (to count the entries that other processes wrote in the meantime).
+
+        :param cache_dir: directory of the entries, created if it does not exist
+        :type cache_dir: str
+        :param max_bytes: maximum total size of the entries
+        :type max_bytes: int
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+        # total size of the entries, None until the directory is scanned
+        self.total_bytes = None
+        self.writes_since_scan = 0
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ".sol")
+
+    def get(self, key):
+        """
+        :param key: key of the entry
+        :type key: str
+        :return: tuple of (movements, cost, pushes, whether the path starts with the root node), where movements is
+         None for an unsolvable board, or None if there is no (valid) entry with the key
+        :rtype: tuple
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        if len(data) < HEADER.size:
+            self.misses += 1
+            return None
+        magic, status, include_root, cost, pushes, num_movements = HEADER.unpack_from(data)
+        if magic != MAGIC or len(data) != HEADER.size + (num_movements + 3) // 4:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        if status == UNSOLVABLE:
+            return None, None, None, False
+
+        movements = unpack_movements(data[HEADER.size:], num_movements)
+        return movements, cost, pushes if pushes >= 0 else None, bool(include_root)
+
+    def put(self, key, movements, cost=0, pushes=None, include_root=False):
+        """
+        Writes an entry (atomically, so a reader never sees a half written one), and evicts the least recently used
+        entries if the cache is over its size.
+        :param key: key of the entry
+        :type key: str
+        :param movements: list of the movements of the path, or None for an unsolvable board
+        :type movements: list
+        :param cost: cost of the path
+        :type cost: int
+        :param pushes: number of pushes in push mode (None otherwise)
+        :type pushes: int
+        :param include_root: whether the path of the algorithm starts with the root node
+        :type include_root: bool
+        """
+        if movements is None:
+            data = HEADER.pack(MAGIC, UNSOLVABLE, 0, 0, -1, 0)
+        else:
+            data = HEADER.pack(MAGIC, SOLVED, include_root, cost, -1 if pushes is None else pushes,
+                               len(movements)) + pack_movements(movements)
+
+        path = self._entry_path(key)
+        try:
+            old_size = os.stat(path).st_size
+        except FileNotFoundError:
+            old_size = 0
+
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(file_descriptor, "wb") as file:
+            file.write(data)
+        os.replace(temp_path, path)
+        self.writes += 1
+        self.writes_since_scan += 1
+
+        if self.total_bytes is not None:
+            self.total_bytes += len(data) - old_size
+        if self.total_bytes is None or self.total_bytes > self.max_bytes or self.writes_since_scan >= RESCAN_EVERY:
+            self.evict()
+
+    def evict(self):
+        """
+        Scans the directory, and if the entries take more than max_bytes, removes the least recently used ones, until
+        they take at most EVICT_TO of it.
+        """
+        entries = []
+        total_bytes = 0
+        with os.scandir(self.cache_dir) as dir_entries:
+            for dir_entry in dir_entries:
+                if dir_entry.name.endswith(".sol"):
+                    file_stat = dir_entry.stat()
+                    entries.append((file_stat.st_mtime, dir_entry.path, file_stat.st_size))
+                    total_bytes += file_stat.st_size
+
+        self.writes_since_scan = 0
+        self.total_bytes = total_bytes
+        if total_bytes <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, path, size in entries:
+            if total_bytes <= self.max_bytes * EVICT_TO:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                # already removed by another process
+                pass
+            total_bytes -= size
+        self.total_bytes = total_bytes
+
+    def solve(self, algorithm, solve, test_case_path, *args, **kwargs):
+        """
+        Returns the cached result of solve(test_case_path, *args, **kwargs), or runs it and caches its result.
+
+        :param algorithm: name of the algorithm, which is a part of the key
+        :type algorithm: str
+        :param solve: solve function of the algorithm
+        :type solve: function
+        :param test_case_path: path of the input file
+        :type test_case_path: str
+        :return: tuple of (layout, root state, path, stats), as returned by solve. On a hit, the stats are empty,
+         except for the number of pushes. Either way, its "cache" details is "hit" or "miss".
+         The results of searches that ran out of their budget (see budget.SearchBudget) are not cached, and neither
+         are incomplete ones (such as those of parallel BBFS, when a shared table is full).
+        :rtype: tuple
+        """
+        key = get_cache_key(test_case_path, algorithm, get_solve_options(solve, test_case_path, *args, **kwargs))
+
+        entry = self.get(key)
+        if entry is not None:
+            result = self._rebuild(test_case_path, *entry)
+            if result is not None:
+                return result
+            # the entry does not solve the board, it is solved again and overwritten
+            self.hits -= 1
+            self.misses += 1
+
+        layout, root_state, found_path, stats = solve(test_case_path, *args, **kwargs)
+        stats.details["cache"] = "miss"
+        if "timeout" in stats.details or stats.details.get("budget_exhausted") or "incomplete" in stats.details:
+            return layout, root_state, found_path, stats
+        if found_path is None:
+            self.put(key, None)
+        else:
+            self.put(key, found_path.movements, found_path.cost, stats.pushes, found_path.include_root)
+
+        return layout, root_state, found_path, stats
+
+    def _rebuild(self, test_case_path, movements, cost, pushes, include_root):
+        """
+        :return: the result of solve, rebuilt from a cache entry, or None if the entry does not solve the board
+     (such as an entry of a layout that was pruned differently)
+        """
+        costs, objects, robot_loc, _ = read_input(test_case_path)
+        layout = get_layout(costs, objects)
+        root_state = layout.make_state(objects, robot_loc)
+        stats = SearchStats()
+        stats.details["cache"] = "hit"
+        stats.stop()
+
+        if movements is None:
+            return layout, root_state, None, stats
+
+        state = root_state
+        for movement in movements:
+            if not is_move_valid(layout, state, movement):
+                return None
+            state = perform_move(layout, state, movement)
+        if not is_in_goal(layout, state):
+            return None
+
+        found_path = MovePath(layout, root_state, movements, include_root)
+        if found_path.cost != cost:
+            return None
+
+        stats.pushes = pushes
+        return layout, root_state, found_path, stats
+
+    def to_dict(self):
+        """
+        :return: hit and miss counts of this cache object (each process counts its own)
+        :rtype: dict
+        """
+        return {"hits": self.hits, "misses": self.misses, "writes": self.writes, "evictions": self.evictions}
+
+
+def get_cache(cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Returns the cache of a directory, which is created once in each process, so that it keeps its total size
+    between the boards that a worker process solves, instead of scanning the directory for each one.
+    :param cache_dir: directory of the entries
+    :type cache_dir: str
+    :param max_bytes: maximum total size of the entries
+    :type max_bytes: int
+    :rtype: SolutionCache
+    """
+    key = (cache_dir, max_bytes)
+    cache = _caches.get(key)
+    if cache is None:
+        cache = _caches[key] = SolutionCache(cache_dir, max_bytes)
+    return cache
+
+
+def get_default_cache():
+    """
+    :return: the cache of the SOLUTION_CACHE_DIR environment variable (with at most SOLUTION_CACHE_BYTES), or None
+     if it is not set
+    :rtype: SolutionCache
+    """
+    cache_dir = os.environ.get("SOLUTION_CACHE_DIR")
+    if not cache_dir:
+        return None
+    return get_cache(cache_dir, int(os.environ.get("SOLUTION_CACHE_BYTES", DEFAULT_MAX_BYTES)))
+
+
+def cached_solve(algorithm, solve, test_case_path, *args, **kwargs):
+    """
+    Runs solve through the default cache (see get_default_cache), or just runs it if there is none.
+    """
+    cache = get_default_cache()
+    if cache is None:
+        return solve(test_case_path, *args, **kwargs)
+    return cache.solve(algorithm, solve, test_case_path, *args, **kwargs)
@@ -0,0 +1,451 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from urllib.parse import urlsplit, parse_qs
+
+from batch import ALGORITHMS, solve_board
+from solution_cache import DEFAULT_MAX_BYTES
+
+MAX_BOARD_BYTES = 1 << 20
+# number of the most recent requests that the latency percentiles are calculated over
+LATENCY_WINDOW = 1024
+STATUS_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable"
+}
+
+
+class ServiceError(Exception):
+    def __init__(self, status, message):
+        """
+        Error of a request, which is answered with the given HTTP status and {"error": message}.
+        :param status: HTTP status code, one of STATUS_REASONS
+        :type status: int
+        :param message: description of the error
+        :type message: str
+        """
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _warm_up():
+    """
+    runs once in every worker process when the service starts, so that the first requests do not wait for the
+    processes to start and import the solvers
+    """
+    return os.getpid()
+
+
+def normalize_board(board):
+    """
+    Checks that the given text is a board in the tab separated input format (see helper.read_input), and removes
+    the trailing whitespace of its lines (which read_input ignores), so that the same board has the same text.
+    :param board: text of the board
+    :type board: str
+    :return: the normalized text
+    :rtype: str
+    """
+    lines = board.splitlines()
+    try:
+        num_rows, num_cols = map(int, lines[0].rstrip().split("\t"))
+    except (IndexError, ValueError):
+        raise ServiceError(400, "the first line of the board must be its number of rows and columns")
+
+    if num_rows <= 0 or num_cols <= 0 or len(lines) < num_rows + 1:
+        raise ServiceError(400, f"the board must have {num_rows} rows")
+    for row in lines[1:num_rows + 1]:
+        if len(row.rstrip().split("\t")) < num_cols:
+            raise ServiceError(400, f"every row of the board must have {num_cols} cells")
+
+    return "\n".join(line.rstrip() for line in lines[:num_rows + 1]) + "\n"
+
+
+def parse_options(query, max_timeout=None):
+    """
+    :param query: query of a solve request, as returned by parse_qs, with the algorithm, mode, heuristic, max_depth,
+     timeout (seconds) and max_nodes (see batch.solve_board)
+    :type query: dict
+    :param max_timeout: timeout of the requests without one, and the highest timeout a request can have
+     (None for no limit)
+    :type max_timeout: float
+    :return: the options of batch.solve_board
+    :rtype: dict
+    """
+    def get(name, default=None):
+        values = query.get(name)
+        return values[-1] if values else default
+
+    options = {
+        "algorithm": get("algorithm", "a_star"),
+        "mode": get("mode", "step"),
+        "heuristic_name": get("heuristic", "default")
+    }
+    if options["algorithm"] not in ALGORITHMS:
+        raise ServiceError(400, f"unknown algorithm: {options['algorithm']}")
+    if options["mode"] not in ("step", "push"):
+        raise ServiceError(400, f"unknown mode: {options['mode']}")
+    if options["heuristic_name"].startswith("pdb:"):
+        # the path would be a file of the server
+        raise ServiceError(400, "pattern database heuristics are not served")
+
+    try:
+        options["max_depth"] = int(get("max_depth", 250))
+        timeout = get("timeout")
+        options["timeout"] = float(timeout) if timeout is not None else None
+        max_nodes = get("max_nodes")
+        options["max_nodes"] = int(max_nodes) if max_nodes is not None else None
+    except ValueError as e:
+        raise ServiceError(400, f"invalid number: {e}")
+
+    if max_timeout is not None and (options["timeout"] is None or options["timeout"] > max_timeout):
+        options["timeout"] = max_timeout
+    return options
+
+
+def get_request_key(board, options):
+    """
+    :return: key of a solve, the requests with the same key are merged while it runs
+    :rtype: str
+    """
+    return hashlib.sha256(json.dumps([board, options], sort_keys=True).encode()).hexdigest()
+
+
+def summarize_times(times):
+    """
+    :param times: list of durations in seconds
+    :type times: list
+    :return: count, mean, median, 90th and 99th percentiles and maximum of the durations
+    :rtype: dict
+    """
+    if not times:
+        return {"count": 0}
+
+    times = sorted(times)
+
+    def percentile(fraction):
+        return times[min(len(times) - 1, int(fraction * len(times)))]
+
+    return {
+        "count": len(times),
+        "mean": sum(times) / len(times),
+        "p50": percentile(0.5),
+        "p90": percentile(0.9),
+        "p99": percentile(0.99),
+        "max": times[-1]
+    }
+
+
+class SolveService:
+    def __init__(self, workers=None, max_queue=64, cache_dir=None, cache_bytes=DEFAULT_MAX_BYTES):
+        """
+        Solves boards in a pool of worker processes, which is started once and kept warm: each worker keeps the
+        compiled layouts of the boards it has solved (see state.get_layout), so a board with a known layout does
+        not build its tables again.
+
+        Every distinct solve waits in a queue, and a dispatcher task for each worker sends the next one to the pool
+        when the worker is free. Requests for a board and options that are already queued or running do not solve it
+        again, they wait for the same result. When max_queue solves are waiting, new ones are rejected, so a client
+        that sends more than the workers can take is told to retry instead of making the queue grow without a limit.
+
+        :param workers: number of worker processes (None for the number of CPUs)
+        :type workers: int
+        :param max_queue: maximum number of solves waiting for a worker
+        :type max_queue: int
+        :param cache_dir: directory of the solution cache of the workers (None for no cache)
+        :type cache_dir: str
+        :param cache_bytes: maximum size of the solution cache
+        :type cache_bytes: int
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.cache_dir = cache_dir
+        self.cache_bytes = cache_bytes
+
+        self.executor = None
+        self.queue = None
+        self.dispatchers = []
+        self.board_dir = None
+        # future of the result of every queued or running solve, by its key
+        self.in_flight = {}
+        self.running = 0
+
+        self.counts = {"requests": 0, "solves": 0, "coalesced": 0, "rejected": 0}
+        self.status_counts = {}
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.queue_times = deque(maxlen=LATENCY_WINDOW)
+        self.solve_times = deque(maxlen=LATENCY_WINDOW)
+
+    async def start(self):
+        """
+        starts the worker processes (and waits for all of them to be ready) and the dispatcher tasks
+        """
+        loop = asyncio.get_running_loop()
+        self.board_dir = tempfile.TemporaryDirectory(prefix="solve_service_")
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        await asyncio.gather(*(loop.run_in_executor(self.executor, _warm_up) for _ in range(self.workers)))
+
+        self.queue = asyncio.Queue()
+        self.dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+
+    async def close(self):
+        """
+        stops the dispatcher tasks and the worker processes, and fails the solves that are still queued or running
+        with a 503 ServiceError
+        """
+        for dispatcher in self.dispatchers:
+            dispatcher.cancel()
+        await asyncio.gather(*self.dispatchers, return_exceptions=True)
+        for future in self.in_flight.values():
+            if not future.done():
+                future.set_exception(ServiceError(503, "the service is shutting down"))
+        self.in_flight.clear()
+        # in a thread, so the failed requests are answered while the running solves finish
+        await asyncio.to_thread(self.executor.shutdown, cancel_futures=True)
+        self.board_dir.cleanup()
+
+    async def solve(self, board, options):
+        """
+        :param board: normalized text of the board (see normalize_board)
+        :type board: str
+        :param options: options of batch.solve_board (see parse_options)
+        :type options: dict
+        :return: the result of batch.solve_board, with the time the solve waited in the queue ("queue_time"), the
+         time of this request ("latency") and whether it was merged into a solve of another request ("coalesced")
+        :rtype: dict
+        :raises ServiceError: if the queue is full
+        """
+        start_time = perf_counter()
+        self.counts["requests"] += 1
+
+        key = get_request_key(board, options)
+        future = self.in_flight.get(key)
+        coalesced = future is not None
+        if coalesced:
+            self.counts["coalesced"] += 1
+        else:
+            if self.queue.qsize() >= self.max_queue:
+                self.counts["rejected"] += 1
+                raise ServiceError(503, "the solve queue is full")
+
+            future = asyncio.get_running_loop().create_future()
+            self.in_flight[key] = future
+            self.queue.put_nowait((key, board, options, start_time))
+
+        # the solve goes on for the other requests if this one is cancelled
+        result = await asyncio.shield(future)
+
+        latency = perf_counter() - start_time
+        self.latencies.append(latency)
+        return dict(result, latency=latency, coalesced=coalesced)
+
+    async def _dispatch(self):
+        """
+        sends the queued solves to the pool, one at a time
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            key, board, options, submit_time = await self.queue.get()
+            future = self.in_flight[key]
+            board_path = os.path.join(self.board_dir.name, key + ".txt")
+
+            self.running += 1
+            self.counts["solves"] += 1
+            start_time = perf_counter()
+            try:
+                try:
+                    with open(board_path, "w") as file:
+                        file.write(board)
+                    result = await loop.run_in_executor(self.executor, solve_board, board_path,
+                                                        options["algorithm"], options["max_depth"], options["mode"],
+                                                        options["heuristic_name"], options["timeout"], False, None,
+                                                        self.cache_dir, self.cache_bytes, options["max_nodes"])
+                except Exception as e:
+                    # the board could not be written, or the pool is broken (solve_board reports the errors of the
+                    # solvers in its result)
+                    result = {"status": "error", "error": repr(e)}
+
+                result["board"] = key
+                result["queue_time"] = start_time - submit_time
+                self.queue_times.append(result["queue_time"])
+                self.solve_times.append(perf_counter() - start_time)
+                self.status_counts[result["status"]] = self.status_counts.get(result["status"], 0) + 1
+                future.set_result(result)
+            except asyncio.CancelledError:
+                # by close, the requests of the solve must not wait forever
+                if not future.done():
+                    future.set_exception(ServiceError(503, "the service is shutting down"))
+                raise
+            except Exception as e:
+                # the dispatcher goes on with the next solve
+                if not future.done():
+                    future.set_exception(ServiceError(500, f"the solve failed: {e!r}"))
+            finally:
+                self.running -= 1
+                del self.in_flight[key]
+                try:
+                    os.remove(board_path)
+                except FileNotFoundError:
+                    pass
+
+    def metrics(self):
+        """
+        :return: the number of workers, solves waiting in the queue (queue_depth) and running, counts of the requests,
+         solves, merged requests and rejected requests, counts of the statuses of the solves, and summaries (see
+         summarize_times) of the latency of the last LATENCY_WINDOW requests, and the queue time and solve time of
+         the last LATENCY_WINDOW solves
+        :rtype: dict
+        """
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queue.qsize(),
+            "max_queue": self.max_queue,
+            "running": self.running,
+            **self.counts,
+            "statuses": dict(self.status_counts),
+            "latency": summarize_times(self.latencies),
+            "queue_time": summarize_times(self.queue_times),
+            "solve_time": summarize_times(self.solve_times)
+        }
+
+
+async def _handle_request(service, reader, max_timeout):
+    """
+    Reads an HTTP request, and handles it:
+    POST /solve with a board as the body, and the options as the query (see parse_options),
+    GET /metrics for the metrics of the service (see SolveService.metrics),
+    GET /health to check that the service is up.
+    :return: tuple of HTTP status and response body
+    :rtype: tuple
+    """
+    request_line = (await reader.readline()).decode("latin-1").split()
+    if len(request_line) != 3:
+        raise ServiceError(400, "malformed request line")
+    method, target, _ = request_line
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    url = urlsplit(target)
+    if url.path in ("/metrics", "/health"):
+        if method != "GET":
+            raise ServiceError(405, f"{url.path} only accepts GET")
+        return 200, service.metrics() if url.path == "/metrics" else {"status": "ok"}
+    if url.path != "/solve":
+        raise ServiceError(404, f"unknown path: {url.path}")
+    if method != "POST":
+        raise ServiceError(405, "/solve only accepts POST")
+
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise ServiceError(400, "invalid Content-Length")
+    if length < 0:
+        raise ServiceError(400, "invalid Content-Length")
+    if length > MAX_BOARD_BYTES:
+        raise ServiceError(413, f"boards are limited to {MAX_BOARD_BYTES} bytes")
+
+    options = parse_options(parse_qs(url.query), max_timeout)
+    board = normalize_board((await reader.readexactly(length)).decode("utf-8", errors="replace"))
+    return 200, await service.solve(board, options)
+
+
+async def handle_connection(service, reader, writer, max_timeout=None):
+    """
+    Answers a single request of a connection with a JSON body, and closes it.
+    """
+    try:
+        status, body = await _handle_request(service, reader, max_timeout)
+    except ServiceError as e:
+        status, body = e.status, {"error": e.message}
+    except (asyncio.IncompleteReadError, ConnectionError):
+        writer.close()
+        return
+
+    data = json.dumps(body).encode()
+    head = [f"HTTP/1.1 {status} {STATUS_REASONS[status]}", "Content-Type: application/json",
+            f"Content-Length: {len(data)}", "Connection: close"]
+    if status == 503:
+        head.append("Retry-After: 1")
+
+    try:
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + data)
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service, host="127.0.0.1", port=8765, unix_path=None, max_timeout=None):
+    """
+    Starts the service, and serves it over HTTP on a localhost port, or on a Unix socket, until it is cancelled.
+    :param service: the service, which is started and closed here
+    :type service: SolveService
+    :param unix_path: path of the Unix socket (None to listen on host and port instead)
+    :type unix_path: str
+    :param max_timeout: see parse_options
+    :type max_timeout: float
+    """
+    await service.start()
+
+    def handler(reader, writer):
+        return handle_connection(service, reader, writer, max_timeout)
+
+    try:
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(handler, unix_path)
+            address = unix_path
+        else:
+            server = await asyncio.start_server(handler, host, port)
+            address = f"http://{host}:{port}"
+        print(f"Serving on {address} with {service.workers} workers", file=sys.stderr)
+
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+        if unix_path is not None and os.path.exists(unix_path):
+            os.remove(unix_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local solve service: POST a board to /solve, and get its solution "
+                                                 "as JSON (see batch.py for the fields).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("-p", "--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="path of a Unix socket to listen on, instead of the port")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("-q", "--max-queue", type=int, default=64,
+                        help="solves that can wait for a worker, before requests are rejected with 503")
+    parser.add_argument("-t", "--timeout", type=float, default=None,
+                        help="seconds per board, and the highest timeout a request can ask for")
+    parser.add_argument("--cache-dir", default=None, help="directory of the solution cache (no cache by default)")
+    args = parser.parse_args(argv)
+
+    service = SolveService(args.workers, args.max_queue, args.cache_dir)
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix, args.timeout))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import random
+from collections import OrderedDict
+
+MOVEMENTS = ["u", "r", "d", "l"]
+REVERSE_MOVEMENTS = {"u": "d", "r": "l", "d": "u", "l": "r"}
+
+# number of compiled layouts that get_layout keeps in each process
+LAYOUT_CACHE_SIZE = 32
+_layouts = OrderedDict()
+
+
+class Layout:
+    def __init__(self, costs, objects, prune_dead_cells=True, zobrist_seed=0):
+        """
+        Static part of a board, which never changes while the robot moves around.
+
+        Cells are addressed with a single integer index (row * num_cols + col), so a search state
+        only needs to store the robot cell and the butter cells, and everything else is kept here once.
+        For every cell and direction, the neighbor cell and the cell beyond it are compiled into tables
+        (-1 for obstacles and out of boundaries), so successor generation only has to look them up.
+
+        :param costs: 2d list of the cost of each cell, as returned by read_input
+        :type costs: list
+        :param objects: 2d list of the objects of each cell, as returned by read_input
+        :type objects: list
+        :param prune_dead_cells: if True, pushing a butter into a dead cell is not a valid move
+        :type prune_dead_cells: bool
+        :param zobrist_seed: seed of the random Zobrist keys, the same seed gives the same keys in every process
+        :type zobrist_seed: int
+        """
+        self.num_rows, self.num_cols = len(objects), len(objects[0])
+        self.num_cells = self.num_rows * self.num_cols
+
+        self.costs = tuple(cost for row in costs for cost in row)
+        self.obstacles = frozenset(self.index((i, j)) for i in range(self.num_rows)
+                                   for j in range(self.num_cols) if objects[i][j] == "x")
+        self.plates = frozenset(self.index((i, j)) for i in range(self.num_rows)
+                                for j in range(self.num_cols) if "p" in objects[i][j])
+
+        self.neighbors, self.beyond = {}, {}
+        for movement in MOVEMENTS:
+            self.neighbors[movement] = tuple(self._calc_neighbor(cell, movement) for cell in range(self.num_cells))
+        for movement in MOVEMENTS:
+            neighbors = self.neighbors[movement]
+            self.beyond[movement] = tuple(neighbors[neighbors[cell]] if neighbors[cell] >= 0 else -1
+                                          for cell in range(self.num_cells))
+
+        self.dead_cells = self._calc_dead_cells()
+        self.pruned_cells = self.dead_cells if prune_dead_cells else frozenset()
+
+        # (movement, reverse movement, neighbor table, beyond table, opposite neighbor table) of each direction,
+        # ready to be iterated over by successor generation
+        self.move_tables = tuple((movement, REVERSE_MOVEMENTS[movement], self.neighbors[movement],
+                                  self.beyond[movement], self.neighbors[REVERSE_MOVEMENTS[movement]])
+                                 for movement in MOVEMENTS)
+
+        # Zobrist keys: the key of a state is the XOR of the key of the robot cell and the keys of the butter cells,
+        # so a move only has to XOR out the old cells and XOR in the new ones
+        rnd = random.Random(zobrist_seed)
+        self.robot_keys = tuple(rnd.getrandbits(64) for _ in range(self.num_cells))
+        self.butter_keys = tuple(rnd.getrandbits(64) for _ in range(self.num_cells))
+
+        # tables that are derived from the layout on their first use (such as the push distances of the heuristics),
+        # so they are built once for all the boards of a layout that get_layout returns
+        self.tables = {}
+
+    def index(self, loc):
+        """
+        converts a (row, col) location to its cell index
+        """
+        x, y = loc
+        return x * self.num_cols + y
+
+    def loc(self, cell):
+        """
+        converts a cell index to its (row, col) location
+        """
+        return divmod(cell, self.num_cols)
+
+    def neighbor(self, cell, movement):
+        """
+        :param cell: cell index
+        :type cell: int
+        :param movement: the move that is to be made
+        :type movement: str (from the values "u", "r", "d", "l")
+        :return: index of the neighbor of cell in the direction of movement,
+         or -1 if it is out of boundaries or an obstacle (x)
+        :rtype: int
+        """
+        return self.neighbors[movement][cell]
+
+    def make_key(self, robot, butters):
+        """
+        calculates the Zobrist key of a state from scratch
+        :param robot: cell index of the robot
+        :type robot: int
+        :param butters: cell indexes of the butters
+        :type butters: tuple
+        :rtype: int
+        """
+        key = self.robot_keys[robot]
+        for butter in butters:
+            key ^= self.butter_keys[butter]
+        return key
+
+    def make_state_from_cells(self, robot, butters):
+        """
+        :param robot: cell index of the robot
+        :type robot: int
+        :param butters: sorted tuple of the cell indexes of the butters
+        :type butters: tuple
+        :rtype: State
+        """
+        return State(robot, butters, self.make_key(robot, butters))
+
+    def _calc_neighbor(self, cell, movement):
+        if cell in self.obstacles:
+            return -1
+
+        x, y = divmod(cell, self.num_cols)
+        if movement == "u":
+            new_cell = cell - self.num_cols if x > 0 else -1
+        elif movement == "r":
+            new_cell = cell + 1 if y < self.num_cols - 1 else -1
+        elif movement == "d":
+            new_cell = cell + self.num_cols if x < self.num_rows - 1 else -1
+        elif movement == "l":
+            new_cell = cell - 1 if y > 0 else -1
+
+        return -1 if new_cell in self.obstacles else new_cell
+
+    def _calc_dead_cells(self):
+        """
+        Finds the cells that a butter can never be pushed from to any plate, even if there were no other butters.
+
+        Starting from the plates, a butter is pulled backward in every direction: the butter can come from a cell,
+        if the robot can stand behind it to push it. Every free cell that is not reached this way is dead.
+        :return: set of dead cell indexes
+        :rtype: frozenset
+        """
+        live_cells = set(self.plates)
+        stack = list(self.plates)
+        while stack:
+            cell = stack.pop()
+            for movement in MOVEMENTS:
+                # the butter comes to cell from its neighbor, pushed by the robot standing beyond it
+                butter_cell = self.neighbors[movement][cell]
+                robot_cell = self.beyond[movement][cell]
+                if butter_cell >= 0 and robot_cell >= 0 and butter_cell not in live_cells:
+                    live_cells.add(butter_cell)
+                    stack.append(butter_cell)
+
+        return frozenset(cell for cell in range(self.num_cells) if cell not in live_cells and cell not in self.obstacles)
+
+    def make_state(self, objects, robot_loc):
+        """
+        extracts the dynamic part (robot and butters) of the given objects list
+        :param objects: objects of the field
+        :type objects: list
+        :param robot_loc: robot location
+        :type robot_loc: tuple
+        :rtype: State
+        """
+        butters = tuple(self.index((i, j)) for i in range(self.num_rows)
+                        for j in range(self.num_cols) if "b" in objects[i][j])
+        return self.make_state_from_cells(self.index(robot_loc), butters)
+
+    def to_objects(self, state):
+        """
+        rebuilds the 2d objects list (same format as read_input) of the given state
+        :type state: State
+        :rtype: list
+        """
+        objects = [["" for _ in range(self.num_cols)] for _ in range(self.num_rows)]
+        for cell in self.obstacles:
+            x, y = self.loc(cell)
+            objects[x][y] = "x"
+        for cell in self.plates:
+            x, y = self.loc(cell)
+            objects[x][y] = "p"
+        for cell in state.butters:
+            x, y = self.loc(cell)
+            objects[x][y] = "b" + objects[x][y]
+
+        return objects
+
+
+def get_layout(costs, objects):
+    """
+    Returns the layout of a board, which is compiled once in each process for the same costs, obstacles and plates
+    (the LAYOUT_CACHE_SIZE most recently used ones are kept). A layout never changes while it is searched, so a
+    long running process, such as a worker of solve_service.py, shares it (and its derived tables) between all the
+    boards that only differ in their robot and butters.
+    :param costs: 2d list of the cost of each cell, as returned by read_input
+    :type costs: list
+    :param objects: 2d list of the objects of each cell, as returned by read_input
+    :type objects: list
+    :rtype: Layout
+    """
+    # the butters are the only objects that are not a part of the layout
+    key = (tuple(map(tuple, costs)), tuple(tuple(cell_objects.replace("b", "") for cell_objects in row)
+                                           for row in objects))
+    layout = _layouts.get(key)
+    if layout is not None:
+        _layouts.move_to_end(key)
+        return layout
+
+    layout = _layouts[key] = Layout(costs, objects)
+    if len(_layouts) > LAYOUT_CACHE_SIZE:
+        _layouts.popitem(last=False)
+    return layout
+
+
+class State:
+    __slots__ = ("robot", "butters", "key")
+
+    def __init__(self, robot, butters, key):
+        """
+        Immutable dynamic part of a board.
+
+        States are hashed by their Zobrist key (see Layout), which is updated incrementally from the parent state.
+        Two different states may have the same key, so equality still compares the cells.
+
+        :param robot: cell index of the robot
+        :type robot: int
+        :param butters: sorted tuple of the cell indexes of all butters (including the ones on plates)
+        :type butters: tuple
+        :param key: Zobrist key of the state
+        :type key: int
+        """
+        self.robot = robot
+        self.butters = butters
+        self.key = key
+
+    def __eq__(self, other):
+        if isinstance(other, State):
+            return self.key == other.key and self.robot == other.robot and self.butters == other.butters
+        return NotImplemented
+
+    def __hash__(self):
+        return self.key
+
+    def __repr__(self):
+        return f"State(robot={self.robot}, butters={self.butters})"
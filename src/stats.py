@@ -0,0 +1,177 @@
+import json
+from collections import defaultdict
+from time import perf_counter
+
+
+class SearchStats:
+    def __init__(self, timing=False):
+        """
+        Statistics of a search, filled in by the search functions while they run.
+
+        The counters are plain attributes, which the search loops update directly:
+         - nodes_created and nodes_expanded, and the number of expanded nodes at each depth (depth_counts)
+         - duplicates: generated states that were dropped, since they were already reached (as cheap) before
+         - reopenings: closed states that were put back to the frontier, since they were reached with a lower g cost
+         - decrease_keys: open states that were reached with a lower g cost (and pushed again to the frontier)
+         - peak_frontier and peak_closed: the largest size of the frontier and of the closed set (or the set of
+           reached states). Depth first searches only keep their current path, whose longest length is peak_frontier.
+        The time spent in the heuristic and in successor generation is only measured with timing, by wrapping the
+        functions (see timed_heuristic and timed_successors), so without it the searches call the same functions,
+        and pay nothing for it.
+        Algorithm specific results (such as the iterations of IDA* or the counts of each worker) are kept in details.
+
+        :param timing: whether to measure the time of the heuristic and successor generation calls
+        :type timing: bool
+        """
+        self.timing = timing
+
+        self.nodes_created = 0
+        self.nodes_expanded = 0
+        self.duplicates = 0
+        self.reopenings = 0
+        self.decrease_keys = 0
+        self.peak_frontier = 0
+        self.peak_closed = 0
+        self.depth_counts = defaultdict(int)
+
+        self.heuristic_calls = 0
+        self.heuristic_time = 0.0
+        self.successor_calls = 0
+        self.successor_time = 0.0
+
+        self.pushes = None
+        self.details = {}
+
+        self.start_time = perf_counter()
+        self.end_time = None
+
+    def stop(self):
+        """
+        marks the end of the search, elapsed time is measured up to here
+        """
+        self.end_time = perf_counter()
+
+    @property
+    def elapsed(self):
+        """
+        seconds from the creation of the stats to stop (or to now, if the search is still running)
+        """
+        return (self.end_time or perf_counter()) - self.start_time
+
+    @property
+    def expansions_per_second(self):
+        elapsed = self.elapsed
+        return self.nodes_expanded / elapsed if elapsed > 0 else 0.0
+
+    def update_peaks(self, frontier_size, closed_size):
+        if frontier_size > self.peak_frontier:
+            self.peak_frontier = frontier_size
+        if closed_size > self.peak_closed:
+            self.peak_closed = closed_size
+
+    def timed_heuristic(self, heuristic):
+        """
+        :param heuristic: function that returns the heuristic value of a state
+        :return: the heuristic itself without timing, otherwise a function that also measures its calls
+        """
+        if not self.timing:
+            return heuristic
+
+        def timed(state):
+            start_time = perf_counter()
+            value = heuristic(state)
+            self.heuristic_time += perf_counter() - start_time
+            self.heuristic_calls += 1
+            return value
+
+        return timed
+
+    def timed_successors(self, successors):
+        """
+        :param successors: successor generation function (forward or backward)
+        :return: successors itself without timing, otherwise a function that also measures its calls
+        """
+        if not self.timing:
+            return successors
+
+        def timed(layout, state):
+            start_time = perf_counter()
+            result = successors(layout, state)
+            self.successor_time += perf_counter() - start_time
+            self.successor_calls += 1
+            return result
+
+        return timed
+
+    def merge(self, other):
+        """
+        Adds the counts of another search (such as a worker process, or one direction of BBFS) to these stats.
+        Peak sizes are the largest of the two, since the searches keep separate frontiers.
+        :type other: SearchStats
+        """
+        self.nodes_created += other.nodes_created
+        self.nodes_expanded += other.nodes_expanded
+        self.duplicates += other.duplicates
+        self.reopenings += other.reopenings
+        self.decrease_keys += other.decrease_keys
+        self.update_peaks(other.peak_frontier, other.peak_closed)
+        for depth, count in other.depth_counts.items():
+            self.depth_counts[depth] += count
+
+        self.heuristic_calls += other.heuristic_calls
+        self.heuristic_time += other.heuristic_time
+        self.successor_calls += other.successor_calls
+        self.successor_time += other.successor_time
+
+    def to_dict(self):
+        """
+        :return: JSON serializable dictionary of all the statistics, where depth_counts is a list indexed by depth,
+         and the details are included as they are (nested stats are converted too)
+        :rtype: dict
+        """
+        max_depth = max(self.depth_counts, default=-1)
+        stats = {
+            "nodes_created": self.nodes_created,
+            "nodes_expanded": self.nodes_expanded,
+            "duplicates": self.duplicates,
+            "reopenings": self.reopenings,
+            "decrease_keys": self.decrease_keys,
+            "peak_frontier": self.peak_frontier,
+            "peak_closed": self.peak_closed,
+            "depth_counts": [self.depth_counts.get(depth, 0) for depth in range(max_depth + 1)],
+            "elapsed": self.elapsed,
+            "expansions_per_second": self.expansions_per_second
+        }
+        if self.timing:
+            stats.update({
+                "heuristic_calls": self.heuristic_calls,
+                "heuristic_time": self.heuristic_time,
+                "successor_calls": self.successor_calls,
+                "successor_time": self.successor_time
+            })
+        if self.pushes is not None:
+            stats["pushes"] = self.pushes
+
+        for name, value in self.details.items():
+            stats[name] = _to_json_value(value)
+        return stats
+
+    def to_json(self, **kwargs):
+        """
+        :param kwargs: keyword arguments of json.dumps (such as indent)
+        :rtype: str
+        """
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def __repr__(self):
+        return f"SearchStats(nodes_created={self.nodes_created}, nodes_expanded={self.nodes_expanded})"
+
+
+def _to_json_value(value):
+    if isinstance(value, SearchStats):
+        return value.to_dict()
+    if isinstance(value, (list, tuple)):
+        return [_to_json_value(item) for item in value]
+    if isinstance(value, dict):
+        return {name: _to_json_value(item) for name, item in value.items()}
+    return value